@@ -0,0 +1,113 @@
+"""
+Measures the latency of player searches against indexes of increasing size. The players are
+generated from random syllables, so the results do not depend on the Stats API. Real rosters have
+fewer distinct last names, which makes the generated indexes a pessimistic case for trigram
+matching.
+
+Usage:
+    python -m benchmarks.search_benchmark [--sizes 1000 10000 50000] [--queries 2000]
+"""
+
+import argparse
+import gc
+import random
+import statistics
+import time
+from nhlapi.search import PlayerIndex
+
+
+ONSETS = ["", "b", "br", "c", "ch", "d", "f", "g", "h", "j", "k", "kr", "l", "m", "n", "p", "r",
+    "s", "sh", "st", "t", "v", "w", "z"]
+VOWELS = ["a", "e", "i", "o", "u", "y", "ie", "ou"]
+CODAS = ["", "", "", "n", "r", "s", "k", "l", "m", "ck", "tt", "v"]
+
+# The number of distinct first names of the generated players
+FIRST_NAMES = 1000
+
+
+def make_name(rng: random.Random) -> str:
+    syllables = rng.choices([2, 3, 4], weights=[5, 4, 1])[0]
+    return "".join(
+        rng.choice(ONSETS) + rng.choice(VOWELS) + rng.choice(CODAS) for _ in range(syllables)
+    ).capitalize()
+
+
+def make_players(size: int, rng: random.Random) -> list[dict]:
+    """
+    Generates a list of players with random names and activities. Like real rosters, the first
+    names are drawn from a smaller pool of names than the last names.
+    """
+    first_names = [make_name(rng) for _ in range(FIRST_NAMES)]
+    return [
+        {
+            "id": i,
+            "first_name": rng.choice(first_names),
+            "last_name": make_name(rng),
+            "activity": rng.randint(0, 500),
+        }
+        for i in range(size)
+    ]
+
+
+def make_queries(players: list[dict], count: int, rng: random.Random) -> dict[str, list[str]]:
+    """
+    Generates the queries of each kind: prefixes of names as they are typed, names with a typo and
+    names that are not in the index.
+    """
+    def typo(name: str) -> str:
+        i = rng.randrange(len(name))
+        return name[:i] + rng.choice("aeiouxyz") + name[i + 1:]
+
+    sampled = [rng.choice(players) for _ in range(count)]
+    return {
+        "prefix": [p["last_name"][:rng.randint(1, len(p["last_name"]))] for p in sampled],
+        "typo": [typo(p["last_name"]) for p in sampled],
+        "full name typo": [f"{p['first_name']} {typo(p['last_name'])}" for p in sampled],
+        "miss": [make_name(rng) + "q" for _ in sampled],
+    }
+
+
+def measure(index: PlayerIndex, queries: list[str], limit: int) -> list[float]:
+    """
+    Runs each query and returns their latencies in microseconds. Like `timeit`, the garbage
+    collector is disabled while the queries run.
+    """
+    latencies = []
+    gc.disable()
+    try:
+        for query in queries:
+            start = time.perf_counter()
+            index.search(query, limit)
+            latencies.append((time.perf_counter() - start) * 1e6)
+    finally:
+        gc.enable()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks the player search index.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000],
+        help="the numbers of players in the benchmarked indexes")
+    parser.add_argument("--queries", type=int, default=2000,
+        help="the number of queries of each kind")
+    parser.add_argument("--limit", type=int, default=10, help="the maximum number of results")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"{'players':>8} {'build ms':>9} {'query':>15} {'p50 us':>8} {'p99 us':>8} {'max us':>8}")
+    for size in args.sizes:
+        players = make_players(size, rng)
+        start = time.perf_counter()
+        index = PlayerIndex(players)
+        build = (time.perf_counter() - start) * 1e3
+
+        for kind, queries in make_queries(players, args.queries, rng).items():
+            latencies = sorted(measure(index, queries, args.limit))
+            p50 = statistics.median(latencies)
+            p99 = latencies[int(len(latencies) * 0.99) - 1]
+            print(f"{size:>8} {build:>9.1f} {kind:>15} {p50:>8.1f} {p99:>8.1f} {latencies[-1]:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,13 +2,23 @@
 A FastAPI server that acts as a proxy for the NHL API.
 """
 
+import asyncio
 from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+import httpx
 import strawberry
 from strawberry.fastapi import GraphQLRouter
 from nhlapi.graphql.schema import Query
-from nhlapi.util import forward_request
+from nhlapi.graphql.context import get_context
+from nhlapi.breaker import CircuitBreaker
+from nhlapi.cache import SingleFlight, create_backend
+from nhlapi.clients.database import check_pool, create_pool, get_player_activity
+from nhlapi.clients.stats import StatsClient, create_player_cache, create_team_cache
+from nhlapi.clients.suggest import create_suggestion_cache
+from nhlapi.search import PlayerIndex, refresh_index, roster_players
+from nhlapi.util import create_client, create_response_cache, forward_request, stream_request
 import os
+import re
 
 
 # Constants for the different API URLs
@@ -16,6 +26,51 @@ NHL_STATS_API = "https://statsapi.web.nhl.com/api"
 NHL_RECORDS_API = "https://records.nhl.com/site/api"
 NHL_SUGGEST_API = "https://suggest.svc.nhl.com/svc/suggest"
 
+# Timeouts for requests to the different APIs
+NHL_STATS_TIMEOUT = httpx.Timeout(10.0, connect=3.0)
+NHL_RECORDS_TIMEOUT = httpx.Timeout(10.0, connect=3.0)
+NHL_SUGGEST_TIMEOUT = httpx.Timeout(3.0, connect=1.0)
+
+# The number of seconds responses from the different APIs are cached; the Cache-Control header of
+# the API response is used if None
+NHL_STATS_TTL = None
+NHL_RECORDS_TTL = 60 * 60
+NHL_SUGGEST_TTL = 10 * 60
+
+# The Stats API endpoints with large responses that are streamed to the client instead of cached.
+# They are not served stale when the API fails.
+NHL_STATS_STREAMED = re.compile(r"v1/game/\d+/(feed/live|content)/?")
+
+# Connection pool limits of the HTTP client shared by the proxy routes
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", 200))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", 50))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", 30.0))
+
+# The cache shared by the workers, e.g. redis://localhost:6379/0. Each worker keeps its own cache in
+# memory if no url is given.
+CACHE_URL = os.getenv("CACHE_URL")
+CACHE_MAXSIZE = int(os.getenv("CACHE_MAXSIZE", 10000))
+
+# The bounds of the in-memory cache of proxied responses of each worker, which is kept apart from
+# the other caches because responses can be several megabytes
+RESPONSE_CACHE_MAXSIZE = int(os.getenv("RESPONSE_CACHE_MAXSIZE", 1000))
+RESPONSE_CACHE_MAXBYTES = int(os.getenv("RESPONSE_CACHE_MAXBYTES", 100 * 1024 * 1024))
+
+# Database connection pool options of each worker
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", 1))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", 4))
+DB_POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", 30 * 60))
+DB_POOL_CHECK_INTERVAL = float(os.getenv("DB_POOL_CHECK_INTERVAL", 60))
+
+# Circuit breaker options of each upstream API. A circuit opens when the rate of failed or slow
+# requests to its API reaches the failure rate, and rejects requests for the open duration.
+BREAKER_FAILURE_RATE = float(os.getenv("BREAKER_FAILURE_RATE", 0.5))
+BREAKER_SLOW_CALL_DURATION = float(os.getenv("BREAKER_SLOW_CALL_DURATION", 2.0))
+BREAKER_OPEN_DURATION = float(os.getenv("BREAKER_OPEN_DURATION", 30.0))
+
+# The number of seconds between refreshes of the player search index of each worker
+PLAYER_INDEX_REFRESH_INTERVAL = float(os.getenv("PLAYER_INDEX_REFRESH_INTERVAL", 6 * 60 * 60))
+
 
 app = FastAPI(root_path="/hashmarks")
 
@@ -27,16 +82,101 @@ app.add_middleware(CORSMiddleware, allow_origins=origins,  allow_methods=("GET",
 print("environment:", os.getenv("API_ENV", "production"))
 
 schema = strawberry.Schema(Query)
-graphql_app = GraphQLRouter(schema, graphiql=False)
+graphql_app = GraphQLRouter(schema, graphiql=False, context_getter=get_context)
 app.include_router(graphql_app, prefix="/graphql")
 
 
+@app.on_event("startup")
+async def startup():
+    """
+    Creates the HTTP client, caches, single-flight, circuit breakers, database pool and player
+    search index that are shared by every request for the lifetime of the app. The index is built
+    in the background.
+    """
+    app.state.http_client = create_client(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+    app.state.cache_backend = create_backend(CACHE_URL, maxsize=CACHE_MAXSIZE)
+    app.state.flight = SingleFlight()
+    app.state.player_cache = create_player_cache(app.state.cache_backend, app.state.flight)
+    app.state.team_cache = create_team_cache(app.state.cache_backend, app.state.flight)
+    app.state.suggestion_cache = create_suggestion_cache(app.state.cache_backend, app.state.flight)
+    app.state.response_backend = create_backend(
+        CACHE_URL, maxsize=RESPONSE_CACHE_MAXSIZE, maxbytes=RESPONSE_CACHE_MAXBYTES)
+    app.state.response_cache = create_response_cache(app.state.response_backend)
+    app.state.breakers = {
+        name: CircuitBreaker(
+            name,
+            failure_rate=BREAKER_FAILURE_RATE,
+            slow_call_duration=BREAKER_SLOW_CALL_DURATION,
+            open_duration=BREAKER_OPEN_DURATION,
+        )
+        for name in ("stats", "records", "suggest")
+    }
+    app.state.db_pool = create_pool(
+        min_size=DB_POOL_MIN_SIZE,
+        max_size=DB_POOL_MAX_SIZE,
+        max_lifetime=DB_POOL_MAX_LIFETIME,
+    )
+    await app.state.db_pool.open()
+    app.state.db_pool_check = asyncio.create_task(
+        check_pool(app.state.db_pool, DB_POOL_CHECK_INTERVAL))
+
+    stats = StatsClient(
+        app.state.http_client, flight=app.state.flight, breaker=app.state.breakers["stats"])
+    async def load_players() -> list[dict]:
+        teams = await stats.get_rosters()
+        try:
+            activity = await get_player_activity(app.state.db_pool)
+        except Exception:
+            # the players are still indexed without the database, but they are not ranked by
+            # activity
+            activity = {}
+        return roster_players(teams, activity)
+
+    app.state.player_index = PlayerIndex()
+    app.state.player_index_refresh = asyncio.create_task(
+        refresh_index(app.state.player_index, load_players, PLAYER_INDEX_REFRESH_INTERVAL))
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """
+    Closes the shared HTTP client, cache backends and database pool.
+    """
+    app.state.player_index_refresh.cancel()
+    await app.state.http_client.aclose()
+    await app.state.cache_backend.close()
+    await app.state.response_backend.close()
+    app.state.db_pool_check.cancel()
+    await app.state.db_pool.close()
+
+
 @app.get("/stats/{endpoint:path}")
 async def stats(request: Request) -> Response:
     """
     Handles GET requests to the NHL Stats API.
     """
-    return forward_request(NHL_STATS_API, request)
+    if NHL_STATS_STREAMED.fullmatch(request.path_params["endpoint"]):
+        return await stream_request(
+            request.app.state.http_client,
+            NHL_STATS_API,
+            request,
+            timeout=NHL_STATS_TIMEOUT,
+            breaker=request.app.state.breakers["stats"],
+        )
+    return await forward_request(
+        request.app.state.http_client,
+        NHL_STATS_API,
+        request,
+        timeout=NHL_STATS_TIMEOUT,
+        cache=request.app.state.response_cache,
+        ttl=NHL_STATS_TTL,
+        flight=request.app.state.flight,
+        breaker=request.app.state.breakers["stats"],
+    )
 
 
 @app.get("/records/{endpoint:path}")
@@ -44,7 +184,16 @@ async def records(request: Request) -> Response:
     """
     Handles GET requests to the NHL Records API.
     """
-    return forward_request(NHL_RECORDS_API, request)
+    return await forward_request(
+        request.app.state.http_client,
+        NHL_RECORDS_API,
+        request,
+        timeout=NHL_RECORDS_TIMEOUT,
+        cache=request.app.state.response_cache,
+        ttl=NHL_RECORDS_TTL,
+        flight=request.app.state.flight,
+        breaker=request.app.state.breakers["records"],
+    )
 
 
 @app.get("/suggest/{endpoint:path}")
@@ -52,4 +201,13 @@ async def suggest(request: Request):
     """
     Handles GET requests to the NHL Suggest API.
     """
-    return forward_request(NHL_SUGGEST_API, request)
+    return await forward_request(
+        request.app.state.http_client,
+        NHL_SUGGEST_API,
+        request,
+        timeout=NHL_SUGGEST_TIMEOUT,
+        cache=request.app.state.response_cache,
+        ttl=NHL_SUGGEST_TTL,
+        flight=request.app.state.flight,
+        breaker=request.app.state.breakers["suggest"],
+    )
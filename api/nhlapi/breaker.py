@@ -0,0 +1,173 @@
+"""
+This module provides circuit breakers for the upstream NHL APIs. When an API fails or slows down,
+its circuit opens and requests to it fail immediately instead of waiting on the API, so that a
+brownout of one API does not tie up the workers. Requests that fail fast are answered from the
+cache where possible.
+"""
+
+import asyncio
+from collections import deque
+import logging
+import time
+from typing import Any, Awaitable, Callable, TypeVar
+import httpx
+
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised when a call is rejected because the circuit of its upstream is open.
+    """
+
+
+class CircuitBreaker:
+    """
+    A circuit breaker for a single upstream. The outcomes of the most recent calls are recorded,
+    and calls that raise, that return a failed result or that take longer than
+    `slow_call_duration` seconds count as failures. Once at least `min_calls` calls are recorded
+    and the rate of failures reaches `failure_rate`, the circuit opens and every call is rejected
+    for `open_duration` seconds. After that, a single trial call is let through: the circuit closes
+    if it succeeds and opens again if it fails.
+
+    Args:
+        name: the name of the upstream, used in logs
+        failure_rate: the rate of failures of the recent calls at which the circuit opens
+        window: the number of recent calls whose outcomes are recorded
+        min_calls: the minimum number of recorded calls before the circuit can open
+        slow_call_duration: the number of seconds after which a successful call counts as a failure
+        open_duration: the number of seconds the circuit stays open before a trial call
+        clock: the function used to get the current time in seconds
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate: float = 0.5,
+        window: int = 20,
+        min_calls: int = 10,
+        slow_call_duration: float = 2.0,
+        open_duration: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.slow_call_duration = slow_call_duration
+        self.open_duration = open_duration
+        self.clock = clock
+
+        self.rejected = 0
+
+        self._outcomes: deque[bool] = deque(maxlen=window)
+        self._opened_at: float | None = None
+        self._trial = False
+
+    @property
+    def state(self) -> str:
+        """
+        The state of the circuit: closed, open or half open.
+        """
+        if self._opened_at == None:
+            return self.CLOSED
+        if self.clock() - self._opened_at < self.open_duration:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    def stats(self) -> dict:
+        """
+        Returns the state of the circuit and the number of calls it has rejected.
+        """
+        return {"state": self.state, "rejected": self.rejected}
+
+    async def call(
+        self,
+        fn: Callable[[], Awaitable[T]],
+        failed: Callable[[Any], bool] | None = None,
+    ) -> T:
+        """
+        Calls a function through the circuit.
+
+        Args:
+            fn: the function to call
+            failed: a function that returns whether a result of the call is a failure, such as a
+                response with a server error; only exceptions are failures if None
+
+        Returns:
+            The result of the call, even if it counts as a failure.
+
+        Raises:
+            CircuitOpenError: If the circuit is open
+            Exception: Any exception raised by the call
+        """
+        trial = self._acquire()
+        start = self.clock()
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            if trial:
+                self._trial = False
+            raise
+        except Exception:
+            self._record(False, trial)
+            raise
+
+        slow = self.clock() - start >= self.slow_call_duration
+        self._record(not slow and not (failed != None and failed(result)), trial)
+        return result
+
+    def _acquire(self) -> bool:
+        """
+        Lets a call through the circuit, or rejects it if the circuit is open.
+
+        Returns:
+            Whether the call is the trial call of a half open circuit.
+        """
+        state = self.state
+        if state == self.CLOSED:
+            return False
+        if state == self.HALF_OPEN and not self._trial:
+            self._trial = True
+            return True
+
+        self.rejected += 1
+        raise CircuitOpenError(f"the circuit of {self.name} is open")
+
+    def _record(self, success: bool, trial: bool):
+        """
+        Records the outcome of a call, opening or closing the circuit if needed. Calls that started
+        before the circuit opened are ignored once it is open.
+        """
+        if trial:
+            self._trial = False
+            if success:
+                logger.info("closing the circuit of %s", self.name)
+                self._opened_at = None
+            else:
+                self._opened_at = self.clock()
+            return
+        if self._opened_at != None:
+            return
+
+        self._outcomes.append(success)
+        calls = len(self._outcomes)
+        failures = self._outcomes.count(False)
+        if calls >= self.min_calls and failures >= self.failure_rate * calls:
+            logger.warning(
+                "opening the circuit of %s after %d failures in %d calls",
+                self.name, failures, calls)
+            self._opened_at = self.clock()
+            self._outcomes.clear()
+
+
+def is_server_error(response: httpx.Response) -> bool:
+    """
+    Returns whether an HTTP response is a server error, which counts as a failure of the upstream.
+    """
+    return response.status_code >= 500
@@ -0,0 +1,454 @@
+"""
+This module provides caching for the data requested from the NHL APIs. Cached values are kept in a
+cache backend, which is either local to the process or shared by every worker through Redis.
+Identical requests that are in flight at the same time are coalesced with a `SingleFlight`.
+"""
+
+from abc import ABC, abstractmethod
+import asyncio
+from collections import OrderedDict
+import json
+import logging
+import time
+from typing import Any, Awaitable, Callable, Hashable, TypeVar
+
+try:
+    from redis import asyncio as aioredis
+except ImportError:
+    aioredis = None
+
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+
+class CacheBackend(ABC):
+    """
+    The storage of a cache. Values must be JSON serializable so that they can be shared between
+    processes.
+    """
+    @abstractmethod
+    async def get(self, key: str) -> Any | None:
+        """
+        Gets the value of a key.
+
+        Args:
+            key: the key of the value
+
+        Returns:
+            The value if the key exists and has not expired; otherwise None.
+        """
+
+    @abstractmethod
+    async def set(self, key: str, value: Any, ttl: float):
+        """
+        Sets the value of a key.
+
+        Args:
+            key: the key of the value
+            value: the value
+            ttl: the number of seconds until the key expires
+        """
+
+    @abstractmethod
+    async def delete(self, key: str):
+        """
+        Deletes a key if it exists.
+
+        Args:
+            key: the key to delete
+        """
+
+    async def close(self):
+        """
+        Closes the backend and releases its resources.
+        """
+
+
+class MemoryBackend(CacheBackend):
+    """
+    A cache backend that stores values in the memory of the process. The backend has a bounded
+    size and evicts the least recently used keys.
+
+    Args:
+        maxsize: the maximum number of keys in the backend
+        clock: the function used to get the current time in seconds
+        maxbytes: the maximum total size of the values in the backend, measured as JSON; values
+            larger than this are not stored. The size is not bounded if None.
+    """
+    def __init__(
+        self,
+        maxsize: int = 10000,
+        clock: Callable[[], float] = time.monotonic,
+        maxbytes: int | None = None,
+    ):
+        self.maxsize = maxsize
+        self.clock = clock
+        self.maxbytes = maxbytes
+        self.nbytes = 0
+        self._entries: OrderedDict[str, tuple[float, Any, int]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get(self, key: str) -> Any | None:
+        entry = self._entries.get(key)
+        if entry == None:
+            return None
+
+        expires_at, value, _ = entry
+        if self.clock() >= expires_at:
+            await self.delete(key)
+            return None
+
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any, ttl: float):
+        await self.delete(key)
+        size = len(json.dumps(value)) if self.maxbytes != None else 0
+        if self.maxbytes != None and size > self.maxbytes:
+            return None
+
+        self._entries[key] = (self.clock() + ttl, value, size)
+        self.nbytes += size
+        while len(self._entries) > self.maxsize or (
+                self.maxbytes != None and self.nbytes > self.maxbytes):
+            _, (_, _, evicted) = self._entries.popitem(last=False)
+            self.nbytes -= evicted
+
+    async def delete(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry != None:
+            self.nbytes -= entry[2]
+
+
+class RedisBackend(CacheBackend):
+    """
+    A cache backend that stores values as JSON in a Redis server, which allows the cached values to
+    be shared by every worker. Any server that implements the Redis protocol can be used.
+
+    Args:
+        redis: the Redis client
+        prefix: the prefix added to every key stored by the backend
+    """
+    def __init__(self, redis: "aioredis.Redis", prefix: str = "nhlapi:"):
+        self.redis = redis
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str, prefix: str = "nhlapi:"):
+        """
+        Creates a backend connected to the Redis server at the given url.
+
+        Raises:
+            RuntimeError: If the `redis` package is not installed
+        """
+        if aioredis == None:
+            raise RuntimeError("RedisBackend: the redis package is required to use a Redis cache")
+        return cls(aioredis.from_url(url), prefix=prefix)
+
+    async def get(self, key: str) -> Any | None:
+        value = await self.redis.get(self.prefix + key)
+        if value != None:
+            return json.loads(value)
+
+    async def set(self, key: str, value: Any, ttl: float):
+        await self.redis.set(self.prefix + key, json.dumps(value), px=max(1, int(ttl * 1000)))
+
+    async def delete(self, key: str):
+        await self.redis.delete(self.prefix + key)
+
+    async def close(self):
+        await self.redis.close()
+
+
+def create_backend(
+    url: str | None = None,
+    maxsize: int = 10000,
+    maxbytes: int | None = None,
+) -> CacheBackend:
+    """
+    Creates a cache backend from a url. A Redis backend is created for `redis://`, `rediss://` and
+    `unix://` urls; otherwise the backend is local to the process. The size of a Redis backend is
+    bounded by the `maxmemory` of the server.
+
+    Args:
+        url: the url of the Redis server
+        maxsize: the maximum number of keys of a backend local to the process
+        maxbytes: the maximum size of the values of a backend local to the process; not bounded
+            if None
+    """
+    if url and url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackend.from_url(url)
+    return MemoryBackend(maxsize, maxbytes=maxbytes)
+
+
+class TTLCache:
+    """
+    A cache for the values of a single kind of entity, such as players. Entries are fresh for `ttl`
+    seconds, after which they are considered stale for another `stale_ttl` seconds. Stale entries
+    are still returned, but trigger a refresh of the entry in the background.
+
+    Concurrent misses for the same key are de-duplicated with a `SingleFlight` so that a key is
+    only loaded once at a time by this process, regardless of how many callers are waiting on it.
+    Errors of the backend are treated as misses so that the cache never prevents a value from being
+    loaded.
+
+    Args:
+        backend: the backend that stores the entries
+        namespace: the namespace of the keys in the backend
+        ttl: the number of seconds an entry is fresh
+        stale_ttl: the number of seconds an entry can be served stale after it is no longer fresh
+        clock: the function used to get the current time in seconds. The time must be comparable
+            between the processes that share the backend.
+        flight: the single-flight that coalesces the loads of the same key, which is shared with
+            the clients so that its counters include the loads; the cache has its own if None
+    """
+    def __init__(
+        self,
+        backend: CacheBackend,
+        namespace: str,
+        ttl: float,
+        stale_ttl: float = 0,
+        clock: Callable[[], float] = time.time,
+        flight: "SingleFlight | None" = None,
+    ):
+        self.backend = backend
+        self.namespace = namespace
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.clock = clock
+        self.flight = flight if flight != None else SingleFlight()
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+        self._refreshes: set[asyncio.Task] = set()
+
+    def _key(self, key: Hashable) -> str:
+        return f"{self.namespace}:{key}"
+
+    async def get(self, key: Hashable) -> tuple[Any, bool] | None:
+        """
+        Gets the entry for a key without loading it.
+
+        Args:
+            key: the key of the entry
+
+        Returns:
+            A tuple of the value and whether it is fresh if the entry exists; otherwise None, which
+            is also returned if the backend fails.
+        """
+        try:
+            entry = await self.backend.get(self._key(key))
+        except Exception:
+            logger.exception("failed to get %s from the cache", self._key(key))
+            return None
+        if entry == None:
+            return None
+
+        fresh_until, value = entry
+        return value, self.clock() < fresh_until
+
+    async def set(self, key: Hashable, value: Any, ttl: float | None = None):
+        """
+        Sets the entry for a key. Nothing is set if the backend fails.
+
+        Args:
+            key: the key of the entry
+            value: the value of the entry
+            ttl: the number of seconds the entry is fresh; the cache's `ttl` is used if None
+        """
+        if ttl == None:
+            ttl = self.ttl
+        try:
+            await self.backend.set(
+                self._key(key), [self.clock() + ttl, value], ttl + self.stale_ttl)
+        except Exception:
+            logger.exception("failed to set %s in the cache", self._key(key))
+
+    def stats(self) -> dict:
+        """
+        Returns the hit and miss counters of the cache in this process.
+        """
+        return {
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+        }
+
+    async def get_many(
+        self,
+        keys: list[Hashable],
+        load: Callable[[list[Hashable]], Awaitable[list[Any]]],
+    ) -> list[Any]:
+        """
+        Gets the values for a list of keys, loading the keys that are not in the cache. Values that
+        are None are returned but not cached.
+
+        Args:
+            keys: the keys of the values
+            load: a function that loads the values for a list of keys. It must return the values in
+                the same order as the keys.
+
+        Returns:
+            The list of values in the same order as `keys`.
+        """
+        unique_keys = list(dict.fromkeys(keys))
+        entries = await asyncio.gather(
+            *(self.get(key) for key in unique_keys), return_exceptions=True)
+
+        values = {}
+        missing = []
+        stale = []
+        for key, entry in zip(unique_keys, entries):
+            if entry != None and not isinstance(entry, Exception):
+                values[key], fresh = entry
+                if fresh:
+                    self.hits += 1
+                else:
+                    self.stale_hits += 1
+                    stale.append(key)
+                continue
+
+            self.misses += 1
+            missing.append(key)
+
+        if stale:
+            task = asyncio.create_task(self._load(stale, load))
+            self._refreshes.add(task)
+            task.add_done_callback(self._refresh_done)
+
+        if missing:
+            values.update(zip(missing, await self._load(missing, load)))
+
+        return [values.get(key) for key in keys]
+
+    async def _load(
+        self,
+        keys: list[Hashable],
+        load: Callable[[list[Hashable]], Awaitable[list[Any]]],
+    ) -> list[Any]:
+        """
+        Loads a list of keys into the cache through the single-flight, so that the keys that are
+        already being loaded are awaited instead of loaded again.
+        """
+        async def load_and_set(flight_keys: list[tuple]) -> list[Any]:
+            values = await load([key for _, _, key in flight_keys])
+            await asyncio.gather(*(
+                self.set(key, value)
+                for (_, _, key), value in zip(flight_keys, values) if value != None
+            ))
+            return values
+
+        return await self.flight.do_many(
+            [("cache", self.namespace, key) for key in keys], load_and_set)
+
+    def _refresh_done(self, task: asyncio.Task):
+        """
+        Discards a finished background refresh. Failed refreshes leave the stale entry in place.
+        """
+        self._refreshes.discard(task)
+        if not task.cancelled():
+            task.exception()
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key, so that a function is only called once at a time
+    for each key and its result is shared by every caller that is waiting on it. This protects the
+    upstream APIs from bursts of identical requests, such as when a popular page is shared. Results
+    are not kept once the call finishes, so they must be cached elsewhere if they are reused.
+
+    The call runs in its own task, so it is not cancelled when the caller that started it is
+    cancelled while other callers are still waiting on it.
+    """
+    def __init__(self):
+        self.calls = 0
+        self.shared = 0
+        self._tasks: dict[Hashable, asyncio.Task] = {}
+
+    def stats(self) -> dict:
+        """
+        Returns the number of calls made and the number of callers that shared the result of a
+        call that was already in flight.
+        """
+        return {"calls": self.calls, "shared": self.shared}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Calls a function unless a call with the same key is in flight, in which case the result of
+        that call is awaited instead.
+
+        Args:
+            key: the key that identifies identical calls
+            fn: the function to call. Its result must not be modified by the callers, as it is
+                shared by all of them.
+
+        Returns:
+            The result of the call.
+
+        Raises:
+            Exception: Any exception raised by the call is raised to every caller
+        """
+        task = self._tasks.get(key)
+        if task != None:
+            self.shared += 1
+        else:
+            self.calls += 1
+            task = asyncio.ensure_future(fn())
+            self._tasks[key] = task
+            task.add_done_callback(lambda task: self._done(key, task))
+        return await asyncio.shield(task)
+
+    async def do_many(
+        self,
+        keys: list[Hashable],
+        fn: Callable[[list[Hashable]], Awaitable[list[T]]],
+    ) -> list[T]:
+        """
+        Calls a function once for the keys that have no call in flight, and awaits the calls in
+        flight for the others. This coalesces batched calls, such as loading a list of players.
+
+        Args:
+            keys: the distinct keys that identify identical calls
+            fn: the function to call with the keys that have no call in flight. It must return the
+                results in the same order as the keys.
+
+        Returns:
+            The list of results in the same order as `keys`.
+
+        Raises:
+            Exception: Any exception raised by a call is raised to every caller waiting on its keys
+        """
+        new_keys = [key for key in keys if key not in self._tasks]
+        self.shared += len(keys) - len(new_keys)
+        if new_keys:
+            self.calls += 1
+            batch = asyncio.ensure_future(fn(new_keys))
+            for i, key in enumerate(new_keys):
+                task = asyncio.ensure_future(self._result(batch, i))
+                self._tasks[key] = task
+                task.add_done_callback(lambda task, key=key: self._done(key, task))
+
+        tasks = [self._tasks[key] for key in keys]
+        return list(await asyncio.gather(*(asyncio.shield(task) for task in tasks)))
+
+    async def _result(self, batch: asyncio.Future, i: int) -> Any:
+        """
+        Gets the result of a key from the results of a batched call.
+        """
+        return (await batch)[i]
+
+    def _done(self, key: Hashable, task: asyncio.Task):
+        """
+        Forgets a finished call so that the next call with its key is made again.
+        """
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        if not task.cancelled():
+            # mark the exception as retrieved in case every caller was cancelled
+            task.exception()
@@ -1,12 +1,119 @@
-import psycopg
+import asyncio
 from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
 
 
 DB_NAME = "hockey"
 DB_USER = "root"
 
 
-def get_player_events(
+def create_pool(
+    min_size: int = 1,
+    max_size: int = 4,
+    max_lifetime: float = 30 * 60,
+    max_idle: float = 5 * 60,
+) -> AsyncConnectionPool:
+    """
+    Creates a pool of connections to the database. The pool is created closed and must be opened
+    with `open()` before it is used.
+
+    Every worker process has its own pool, so the database must accept `max_size` connections for
+    each worker.
+
+    Args:
+        min_size: the number of connections kept open by the pool
+        max_size: the maximum number of connections opened by the pool
+        max_lifetime: the number of seconds after which a connection is replaced
+        max_idle: the number of seconds an idle connection above `min_size` is kept open
+    """
+    return AsyncConnectionPool(
+        f"dbname={DB_NAME} user={DB_USER}",
+        open=False,
+        min_size=min_size,
+        max_size=max_size,
+        max_lifetime=max_lifetime,
+        max_idle=max_idle,
+        kwargs={"row_factory": dict_row},
+    )
+
+
+async def check_pool(pool: AsyncConnectionPool, interval: float):
+    """
+    Periodically checks the health of the idle connections of a pool. Broken connections are
+    discarded and replaced by the pool. Runs until it is cancelled.
+
+    Args:
+        pool: the pool to check
+        interval: the number of seconds between checks
+    """
+    while True:
+        await asyncio.sleep(interval)
+        await pool.check()
+
+
+async def get_players(pool: AsyncConnectionPool, ids: list[int]) -> dict[int, dict]:
+    """
+    Queries the database for the players with the given ids, as they are in the most recent game
+    they played in.
+
+    Args:
+        pool: the pool that provides the database connection.
+        ids: the ids of the players.
+
+    Returns:
+        A dictionary of the players in the format of the Stats API by id. Players that are not in
+        the database are not included.
+    """
+    async with pool.connection() as conn:
+        cur = await conn.execute(
+            "SELECT id, data FROM player WHERE id = ANY(%(ids)s)", {"ids": ids})
+        return {row["id"]: row["data"] for row in await cur.fetchall()}
+
+
+async def get_teams(pool: AsyncConnectionPool, ids: list[int]) -> dict[int, dict]:
+    """
+    Queries the database for the teams with the given ids, as they are in the most recent game
+    they played in.
+
+    Args:
+        pool: the pool that provides the database connection.
+        ids: the ids of the teams.
+
+    Returns:
+        A dictionary of the teams in the format of the Stats API by id. Teams that are not in the
+        database are not included.
+    """
+    async with pool.connection() as conn:
+        cur = await conn.execute(
+            "SELECT id, data FROM team WHERE id = ANY(%(ids)s)", {"ids": ids})
+        return {row["id"]: row["data"] for row in await cur.fetchall()}
+
+
+async def get_player_activity(pool: AsyncConnectionPool) -> dict[int, int]:
+    """
+    Queries the database for the number of events of each player in the most recent season, which
+    is used to rank the players in search results.
+
+    Args:
+        pool: the pool that provides the database connection.
+
+    Returns:
+        A dictionary of the number of events by player ID.
+    """
+    async with pool.connection() as conn:
+        cur = await conn.execute(
+            """
+            SELECT player_id, count(*) AS activity
+            FROM player_event
+            WHERE season = (SELECT max(season) FROM game)
+            GROUP BY player_id
+            """
+        )
+        return {row["player_id"]: row["activity"] for row in await cur.fetchall()}
+
+
+async def get_player_events(
+    pool: AsyncConnectionPool,
     player_id: int,
     event_type: str,
     player_type: str,
@@ -15,31 +122,137 @@ def get_player_events(
     Queries the database for an event involving a specific player over a period of time.
 
     Args:
+        pool: the pool that provides the database connection.
         player_id: the ID of the player.
         player_type: the type of the player in the event. This is used to identify the event type.
             For example, a shot event has the player types "shooter" and "goalie"
     """
-    with psycopg.connect(dbname=DB_NAME, user=DB_USER, row_factory=dict_row) as conn:
-        return conn.execute(
+    async with pool.connection() as conn:
+        cur = await conn.execute(
+            """
+            SELECT
+            game_id,
+            index,
+            event_type AS type,
+            x,
+            y,
+            period_number,
+            period_type,
+            period_time,
+            datetime
+            FROM player_event
+            WHERE player_id = %(player_id)s
+            AND season = %(season)s
+            AND event_type = %(event_type)s
+            AND player_type = %(player_type)s
+            """,
+            {
+                "player_id": player_id,
+                "event_type": event_type,
+                "player_type": player_type,
+                "season": season,
+            },
+        )
+        return await cur.fetchall()
+
+
+async def get_player_event_columns(
+    pool: AsyncConnectionPool,
+    player_id: int,
+    event_type: str,
+    player_type: str,
+    season: str):
+    """
+    Queries the database for the events involving a specific player as parallel arrays of their
+    columns, ordered by game and index. The arrays are built by the database, so a single row is
+    returned regardless of the number of events.
+
+    Args:
+        pool: the pool that provides the database connection.
+        player_id: the ID of the player.
+        player_type: the type of the player in the event.
+
+    Returns:
+        A dictionary of the arrays of each column, which are None if there are no events. Period
+        times are timedeltas and datetimes are datetimes, as they are for `get_player_events`.
+    """
+    async with pool.connection() as conn:
+        cur = await conn.execute(
+            """
+            SELECT
+            array_agg(game_id ORDER BY game_id, index) AS game_ids,
+            array_agg(index ORDER BY game_id, index) AS indexes,
+            array_agg(event_type ORDER BY game_id, index) AS types,
+            array_agg(x ORDER BY game_id, index) AS x,
+            array_agg(y ORDER BY game_id, index) AS y,
+            array_agg(period_number ORDER BY game_id, index) AS period_numbers,
+            array_agg(period_type ORDER BY game_id, index) AS period_types,
+            array_agg(period_time ORDER BY game_id, index) AS period_times,
+            array_agg(datetime ORDER BY game_id, index) AS datetimes
+            FROM player_event
+            WHERE player_id = %(player_id)s
+            AND season = %(season)s
+            AND event_type = %(event_type)s
+            AND player_type = %(player_type)s
+            """,
+            {
+                "player_id": player_id,
+                "event_type": event_type,
+                "player_type": player_type,
+                "season": season,
+            },
+        )
+        return await cur.fetchone()
+
+
+async def get_player_event_bins(
+    pool: AsyncConnectionPool,
+    player_id: int,
+    event_type: str,
+    player_type: str,
+    season: str,
+    bin_size: int,
+    x_min: int,
+    y_min: int):
+    """
+    Queries the database for the number of events involving a specific player in each bin of a
+    square grid. Events without coordinates are not counted.
+
+    Args:
+        pool: the pool that provides the database connection.
+        player_id: the ID of the player.
+        player_type: the type of the player in the event.
+        bin_size: the width and height of the bins.
+        x_min: the x coordinate of the start of the first column of bins.
+        y_min: the y coordinate of the start of the first row of bins.
+
+    Returns:
+        A list of dictionaries with the `column`, `row` and `count` of each non-empty bin.
+    """
+    async with pool.connection() as conn:
+        cur = await conn.execute(
             """
             SELECT
-            event.game_id AS game_id,
-            event.index AS index,
-            event.type AS type,
-            event.x AS x,
-            event.y AS y,
-            period.number AS period_number,
-            period.type AS period_type,
-            event.period_time AS period_time,
-            event.datetime AS datetime
-            FROM involved_player
-            INNER JOIN event ON involved_player.event_id = event.id
-            INNER JOIN game ON event.game_id = game.id
-            INNER JOIN period ON event.period_id = period.id
-            WHERE involved_player.player_id = %s
-            AND event.type = %s
-            AND involved_player.type = %s
-            AND game.season = %s
+            floor((x - %(x_min)s) / %(bin_size)s::numeric)::integer AS column,
+            floor((y - %(y_min)s) / %(bin_size)s::numeric)::integer AS row,
+            count(*)::integer AS count
+            FROM player_event
+            WHERE player_id = %(player_id)s
+            AND season = %(season)s
+            AND event_type = %(event_type)s
+            AND player_type = %(player_type)s
+            AND x IS NOT NULL
+            AND y IS NOT NULL
+            GROUP BY 1, 2
             """,
-            [player_id, event_type, player_type, season],
-        ).fetchall()
+            {
+                "player_id": player_id,
+                "event_type": event_type,
+                "player_type": player_type,
+                "season": season,
+                "bin_size": bin_size,
+                "x_min": x_min,
+                "y_min": y_min,
+            },
+        )
+        return await cur.fetchall()
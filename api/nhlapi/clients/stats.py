@@ -2,17 +2,99 @@
 This module provides an interface to the NHL's public facing stats API.
 """
 
+import asyncio
+import logging
+from typing import Awaitable, Callable
 import httpx
+from psycopg_pool import AsyncConnectionPool
+from nhlapi.breaker import CircuitBreaker, is_server_error
+from nhlapi.cache import CacheBackend, SingleFlight, TTLCache
+from nhlapi.clients import database as db
+
+
+# The freshness (in seconds) of the cached players and teams. Player bios change rarely and team
+# metadata essentially never changes within a season.
+PLAYER_TTL = 60 * 60
+PLAYER_STALE_TTL = 24 * 60 * 60
+TEAM_TTL = 24 * 60 * 60
+TEAM_STALE_TTL = 7 * 24 * 60 * 60
+
+logger = logging.getLogger(__name__)
+
+
+def create_player_cache(backend: CacheBackend, flight: SingleFlight | None = None) -> TTLCache:
+    """
+    Creates a cache for players requested from the Stats API.
+
+    Args:
+        backend: the backend that stores the cached players
+        flight: the single-flight that coalesces the loads of the same players
+    """
+    return TTLCache(
+        backend, "stats:player", ttl=PLAYER_TTL, stale_ttl=PLAYER_STALE_TTL, flight=flight)
+
+
+def create_team_cache(backend: CacheBackend, flight: SingleFlight | None = None) -> TTLCache:
+    """
+    Creates a cache for teams requested from the Stats API.
+
+    Args:
+        backend: the backend that stores the cached teams
+        flight: the single-flight that coalesces the loads of the same teams
+    """
+    return TTLCache(backend, "stats:team", ttl=TEAM_TTL, stale_ttl=TEAM_STALE_TTL, flight=flight)
 
 
 class StatsClient:
     """
-    A client for the public NHL Stats API.
+    A client for the public NHL Stats API. Players and teams requested in batches are read from
+    the database if there is one, and only requested from the API if they are not in it.
+
+    Args:
+        client: the HTTP client used to issue requests. It is expected to be shared so that
+            connections to the API are reused.
+        player_cache: the cache used for players requested in batches; no caching if None
+        team_cache: the cache used for teams requested in batches; no caching if None
+        db_pool: the pool of database connections used to read players and teams; the API is
+            always used if None
+        flight: the single-flight shared by the clients, so that concurrent identical requests
+            are only sent to the API once; not coalesced if None
+        breaker: the circuit breaker of the API, so that requests fail fast with
+            `CircuitOpenError` while it is failing or slow; requests always reach the API if None
     """
     base_url: str = "https://statsapi.web.nhl.com/api/v1"
 
-    @staticmethod
-    def get_player(id: int) -> dict | None:
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        player_cache: TTLCache | None = None,
+        team_cache: TTLCache | None = None,
+        db_pool: AsyncConnectionPool | None = None,
+        flight: SingleFlight | None = None,
+        breaker: CircuitBreaker | None = None,
+    ):
+        self.client = client
+        self.player_cache = player_cache
+        self.team_cache = team_cache
+        self.db_pool = db_pool
+        self.flight = flight
+        self.breaker = breaker
+
+    async def _get(self, url: str) -> httpx.Response:
+        """
+        Sends a GET request to the API through its circuit breaker, sharing the response with
+        concurrent identical requests.
+        """
+        async def get() -> httpx.Response:
+            if self.breaker != None:
+                return await self.breaker.call(lambda: self.client.get(url), failed=is_server_error)
+            return await self.client.get(url)
+
+        if self.flight != None:
+            return await self.flight.do(("get", url), get)
+        return await get()
+
+    async def get_player(self, id: int) -> dict | None:
         """
         Gets the player corresponding to a given player id.
 
@@ -22,12 +104,11 @@ class StatsClient:
         Returns:
             The player represented as dictionary if the request is successful; otherwise None.
         """
-        response = httpx.get(f"{StatsClient.base_url}/people/{id}")
+        response = await self._get(f"{self.base_url}/people/{id}")
         if response.is_success:
             return response.json().get("people")[0]
 
-    @staticmethod
-    def get_team(id: int) -> dict | None:
+    async def get_team(self, id: int) -> dict | None:
         """
         Gets the team corresponding to a given team id.
 
@@ -37,6 +118,117 @@ class StatsClient:
         Returns:
             The team represented as dictionary if the request is successful; otherwise None.
         """
-        response = httpx.get(f"{StatsClient.base_url}/teams/{id}")
+        response = await self._get(f"{self.base_url}/teams/{id}")
+        if response.is_success:
+            return response.json().get("teams")[0]
+
+    async def get_rosters(self) -> list[dict]:
+        """
+        Gets the active teams with their current rosters.
+
+        Returns:
+            The list of teams represented as dictionaries; empty list if the request is not
+            successful.
+        """
+        response = await self._get(f"{self.base_url}/teams?expand=team.roster")
         if response.is_success:
-            return response.json().get("teams")[0]
\ No newline at end of file
+            return response.json().get("teams", [])
+        return []
+
+    async def get_players(self, ids: list[int]) -> list[dict | None]:
+        """
+        Gets the players corresponding to a list of player ids. Players that are not cached are
+        requested using a single request. If the request is not successful, each player is
+        requested individually instead.
+
+        Args:
+            ids: the id numbers of the players
+
+        Returns:
+            The list of players represented as dictionaries in the same order as `ids`. A player
+            is None if it could not be found.
+        """
+        if self.player_cache != None:
+            return await self.player_cache.get_many(ids, self._fetch_players)
+        return await self._fetch_players(ids)
+
+    async def _fetch_players(self, ids: list[int]) -> list[dict | None]:
+        """
+        Gets the players corresponding to a list of player ids from the database, and requests the
+        players that are not in it from the API.
+        """
+        return await self._fetch_stored(ids, db.get_players, self._request_players)
+
+    async def _request_players(self, ids: list[int]) -> list[dict | None]:
+        """
+        Requests the players corresponding to a list of player ids from the API.
+        """
+        unique_ids = list(dict.fromkeys(ids))
+        response = await self._get(
+            f"{self.base_url}/people?personIds={','.join(map(str, unique_ids))}")
+        if response.is_success:
+            players = {player.get("id"): player for player in response.json().get("people", [])}
+        else:
+            results = await asyncio.gather(*(self.get_player(id) for id in unique_ids))
+            players = dict(zip(unique_ids, results))
+        return [players.get(id) for id in ids]
+
+    async def get_teams(self, ids: list[int]) -> list[dict | None]:
+        """
+        Gets the teams corresponding to a list of team ids. Teams that are not cached are requested
+        using a single request. If the request is not successful, each team is requested
+        individually instead.
+
+        Args:
+            ids: the id numbers of the teams
+
+        Returns:
+            The list of teams represented as dictionaries in the same order as `ids`. A team is
+            None if it could not be found.
+        """
+        if self.team_cache != None:
+            return await self.team_cache.get_many(ids, self._fetch_teams)
+        return await self._fetch_teams(ids)
+
+    async def _fetch_teams(self, ids: list[int]) -> list[dict | None]:
+        """
+        Gets the teams corresponding to a list of team ids from the database, and requests the
+        teams that are not in it from the API.
+        """
+        return await self._fetch_stored(ids, db.get_teams, self._request_teams)
+
+    async def _request_teams(self, ids: list[int]) -> list[dict | None]:
+        """
+        Requests the teams corresponding to a list of team ids from the API.
+        """
+        unique_ids = list(dict.fromkeys(ids))
+        response = await self._get(
+            f"{self.base_url}/teams?teamId={','.join(map(str, unique_ids))}")
+        if response.is_success:
+            teams = {team.get("id"): team for team in response.json().get("teams", [])}
+        else:
+            results = await asyncio.gather(*(self.get_team(id) for id in unique_ids))
+            teams = dict(zip(unique_ids, results))
+        return [teams.get(id) for id in ids]
+
+    async def _fetch_stored(
+        self,
+        ids: list[int],
+        read: Callable[[AsyncConnectionPool, list[int]], Awaitable[dict[int, dict]]],
+        request: Callable[[list[int]], Awaitable[list[dict | None]]],
+    ) -> list[dict | None]:
+        """
+        Reads the values of a list of ids from the database and requests the missing values from
+        the API. The API is used for every id if the database cannot be read.
+        """
+        stored = {}
+        if self.db_pool != None:
+            try:
+                stored = await read(self.db_pool, list(dict.fromkeys(ids)))
+            except Exception:
+                logger.exception("failed to read from the database; using the Stats API instead")
+
+        missing = [id for id in dict.fromkeys(ids) if id not in stored]
+        if missing:
+            stored.update(zip(missing, await request(missing)))
+        return [stored.get(id) for id in ids]
@@ -3,16 +3,55 @@ This module provides an interface to the NHL's public facing suggest API.
 """
 
 import httpx
+from nhlapi.breaker import CircuitBreaker, is_server_error
+from nhlapi.cache import CacheBackend, SingleFlight, TTLCache
+
+
+# The freshness (in seconds) of the cached suggestions
+SUGGESTION_TTL = 10 * 60
+SUGGESTION_STALE_TTL = 60 * 60
+
+
+def create_suggestion_cache(backend: CacheBackend, flight: SingleFlight | None = None) -> TTLCache:
+    """
+    Creates a cache for suggestions requested from the Suggest API.
+
+    Args:
+        backend: the backend that stores the cached suggestions
+        flight: the single-flight that coalesces the loads of the same suggestions
+    """
+    return TTLCache(
+        backend, "suggest", ttl=SUGGESTION_TTL, stale_ttl=SUGGESTION_STALE_TTL, flight=flight)
 
 
 class SuggestClient:
     """
     A client for the public NHL Suggest API.
+
+    Args:
+        client: the HTTP client used to issue requests. It is expected to be shared so that
+            connections to the API are reused.
+        cache: the cache used for suggestions; no caching if None
+        flight: the single-flight shared by the clients, so that concurrent identical requests
+            are only sent to the API once; not coalesced if None
+        breaker: the circuit breaker of the API, so that requests fail fast with
+            `CircuitOpenError` while it is failing or slow; requests always reach the API if None
     """
     base_url: str = "https://suggest.svc.nhl.com/svc/suggest/v1"
 
-    @staticmethod
-    def get_players(name: str, limit: int | None = None) -> list[dict]:
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        cache: TTLCache | None = None,
+        flight: SingleFlight | None = None,
+        breaker: CircuitBreaker | None = None,
+    ):
+        self.client = client
+        self.cache = cache
+        self.flight = flight
+        self.breaker = breaker
+
+    async def get_players(self, name: str, limit: int | None = None) -> list[dict]:
         """
         Gets a list of players whose name matches the query string.
 
@@ -23,17 +62,9 @@ class SuggestClient:
         Returns:
             The list of players whose name matches; empty list if no players match.
         """
-        num_results = ""
-        if limit:
-            num_results = str(limit)
+        return await self._get_suggestions("minplayers", name, limit)
 
-        response = httpx.get(f"{SuggestClient.base_url}/minplayers/{name}/{num_results}")
-        if response.is_success:
-            return response.json().get("suggestions")
-        return []
-
-    @staticmethod
-    def get_active_players(name: str, limit: int | None = None) -> list[dict]:
+    async def get_active_players(self, name: str, limit: int | None = None) -> list[dict]:
         """
         Gets a list of active players whose name matches the query string.
 
@@ -44,11 +75,44 @@ class SuggestClient:
         Returns:
             The list of active players players whose name matches; empty list if no players match.
         """
+        return await self._get_suggestions("minactiveplayers", name, limit)
+
+    async def _get_suggestions(self, endpoint: str, name: str, limit: int | None) -> list[dict]:
+        """
+        Gets the suggestions from an endpoint of the API, using the cache if there is one.
+        Unsuccessful requests are not cached.
+        """
         num_results = ""
         if limit:
             num_results = str(limit)
+        key = f"{endpoint}/{name.lower()}/{num_results}"
+
+        async def load(keys: list[str]) -> list[list[dict] | None]:
+            return [await self._request_suggestions(f"{self.base_url}/{path}") for path in keys]
+
+        if self.cache != None:
+            suggestions = await self.cache.get_many([key], load)
+        else:
+            suggestions = await load([key])
+        return suggestions[0] or []
+
+    async def _request_suggestions(self, url: str) -> list[dict] | None:
+        """
+        Requests the suggestions at a URL of the API.
+
+        Returns:
+            The list of suggestions; None if the request was unsuccessful.
+        """
+        async def get() -> httpx.Response:
+            if self.breaker != None:
+                return await self.breaker.call(
+                    lambda: self.client.get(url), failed=is_server_error)
+            return await self.client.get(url)
 
-        response = httpx.get(f"{SuggestClient.base_url}/minactiveplayers/{name}/{num_results}")
+        if self.flight != None:
+            response = await self.flight.do(("get", url), get)
+        else:
+            response = await get()
         if response.is_success:
             return response.json().get("suggestions")
-        return []
+        return None
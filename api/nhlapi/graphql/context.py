@@ -0,0 +1,79 @@
+"""
+This module provides the context that is shared by the resolvers of a GraphQL request.
+"""
+
+from fastapi import Request
+import httpx
+from psycopg_pool import AsyncConnectionPool
+from strawberry.dataloader import DataLoader
+from nhlapi.breaker import CircuitBreaker
+from nhlapi.cache import SingleFlight, TTLCache
+from nhlapi.clients.stats import StatsClient
+from nhlapi.clients.suggest import SuggestClient
+from nhlapi.search import PlayerIndex
+
+
+def create_context(
+    client: httpx.AsyncClient,
+    player_cache: TTLCache | None = None,
+    team_cache: TTLCache | None = None,
+    suggestion_cache: TTLCache | None = None,
+    db_pool: AsyncConnectionPool | None = None,
+    player_index: PlayerIndex | None = None,
+    flight: SingleFlight | None = None,
+    breakers: dict[str, CircuitBreaker] | None = None,
+) -> dict:
+    """
+    Creates the context for a single GraphQL request.
+
+    Args:
+        client: the shared HTTP client used by the API clients
+        player_cache: the process-wide cache of players from the Stats API
+        team_cache: the process-wide cache of teams from the Stats API
+        suggestion_cache: the process-wide cache of suggestions from the Suggest API
+        db_pool: the pool of database connections
+        player_index: the process-wide search index of the active players
+        flight: the process-wide single-flight that coalesces identical requests to the APIs
+        breakers: the process-wide circuit breakers of the APIs by name, "stats" and "suggest"
+
+    Returns:
+        A dictionary containing the API clients, database pool and data loaders available to the
+        resolvers.
+        The data loaders batch and deduplicate the players and teams requested while resolving.
+    """
+    breakers = breakers or {}
+    stats = StatsClient(
+        client,
+        player_cache=player_cache,
+        team_cache=team_cache,
+        db_pool=db_pool,
+        flight=flight,
+        breaker=breakers.get("stats"),
+    )
+    return {
+        "stats": stats,
+        "suggest": SuggestClient(
+            client, cache=suggestion_cache, flight=flight, breaker=breakers.get("suggest")),
+        "player_loader": DataLoader(load_fn=stats.get_players),
+        "team_loader": DataLoader(load_fn=stats.get_teams),
+        "db_pool": db_pool,
+        "player_index": player_index,
+    }
+
+
+async def get_context(request: Request) -> dict:
+    """
+    Gets the context of a GraphQL request made to the app. Used as the `context_getter` of the
+    GraphQL router.
+    """
+    state = request.app.state
+    return create_context(
+        state.http_client,
+        player_cache=state.player_cache,
+        team_cache=state.team_cache,
+        suggestion_cache=state.suggestion_cache,
+        db_pool=state.db_pool,
+        player_index=state.player_index,
+        flight=state.flight,
+        breakers=state.breakers,
+    )
@@ -1,4 +1,5 @@
 from nhlapi.graphql.definitions.player import Player
 from nhlapi.graphql.definitions.team import Team
 from nhlapi.graphql.definitions.suggestion import PlayerSuggestion
-from nhlapi.graphql.definitions.event import Event
\ No newline at end of file
+from nhlapi.graphql.definitions.event import Event, EventColumns
+from nhlapi.graphql.definitions.heatmap import Heatmap
\ No newline at end of file
@@ -54,3 +54,40 @@ class Event:
             ),
             datetime = event_dict.get("datetime"),
         )
+
+
+@strawberry.type
+class EventColumns:
+    """
+    Represents a list of events as parallel lists of their fields, where the fields of the nth event
+    are the nth items of the lists. This is much smaller than a list of events when serialized.
+    """
+    game_ids: list[int]
+    indexes: list[int]
+    types: list[str]
+    x: list[int | None]
+    y: list[int | None]
+    period_numbers: list[int]
+    period_types: list[str]
+    period_times: list[str]
+    datetimes: list[str]
+
+    @classmethod
+    def from_dict(cls, columns_dict: dict):
+        """
+        Creates new event columns from a dictionary representation.
+
+        Args:
+            dict: the dictionary representation of the event columns.
+        """
+        return cls(
+            game_ids = columns_dict.get("game_ids") or [],
+            indexes = columns_dict.get("indexes") or [],
+            types = columns_dict.get("types") or [],
+            x = columns_dict.get("x") or [],
+            y = columns_dict.get("y") or [],
+            period_numbers = columns_dict.get("period_numbers") or [],
+            period_types = columns_dict.get("period_types") or [],
+            period_times = columns_dict.get("period_times") or [],
+            datetimes = columns_dict.get("datetimes") or [],
+        )
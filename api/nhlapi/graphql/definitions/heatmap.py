@@ -0,0 +1,52 @@
+import math
+import strawberry
+
+
+# The extent of the rink in the coordinates of the events, with the center ice at the origin
+RINK_X_MIN = -100
+RINK_X_MAX = 100
+RINK_Y_MIN = -43
+RINK_Y_MAX = 43
+
+
+@strawberry.type
+class Heatmap:
+    """
+    Represents the number of events in each bin of a square grid over the rink. The grid starts at
+    the corner (`x_min`, `y_min`) of the rink, and `counts[row][column]` is the number of events
+    with `x_min + column * bin_size <= x < x_min + (column + 1) * bin_size` and
+    `y_min + row * bin_size <= y < y_min + (row + 1) * bin_size`. Events on the edge of the rink
+    are counted in the last bin.
+    """
+    bin_size: int
+    x_min: int
+    y_min: int
+    total: int
+    counts: list[list[int]]
+
+    @classmethod
+    def from_bins(cls, bins: list[dict], bin_size: int):
+        """
+        Creates a new heatmap from the event counts of the non-empty bins.
+
+        Args:
+            bins: the dictionaries with the `column`, `row` and `count` of each non-empty bin
+            bin_size: the width and height of the bins
+        """
+        columns = math.ceil((RINK_X_MAX - RINK_X_MIN) / bin_size)
+        rows = math.ceil((RINK_Y_MAX - RINK_Y_MIN) / bin_size)
+        counts = [[0] * columns for _ in range(rows)]
+        total = 0
+        for bin in bins:
+            column = min(max(bin["column"], 0), columns - 1)
+            row = min(max(bin["row"], 0), rows - 1)
+            counts[row][column] += bin["count"]
+            total += bin["count"]
+
+        return cls(
+            bin_size=bin_size,
+            x_min=RINK_X_MIN,
+            y_min=RINK_Y_MIN,
+            total=total,
+            counts=counts,
+        )
@@ -1,7 +1,7 @@
 import strawberry
 from enum import Enum
+from strawberry.types import Info
 from nhlapi.graphql.definitions.team import Team
-from nhlapi.clients.stats import StatsClient
 
 
 @strawberry.type
@@ -71,12 +71,12 @@ class Player:
         return self.first_name + " " + self.last_name
 
     @strawberry.field
-    def team(self) -> Team | None:
+    async def team(self, info: Info) -> Team | None:
         """
         The current team of the player.
         """
         if self.team_id:
-            return Team.from_dict(StatsClient.get_team(self.team_id))
+            return Team.from_dict(await info.context["team_loader"].load(self.team_id))
 
     @classmethod
     def from_dict(cls, player_dict: dict):
@@ -1,6 +1,6 @@
 import strawberry
+from strawberry.types import Info
 from nhlapi.graphql.definitions.player import Player
-from nhlapi.clients.stats import StatsClient
 
 
 @strawberry.type
@@ -23,11 +23,11 @@ class PlayerSuggestion:
         return self.first_name + " " + self.last_name
 
     @strawberry.field
-    def player(self) -> Player:
+    async def player(self, info: Info) -> Player:
         """
         The full details of the suggested player.
         """
-        return Player.from_dict(StatsClient.get_player(self.id))
+        return Player.from_dict(await info.context["player_loader"].load(int(self.id)))
 
     @classmethod
     def from_str(cls, suggestion: str):
@@ -46,3 +46,20 @@ class PlayerSuggestion:
             position = args[12],
             number = args[13],
         )
+
+    @classmethod
+    def from_dict(cls, suggestion_dict: dict):
+        """
+        Creates a player suggestion from a dictionary representation.
+
+        Args:
+            suggestion_dict: a player from the player search index.
+        """
+        return cls(
+            id = suggestion_dict.get("id"),
+            last_name = suggestion_dict.get("last_name"),
+            first_name = suggestion_dict.get("first_name"),
+            team = suggestion_dict.get("team"),
+            position = suggestion_dict.get("position"),
+            number = suggestion_dict.get("number"),
+        )
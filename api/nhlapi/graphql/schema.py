@@ -1,40 +1,52 @@
 from datetime import datetime
 import strawberry
-from nhlapi.graphql.definitions import PlayerSuggestion, Player, Team, Event
-from nhlapi.clients.stats import StatsClient
-from nhlapi.clients.suggest import SuggestClient
+from strawberry.types import Info
+from nhlapi.graphql.definitions import (
+    PlayerSuggestion, Player, Team, Event, EventColumns, Heatmap)
+from nhlapi.graphql.definitions.heatmap import RINK_X_MIN, RINK_Y_MIN
 from nhlapi.clients import database as db
 
 @strawberry.type
 class Query:
     @strawberry.field
-    def player(self, id: int) -> Player | None:
+    async def player(self, info: Info, id: int) -> Player | None:
         """
-        Returns a player from the NHL Stats API if the request is successful; otherwise None.
+        Returns a player from the database, or from the NHL Stats API if the player is not in the
+        database. Returns None if the player cannot be found.
         """
-        player = StatsClient.get_player(id)
+        player = await info.context["player_loader"].load(id)
         if player:
             return Player.from_dict(player)
 
     @strawberry.field
-    def team(self, id: int) -> Team | None:
+    async def team(self, info: Info, id: int) -> Team | None:
         """
-        Returns a team from the NHL Stats API if the request is successful; otherwise None.
+        Returns a team from the database, or from the NHL Stats API if the team is not in the
+        database. Returns None if the team cannot be found.
         """
-        team = StatsClient.get_team(id)
+        team = await info.context["team_loader"].load(id)
         if team:
             return Team.from_dict(team)
 
     @strawberry.field
-    def player_suggestions(self, name: str, limit: int | None = None) -> list[PlayerSuggestion]:
+    async def player_suggestions(self,
+        info: Info,
+        name: str,
+        limit: int | None = None
+    ) -> list[PlayerSuggestion]:
         """
-        Returns a list of player suggestions from the NHL Suggest API.
+        Returns a list of player suggestions from the player search index, or from the NHL Suggest
+        API while the index is not yet built.
         """
-        suggestions = SuggestClient.get_active_players(name, limit=limit)
+        index = info.context.get("player_index")
+        if index:
+            return [PlayerSuggestion.from_dict(player) for player in index.search(name, limit)]
+        suggestions = await info.context["suggest"].get_active_players(name, limit=limit)
         return [PlayerSuggestion.from_str(player) for player in suggestions]
 
     @strawberry.field
-    def player_events(self,
+    async def player_events(self,
+        info: Info,
         player_id: int,
         event_type: str,
         player_type: str,
@@ -44,5 +56,42 @@ class Query:
         Returns a list of events that were performed by a given player and occur from the start date
         to the end date.
         """
-        events = db.get_player_events(player_id, event_type, player_type, season)
-        return [Event.from_dict(event) for event in events]
\ No newline at end of file
+        events = await db.get_player_events(
+            info.context["db_pool"], player_id, event_type, player_type, season)
+        return [Event.from_dict(event) for event in events]
+
+    @strawberry.field
+    async def player_event_columns(self,
+        info: Info,
+        player_id: int,
+        event_type: str,
+        player_type: str,
+        season: str
+    ) -> EventColumns:
+        """
+        Returns the events that were performed by a given player in a season as parallel lists of
+        their fields, which is much faster to serialize than `playerEvents` for large seasons.
+        """
+        columns = await db.get_player_event_columns(
+            info.context["db_pool"], player_id, event_type, player_type, season)
+        return EventColumns.from_dict(columns)
+
+    @strawberry.field
+    async def player_event_heatmap(self,
+        info: Info,
+        player_id: int,
+        event_type: str,
+        player_type: str,
+        season: str,
+        bin_size: int = 5
+    ) -> Heatmap:
+        """
+        Returns the number of events performed by a given player in a season in each bin of a grid
+        over the rink. The events are counted by the database, so only the counts are returned.
+        """
+        if bin_size < 1:
+            raise ValueError("binSize must be a positive number of feet")
+        bins = await db.get_player_event_bins(
+            info.context["db_pool"], player_id, event_type, player_type, season,
+            bin_size, RINK_X_MIN, RINK_Y_MIN)
+        return Heatmap.from_bins(bins, bin_size)
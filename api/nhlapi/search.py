@@ -0,0 +1,279 @@
+"""
+This module provides a local search index of the active players. Player suggestions are served from
+the index instead of requesting the Suggest API on every keystroke. The index is built from a
+snapshot of the team rosters and refreshed in the background. Names are matched by prefix and by
+the trigram similarity of their words, so suggestions tolerate typos.
+"""
+
+import asyncio
+import bisect
+import heapq
+import logging
+import math
+import unicodedata
+from collections import Counter
+from typing import Awaitable, Callable
+
+
+# The number of seconds between refreshes of the index, and between retries while it is empty
+INDEX_REFRESH_INTERVAL = 6 * 60 * 60
+INDEX_RETRY_INTERVAL = 60
+
+# The number of players returned by a search without a limit, as by the Suggest API it replaces
+SEARCH_DEFAULT_LIMIT = 10
+
+logger = logging.getLogger(__name__)
+
+
+def fold(text: str) -> str:
+    """
+    Folds a string for matching so that searches ignore case, accents and repeated whitespace.
+
+    Args:
+        text: the string to fold
+
+    Returns:
+        The folded string, e.g. "Tim Stützle" is folded to "tim stutzle".
+    """
+    decomposed = unicodedata.normalize("NFKD", text)
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join(stripped.casefold().split())
+
+
+def roster_players(teams: list[dict], activity: dict[int, int] | None = None) -> list[dict]:
+    """
+    Gets the players of a list of teams with their rosters from the Stats API.
+
+    Args:
+        teams: the teams returned by the `teams?expand=team.roster` endpoint
+        activity: the activity of the players by ID, such as their number of recent events
+
+    Returns:
+        The list of players as dictionaries with the fields of a player suggestion.
+    """
+    players = []
+    for team in teams:
+        for player in (team.get("roster") or {}).get("roster", []):
+            person = player.get("person") or {}
+            first_name, _, last_name = (person.get("fullName") or "").partition(" ")
+            players.append({
+                "id": person.get("id"),
+                "first_name": first_name,
+                "last_name": last_name,
+                "number": player.get("jerseyNumber") or "",
+                "team": team.get("abbreviation") or "",
+                "position": (player.get("position") or {}).get("abbreviation") or "",
+                "activity": (activity or {}).get(person.get("id"), 0),
+            })
+    return players
+
+
+def trigrams(text: str) -> frozenset[str]:
+    """
+    Gets the trigrams of a folded string. Like `pg_trgm`, each word is padded with two spaces
+    before and one space after, so that the start of a word weighs more than its end.
+
+    Args:
+        text: the folded string
+
+    Returns:
+        The set of trigrams of the words in the string.
+    """
+    grams = set()
+    for word in text.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return frozenset(grams)
+
+
+class PlayerIndex:
+    """
+    A search index of players by name. Players are matched by prefix and, to tolerate typos, by
+    trigram similarity. Matches are ranked by match quality, then by player activity, then by name.
+
+    The players are stored in the order they are ranked when their match quality is the same, so
+    matches are ranked by their position. The folded names of the players are kept in a sorted
+    list, so the players that match a prefix are found with a binary search. Each player can be
+    found by "first last" and by "last first". The distinct words of the names are indexed by
+    trigram, so similar words are found by counting the trigrams they share with a query.
+
+    Args:
+        players: the players in the index, as dictionaries with `first_name` and `last_name`, and
+            optionally `activity`, a number that is higher for more active players
+        similarity: the minimum trigram similarity of a name to a query for it to match
+    """
+    def __init__(self, players: list[dict] | None = None, similarity: float = 0.3):
+        self.similarity = similarity
+        self.update(players or [])
+
+    def __len__(self) -> int:
+        return len(self._players)
+
+    def update(self, players: list[dict]):
+        """
+        Replaces the players in the index. The index is rebuilt before it is swapped in, so
+        searches never see a partially built index.
+
+        Args:
+            players: the new players in the index
+        """
+        names = [
+            (fold(player.get("first_name") or ""), fold(player.get("last_name") or ""))
+            for player in players
+        ]
+        order = sorted(range(len(players)), key=lambda i: (
+            -(players[i].get("activity") or 0), names[i][1], names[i][0]))
+
+        keys = []
+        words: dict[str, list[int]] = {}
+        for position, i in enumerate(order):
+            first_name, last_name = names[i]
+            keys.append((f"{first_name} {last_name}".strip(), position))
+            keys.append((f"{last_name} {first_name}".strip(), position))
+            for word in set(first_name.split() + last_name.split()):
+                words.setdefault(word, []).append(position)
+        keys.sort()
+
+        postings: dict[str, list[int]] = {}
+        word_sizes = []
+        word_players = []
+        for j, (word, positions) in enumerate(words.items()):
+            grams = trigrams(word)
+            for gram in grams:
+                postings.setdefault(gram, []).append(j)
+            word_sizes.append(len(grams))
+            word_players.append(positions)
+
+        self._players, self._keys, self._positions = (
+            [players[i] for i in order], [key for key, _ in keys], [i for _, i in keys])
+        self._postings, self._posting_sets, self._word_sizes, self._word_players = (
+            postings, {gram: set(words) for gram, words in postings.items()}, word_sizes,
+            word_players)
+
+    def search(self, query: str, limit: int | None = None) -> list[dict]:
+        """
+        Searches for the players whose name starts with a query string or is similar to it.
+        Players that match by prefix are returned first, then players whose names are similar by
+        decreasing similarity. Ties are ordered by activity, then by name.
+
+        Args:
+            query: the player name or the start of it
+            limit: the maximum number of players to return; `SEARCH_DEFAULT_LIMIT` if None
+
+        Returns:
+            The list of matching players; empty list if no players match.
+        """
+        if limit == None:
+            limit = SEARCH_DEFAULT_LIMIT
+        players = self._players
+        prefix = fold(query)
+        if not prefix or limit == 0:
+            return []
+
+        ranked = self._prefix_matches(prefix, limit)
+        # too few trigrams are shared with shorter queries for their similarity to be meaningful
+        if len(prefix) >= 3 and len(ranked) < limit:
+            similar = self._similar_matches(prefix)
+            for i in ranked:
+                similar.pop(i, None)
+            ranked.extend(sorted(similar, key=lambda i: (-similar[i], i)))
+
+        return [players[i] for i in ranked[:limit]]
+
+    def _prefix_matches(self, prefix: str, limit: int | None) -> list[int]:
+        """
+        Gets the positions of the players who have a name that starts with a folded prefix, in
+        order. At least `limit` positions are returned if there are as many matches.
+        """
+        keys = self._keys
+        start = bisect.bisect_left(keys, prefix)
+        # the keys that start with the prefix sort before the prefix followed by the largest
+        # code point
+        end = bisect.bisect_left(keys, prefix + "\U0010ffff", start)
+        positions = self._positions[start:end]
+        if limit != None and len(positions) > 2 * limit:
+            # each player has two keys, so the smallest positions include `limit` players
+            positions = heapq.nsmallest(2 * limit, positions)
+        return sorted(set(positions))
+
+    def _similar_matches(self, text: str) -> dict[int, float]:
+        """
+        Gets the positions of the players whose name is similar to a folded string, with their
+        similarity. The similarity of a player is the average of the highest similarity of each
+        word of the string to a word of the player's name.
+        """
+        query_words = text.split()
+        scores: dict[int, float] = {}
+        for query_word in query_words:
+            best: dict[int, float] = {}
+            for j, similarity in self._similar_words(query_word).items():
+                for i in self._word_players[j]:
+                    if similarity > best.get(i, 0):
+                        best[i] = similarity
+            for i, similarity in best.items():
+                scores[i] = scores.get(i, 0) + similarity
+
+        threshold = self.similarity * len(query_words)
+        return {i: score / len(query_words) for i, score in scores.items() if score >= threshold}
+
+    def _similar_words(self, word: str) -> dict[int, float]:
+        """
+        Gets the indexes of the words that are similar to a folded word, with their similarity. The
+        similarity of two words is the number of trigrams they share divided by the number of
+        distinct trigrams of both.
+        """
+        query = trigrams(word)
+        postings = self._postings
+        # a word is only similar if it shares at least `shared` trigrams with the query, so it has
+        # to contain one of the rarest `len(query) - shared + 1` trigrams of the query. The words
+        # are counted from the lists of those trigrams and only checked against the others.
+        shared = math.ceil(self.similarity * len(query))
+        grams = sorted(query, key=lambda gram: len(postings.get(gram, ())))
+        rarest = len(query) - shared + 1
+        counts = Counter()
+        for gram in grams[:rarest]:
+            counts.update(postings.get(gram, ()))
+        if len(counts) == 0:
+            return {}
+        candidates = set(counts)
+        for gram in grams[rarest:]:
+            counts.update(candidates & self._posting_sets.get(gram, set()))
+
+        sizes = self._word_sizes
+        similar = {}
+        for j in [j for j, count in counts.items() if count >= shared]:
+            similarity = counts[j] / (len(query) + sizes[j] - counts[j])
+            if similarity >= self.similarity:
+                similar[j] = similarity
+        return similar
+
+
+async def refresh_index(
+    index: PlayerIndex,
+    load: Callable[[], Awaitable[list[dict]]],
+    interval: float = INDEX_REFRESH_INTERVAL,
+    retry_interval: float = INDEX_RETRY_INTERVAL,
+):
+    """
+    Refreshes an index periodically until cancelled. Failed refreshes leave the index unchanged and
+    are retried after `retry_interval` seconds.
+
+    Args:
+        index: the index to refresh
+        load: a function that loads the players of the index
+        interval: the number of seconds between refreshes
+        retry_interval: the number of seconds before a failed or empty refresh is retried
+    """
+    while True:
+        try:
+            players = await load()
+        except Exception:
+            logger.exception("failed to refresh the player index")
+            players = []
+
+        if players:
+            index.update(players)
+            logger.info("refreshed the player index with %d players", len(players))
+            await asyncio.sleep(interval)
+        else:
+            await asyncio.sleep(retry_interval)
@@ -2,41 +2,367 @@
 This module contains utility functions for the NHL API proxy server.
 """
 
+import hashlib
+import importlib.util
 from fastapi import Request, Response, HTTPException
+from fastapi.responses import StreamingResponse
 import httpx
+from starlette.background import BackgroundTask
+from nhlapi.breaker import CircuitBreaker, CircuitOpenError, is_server_error
+from nhlapi.cache import CacheBackend, SingleFlight, TTLCache
 
 
-def forward_request(api_url: str, request: Request) -> Response:
+# The headers of an API response that are forwarded to the client
+FORWARDED_HEADERS = ("cache-control", "etag", "last-modified")
+
+# The headers of an API response that are forwarded to the client when the response is streamed
+STREAMED_HEADERS = FORWARDED_HEADERS + (
+    "content-encoding", "content-length", "content-type", "vary")
+
+# The number of seconds an expired API response is kept so that it can be revalidated
+RESPONSE_STALE_TTL = 24 * 60 * 60
+
+
+def create_client(
+    max_connections: int | None = 100,
+    max_keepalive_connections: int | None = 20,
+    keepalive_expiry: float | None = 5.0,
+    timeout: httpx.Timeout = httpx.Timeout(10.0),
+) -> httpx.AsyncClient:
+    """
+    Creates an asynchronous HTTP client with a pool of keep-alive connections. The client is meant
+    to be created once and shared for the lifetime of the application so that connections to the
+    upstream APIs are reused across requests. HTTP/2 is used if the `h2` package is installed.
+
+    Args:
+        max_connections: the maximum number of concurrent connections
+        max_keepalive_connections: the maximum number of idle connections kept in the pool
+        keepalive_expiry: the number of seconds an idle connection is kept in the pool
+        timeout: the default timeout for requests made by the client
+
+    Returns:
+        The HTTP client. It must be closed with `aclose()` once it is no longer needed.
+    """
+    limits = httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_keepalive_connections,
+        keepalive_expiry=keepalive_expiry,
+    )
+    http2 = importlib.util.find_spec("h2") is not None
+    return httpx.AsyncClient(limits=limits, timeout=timeout, http2=http2)
+
+
+def create_response_cache(backend: CacheBackend) -> TTLCache:
+    """
+    Creates a cache for the API responses of forwarded requests. The freshness of each response is
+    given when it is cached.
+
+    Args:
+        backend: the backend that stores the cached responses. Responses can be large, so the
+            backend should not be shared with the caches of other values, and its size should be
+            bounded in bytes.
+    """
+    return TTLCache(backend, "proxy", ttl=0, stale_ttl=RESPONSE_STALE_TTL)
+
+
+async def forward_request(
+    client: httpx.AsyncClient,
+    api_url: str,
+    request: Request,
+    timeout: httpx.Timeout | None = None,
+    cache: TTLCache | None = None,
+    ttl: float | None = None,
+    flight: SingleFlight | None = None,
+    breaker: CircuitBreaker | None = None,
+) -> Response:
     """
     Forwards a request to an API at the given url. Requires that the request has a path parameter 
     called `endpoint` that represents the endpoint from the API's URL.
 
+    The `Cache-Control`, `ETag` and `Last-Modified` headers of the API response are forwarded, and
+    an `ETag` is generated if the API does not provide one, so that requests with a matching
+    `If-None-Match` header are answered with 304 Not Modified. If a cache is given, responses are
+    cached by url and are fresh for the `max-age` of the API response, or for `ttl` seconds if it
+    is given. Responses without a `max-age` are cached as stale, and responses marked `no-store`
+    or `private` are not cached. Stale responses are revalidated
+    with a conditional request to the API. If a single-flight is given, concurrent requests for the
+    same url share a single request to the API.
+
+    If a circuit breaker is given, requests fail fast while the API is failing or slow. When the
+    API cannot be reached, its circuit is open or it responds with a server error, the last cached
+    response is returned even if it is stale, with a `Warning` header.
+
     Example:
         The following passes the entire path after `/home` to this function:
     ```py
         @app.get("/home/{endpoint:path}")
-        def home(request: Request) -> Response:
-            return forward_request("localhost", request)
+        async def home(request: Request) -> Response:
+            return await forward_request(client, "localhost", request)
     ```
 
     Args:
+        client: The HTTP client used to issue the request
         api_url: The base url of the API
-        path: The path paramters of the request
+        request: The request to forward
+        timeout: The timeout for the request; the client's default timeout is used if None
+        cache: The cache of API responses; responses are not cached if None
+        ttl: The number of seconds responses are fresh, overriding the `Cache-Control` of the API
+        flight: The single-flight that coalesces concurrent requests; not coalesced if None
+        breaker: The circuit breaker of the API; requests always reach the API if None
 
     Returns:
         The response from the API request at the given endpoint.
 
     Raises:
         AssertionError: If `request` does not have the path parameter "endpoint"
-        HTTPException: If the response was not successful
+        HTTPException: If the response was not successful, or with 503 if the circuit of the API
+            is open and there is no cached response
         httpx.RequestError: If an error occurs issuing a request to the endpoint
     """
     endpoint = request.path_params.get("endpoint")
 
     assert endpoint != None, "forward_request: request must have the path parameter 'endpoint'"
 
-    response = httpx.get(f"{api_url}/{endpoint}?{request.query_params}")
-    if response.is_success:
-        return response.json()
+    url = f"{api_url}/{endpoint}?{request.query_params}"
+
+    entry = None
+    if cache != None:
+        entry = await cache.get(url)
+        if entry != None and entry[1]:
+            return cached_response(entry[0], request)
+
+    async def fetch() -> dict:
+        headers = {}
+        if entry != None:
+            cached_headers = entry[0]["headers"]
+            if "etag" in cached_headers:
+                headers["If-None-Match"] = cached_headers["etag"]
+            if "last-modified" in cached_headers:
+                headers["If-Modified-Since"] = cached_headers["last-modified"]
+
+        async def get() -> httpx.Response:
+            return await client.get(
+                url, headers=headers, timeout=timeout or httpx.USE_CLIENT_DEFAULT)
+
+        if breaker != None:
+            response = await breaker.call(get, failed=is_server_error)
+        else:
+            response = await get()
+        if response.status_code == 304 and entry != None:
+            cached = entry[0]
+        elif response.is_success:
+            cached = {
+                "body": response.text,
+                "media_type": response.headers.get("content-type", "application/json"),
+                "headers": {
+                    name: response.headers[name]
+                    for name in FORWARDED_HEADERS if name in response.headers
+                },
+            }
+            if "etag" not in cached["headers"]:
+                digest = hashlib.sha1(response.content).hexdigest()
+                cached["headers"]["etag"] = f'W/"{digest}"'
+        else:
+            raise HTTPException(response.status_code)
+
+        fresh_ttl = ttl
+        storable = True
+        if fresh_ttl != None:
+            cached["headers"]["cache-control"] = f"public, max-age={int(fresh_ttl)}"
+        else:
+            fresh_ttl = max_age(response.headers.get("cache-control"))
+            storable = is_storable(response.headers.get("cache-control"))
+        if cache != None and storable:
+            # responses that are not fresh are still kept as the last known good response, so
+            # they can be revalidated and served stale when the API fails
+            await cache.set(url, cached, fresh_ttl or 0)
+        return cached
+
+    try:
+        if flight != None:
+            cached = await flight.do(("proxy", url), fetch)
+        else:
+            cached = await fetch()
+    except CircuitOpenError:
+        if entry != None:
+            return stale_response(entry[0], request)
+        raise HTTPException(503)
+    except httpx.RequestError:
+        if entry != None:
+            return stale_response(entry[0], request)
+        raise
+    except HTTPException as exc:
+        if exc.status_code >= 500 and entry != None:
+            return stale_response(entry[0], request)
+        raise
+    return cached_response(cached, request)
+
+
+async def stream_request(
+    client: httpx.AsyncClient,
+    api_url: str,
+    request: Request,
+    timeout: httpx.Timeout | None = None,
+    breaker: CircuitBreaker | None = None,
+) -> Response:
+    """
+    Forwards a request to an API at the given url and streams the body of the API response to the
+    client without decoding it. The `Accept-Encoding` and conditional headers of the request are
+    forwarded so that the compressed bytes of the API can be relayed as-is. This keeps memory usage
+    flat for large responses, but the responses are not cached, so no stale response can be
+    returned when the API fails. Responses vary on `Accept-Encoding`, which is added to the `Vary`
+    header of the API response. Requires that the request has a path parameter called `endpoint`
+    that represents the endpoint from the API's URL.
+
+    Args:
+        client: The HTTP client used to issue the request
+        api_url: The base url of the API
+        request: The request to forward
+        timeout: The timeout for the request; the client's default timeout is used if None
+        breaker: The circuit breaker of the API; requests always reach the API if None
+
+    Returns:
+        The streamed response from the API request at the given endpoint.
+
+    Raises:
+        AssertionError: If `request` does not have the path parameter "endpoint"
+        HTTPException: If the response was not successful, or with 503 if the circuit of the API
+            is open
+        httpx.RequestError: If an error occurs issuing a request to the endpoint
+    """
+    endpoint = request.path_params.get("endpoint")
+
+    assert endpoint != None, "stream_request: request must have the path parameter 'endpoint'"
+
+    headers = {"Accept-Encoding": request.headers.get("accept-encoding", "identity")}
+    for name in ("if-none-match", "if-modified-since"):
+        if name in request.headers:
+            headers[name] = request.headers[name]
 
-    raise HTTPException(response.status_code)
+    upstream_request = client.build_request(
+        "GET",
+        f"{api_url}/{endpoint}?{request.query_params}",
+        headers=headers,
+        timeout=timeout or httpx.USE_CLIENT_DEFAULT,
+    )
+    async def send() -> httpx.Response:
+        return await client.send(upstream_request, stream=True)
+
+    if breaker != None:
+        try:
+            response = await breaker.call(send, failed=is_server_error)
+        except CircuitOpenError:
+            raise HTTPException(503)
+    else:
+        response = await send()
+    response_headers = {
+        name: response.headers[name] for name in STREAMED_HEADERS if name in response.headers
+    }
+    # the encoding of the relayed bytes depends on the `Accept-Encoding` of the request, so caches
+    # must not serve them to clients that accept other encodings
+    vary = [value.strip() for value in response_headers.get("vary", "").split(",") if value.strip()]
+    if "accept-encoding" not in (value.lower() for value in vary):
+        response_headers["vary"] = ", ".join(vary + ["Accept-Encoding"])
+
+    if response.status_code == 304:
+        await response.aclose()
+        return Response(status_code=304, headers=response_headers)
+    if not response.is_success:
+        await response.aclose()
+        raise HTTPException(response.status_code)
+
+    return StreamingResponse(
+        response.aiter_raw(),
+        status_code=response.status_code,
+        headers=response_headers,
+        background=BackgroundTask(response.aclose),
+    )
+
+
+def cached_response(cached: dict, request: Request) -> Response:
+    """
+    Creates the response for a cached API response. If the `If-None-Match` header of the request
+    matches the `ETag` of the cached response, the response is 304 Not Modified.
+
+    Args:
+        cached: the cached API response
+        request: the request being answered
+    """
+    if etag_matches(request.headers.get("if-none-match"), cached["headers"].get("etag")):
+        return Response(status_code=304, headers=cached["headers"])
+    return Response(cached["body"], media_type=cached["media_type"], headers=cached["headers"])
+
+
+def stale_response(cached: dict, request: Request) -> Response:
+    """
+    Creates the response for a stale cached API response, which is served when the API is
+    unavailable.
+
+    Args:
+        cached: the cached API response
+        request: the request being answered
+    """
+    response = cached_response(cached, request)
+    response.headers["warning"] = '110 - "Response is Stale"'
+    return response
+
+
+def cache_directives(cache_control: str | None) -> dict[str, str]:
+    """
+    Parses a `Cache-Control` header into its directives.
+
+    Args:
+        cache_control: the value of the `Cache-Control` header
+
+    Returns:
+        A dictionary of the values of the directives by name; the value is empty if the directive
+        has none.
+    """
+    directives = {}
+    for directive in (cache_control or "").lower().split(","):
+        name, _, value = directive.strip().partition("=")
+        if name:
+            directives[name] = value.strip('"')
+    return directives
+
+
+def is_storable(cache_control: str | None) -> bool:
+    """
+    Returns whether a response can be stored by a shared cache according to its `Cache-Control`
+    header. Responses that can be stored but have no `max-age` must be revalidated before they are
+    reused.
+
+    Args:
+        cache_control: the value of the `Cache-Control` header
+    """
+    return not {"no-store", "private"} & cache_directives(cache_control).keys()
+
+
+def max_age(cache_control: str | None) -> float | None:
+    """
+    Returns the number of seconds a response can be cached according to its `Cache-Control` header.
+
+    Args:
+        cache_control: the value of the `Cache-Control` header
+
+    Returns:
+        The `s-maxage` or `max-age` of the response; None if it must not be cached by a proxy.
+    """
+    directives = cache_directives(cache_control)
+    if {"no-store", "no-cache", "private"} & directives.keys():
+        return None
+    for name in ("s-maxage", "max-age"):
+        if directives.get(name, "").isdigit():
+            return float(directives[name])
+
+
+def etag_matches(if_none_match: str | None, etag: str | None) -> bool:
+    """
+    Returns whether an `If-None-Match` header matches an `ETag` using weak comparison.
+    """
+    if not if_none_match or not etag:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    weak_etag = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == weak_etag for tag in if_none_match.split(","))
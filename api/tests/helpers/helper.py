@@ -5,7 +5,9 @@ This module contains classes and functions that can be used to help test the pro
 import contextlib
 import threading
 import time
+from typing import Any
 import uvicorn
+from nhlapi.cache import CacheBackend
 
 
 class ThreadedServer(uvicorn.Server):
@@ -29,4 +31,18 @@ class ThreadedServer(uvicorn.Server):
             yield
         finally:
             self.should_exit = True
-            thread.join()
\ No newline at end of file
+            thread.join()
+
+
+class FailingBackend(CacheBackend):
+    """
+    A cache backend that is unavailable, such as a Redis server that is down.
+    """
+    async def get(self, key: str) -> Any | None:
+        raise ConnectionError("the cache backend is unavailable")
+
+    async def set(self, key: str, value: Any, ttl: float):
+        raise ConnectionError("the cache backend is unavailable")
+
+    async def delete(self, key: str):
+        raise ConnectionError("the cache backend is unavailable")
@@ -0,0 +1,123 @@
+"""
+Unit testing for the nhlapi.breaker module.
+"""
+
+import asyncio
+import pytest
+from nhlapi.breaker import CircuitBreaker, CircuitOpenError
+
+
+class Clock:
+    """
+    A clock that only moves when it is advanced.
+    """
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+async def succeed():
+    return "ok"
+
+
+async def fail():
+    raise RuntimeError("upstream error")
+
+
+def make_breaker(clock: Clock) -> CircuitBreaker:
+    return CircuitBreaker(
+        "test", failure_rate=0.5, window=4, min_calls=4, slow_call_duration=1, open_duration=10,
+        clock=clock)
+
+
+async def open_circuit(breaker: CircuitBreaker):
+    for _ in range(4):
+        with pytest.raises(RuntimeError):
+            await breaker.call(fail)
+
+
+@pytest.mark.asyncio
+class TestCircuitBreaker:
+    async def test_closed_below_failure_rate(self):
+        breaker = make_breaker(Clock())
+        for fn in (succeed, succeed, succeed, fail, succeed):
+            try:
+                await breaker.call(fn)
+            except RuntimeError:
+                pass
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    async def test_opens_at_failure_rate(self):
+        breaker = make_breaker(Clock())
+        await open_circuit(breaker)
+        assert breaker.state == CircuitBreaker.OPEN
+
+        calls = []
+        async def call():
+            calls.append(1)
+
+        with pytest.raises(CircuitOpenError):
+            await breaker.call(call)
+        assert calls == []
+        assert breaker.stats() == {"state": CircuitBreaker.OPEN, "rejected": 1}
+
+    async def test_min_calls(self):
+        breaker = make_breaker(Clock())
+        for _ in range(3):
+            with pytest.raises(RuntimeError):
+                await breaker.call(fail)
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    async def test_failed_results(self):
+        breaker = make_breaker(Clock())
+        for _ in range(4):
+            assert await breaker.call(succeed, failed=lambda result: result == "ok") == "ok"
+        assert breaker.state == CircuitBreaker.OPEN
+
+    async def test_slow_calls(self):
+        clock = Clock()
+        breaker = make_breaker(clock)
+
+        async def slow():
+            clock.now += 2
+            return "ok"
+
+        for _ in range(4):
+            assert await breaker.call(slow) == "ok"
+        assert breaker.state == CircuitBreaker.OPEN
+
+    async def test_trial_closes(self):
+        clock = Clock()
+        breaker = make_breaker(clock)
+        await open_circuit(breaker)
+        clock.now += 10
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        assert await breaker.call(succeed) == "ok"
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    async def test_trial_reopens(self):
+        clock = Clock()
+        breaker = make_breaker(clock)
+        await open_circuit(breaker)
+        clock.now += 10
+        with pytest.raises(RuntimeError):
+            await breaker.call(fail)
+        assert breaker.state == CircuitBreaker.OPEN
+
+    async def test_single_trial(self):
+        clock = Clock()
+        breaker = make_breaker(clock)
+        await open_circuit(breaker)
+        clock.now += 10
+
+        async def trial():
+            await asyncio.sleep(0.01)
+            return "ok"
+
+        results = await asyncio.gather(
+            breaker.call(trial), breaker.call(trial), return_exceptions=True)
+        assert results[0] == "ok"
+        assert isinstance(results[1], CircuitOpenError)
+        assert breaker.state == CircuitBreaker.CLOSED
@@ -0,0 +1,239 @@
+"""
+Unit testing for the nhlapi.cache module.
+"""
+
+import asyncio
+import pytest
+import pytest_asyncio
+from nhlapi.cache import MemoryBackend, RedisBackend, SingleFlight, TTLCache, create_backend
+from tests.helpers.helper import FailingBackend
+
+
+class Clock:
+    """
+    A clock that only moves when it is advanced.
+    """
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class Loader:
+    """
+    A load function that records the keys it is asked to load.
+    """
+    def __init__(self, delay: float = 0):
+        self.calls = []
+        self.delay = delay
+
+    async def __call__(self, keys: list) -> list:
+        self.calls.append(list(keys))
+        await asyncio.sleep(self.delay)
+        return [None if key < 0 else f"value {key}" for key in keys]
+
+
+@pytest_asyncio.fixture(params=["memory", "redis"])
+async def backend(request):
+    """
+    This fixture provides each cache backend. The Redis backend uses a fake Redis server.
+    """
+    if request.param == "memory":
+        yield MemoryBackend()
+    else:
+        fakeredis = pytest.importorskip("fakeredis.aioredis")
+        backend = RedisBackend(fakeredis.FakeRedis())
+        yield backend
+        await backend.close()
+
+
+def test_create_backend():
+    assert isinstance(create_backend(None), MemoryBackend)
+    assert isinstance(create_backend("redis://localhost:6379/0"), RedisBackend)
+
+
+@pytest.mark.asyncio
+class TestMemoryBackend:
+    async def test_lru_eviction(self):
+        backend = MemoryBackend(maxsize=2)
+        await backend.set("a", 1, ttl=5)
+        await backend.set("b", 2, ttl=5)
+        await backend.get("a")
+        await backend.set("c", 3, ttl=5)
+        assert await backend.get("a") == 1
+        assert await backend.get("b") == None
+        assert len(backend) == 2
+
+    async def test_expiry(self):
+        clock = Clock()
+        backend = MemoryBackend(clock=clock)
+        await backend.set("a", 1, ttl=5)
+        clock.now = 5
+        assert await backend.get("a") == None
+
+    async def test_size_eviction(self):
+        backend = MemoryBackend(maxbytes=16)
+        await backend.set("a", "1234", ttl=5)
+        await backend.set("b", "1234", ttl=5)
+        await backend.get("a")
+        await backend.set("c", "12345678", ttl=5)
+        await backend.set("d", "x" * 20, ttl=5)
+        assert await backend.get("a") == "1234"
+        assert await backend.get("b") == None
+        assert await backend.get("c") == "12345678"
+        assert await backend.get("d") == None
+        assert backend.nbytes == 16
+
+
+@pytest.mark.asyncio
+class TestBackend:
+    async def test_get_set_delete(self, backend):
+        await backend.set("a", {"id": 1, "name": ["x"]}, ttl=5)
+        assert await backend.get("a") == {"id": 1, "name": ["x"]}
+        await backend.delete("a")
+        assert await backend.get("a") == None
+
+
+@pytest.mark.asyncio
+class TestTTLCache:
+    async def test_get_set(self, backend):
+        cache = TTLCache(backend, "test", ttl=5)
+        await cache.set("a", 1)
+        assert await cache.get("a") == (1, True)
+        assert await cache.get("b") == None
+
+    async def test_stale(self, backend):
+        clock = Clock()
+        cache = TTLCache(backend, "test", ttl=5, stale_ttl=10, clock=clock)
+        await cache.set("a", 1)
+        clock.now = 5
+        assert await cache.get("a") == (1, False)
+
+    async def test_shared_backend(self, backend):
+        cache = TTLCache(backend, "test", ttl=5)
+        other = TTLCache(backend, "test", ttl=5)
+        load = Loader()
+        assert await cache.get_many([1], load) == ["value 1"]
+        assert await other.get_many([1], load) == ["value 1"]
+        assert load.calls == [[1]]
+        assert other.hits == 1
+
+    async def test_get_many_counters(self, backend):
+        cache = TTLCache(backend, "test", ttl=5)
+        load = Loader()
+        assert await cache.get_many([1, 2, -1], load) == ["value 1", "value 2", None]
+        assert await cache.get_many([2, 1, -1], load) == ["value 2", "value 1", None]
+        assert load.calls == [[1, 2, -1], [-1]]
+        assert cache.stats() == {"hits": 2, "stale_hits": 0, "misses": 4}
+
+    async def test_get_many_single_flight(self, backend):
+        cache = TTLCache(backend, "test", ttl=5)
+        load = Loader(delay=0.01)
+        results = await asyncio.gather(*(cache.get_many([1, 2], load) for _ in range(10)))
+        assert results == [["value 1", "value 2"]] * 10
+        assert load.calls == [[1, 2]]
+
+    async def test_get_many_stale_while_revalidate(self, backend):
+        clock = Clock()
+        cache = TTLCache(backend, "test", ttl=5, stale_ttl=10, clock=clock)
+        await cache.set(1, "old value")
+        clock.now = 6
+        load = Loader()
+        assert await cache.get_many([1], load) == ["old value"]
+        await asyncio.sleep(0.01)
+        assert load.calls == [[1]]
+        assert await cache.get(1) == ("value 1", True)
+        assert cache.stale_hits == 1
+
+    async def test_get_many_load_error(self, backend):
+        cache = TTLCache(backend, "test", ttl=5)
+
+        async def load(keys):
+            raise RuntimeError("upstream error")
+
+        with pytest.raises(RuntimeError):
+            await cache.get_many([1], load)
+        assert await cache.get_many([1], Loader()) == ["value 1"]
+
+    async def test_get_many_shared_flight(self, backend):
+        flight = SingleFlight()
+        cache = TTLCache(backend, "test", ttl=5, flight=flight)
+        load = Loader(delay=0.01)
+        results = await asyncio.gather(cache.get_many([1, 2], load), cache.get_many([2, 3], load))
+        assert results == [["value 1", "value 2"], ["value 2", "value 3"]]
+        assert load.calls == [[1, 2], [3]]
+        assert flight.stats() == {"calls": 2, "shared": 1}
+
+    async def test_backend_error(self):
+        cache = TTLCache(FailingBackend(), "test", ttl=5)
+        await cache.set("a", 1)
+        assert await cache.get("a") == None
+        load = Loader()
+        assert await cache.get_many([1], load) == ["value 1"]
+        assert load.calls == [[1]]
+
+
+@pytest.mark.asyncio
+class TestSingleFlight:
+    async def test_concurrent_calls_shared(self):
+        flight = SingleFlight()
+        load = Loader(delay=0.01)
+        results = await asyncio.gather(*(flight.do(1, lambda: load([1])) for _ in range(10)))
+        assert results == [["value 1"]] * 10
+        assert load.calls == [[1]]
+        assert flight.stats() == {"calls": 1, "shared": 9}
+
+    async def test_keys_not_shared(self):
+        flight = SingleFlight()
+        load = Loader(delay=0.01)
+        await asyncio.gather(flight.do(1, lambda: load([1])), flight.do(2, lambda: load([2])))
+        assert load.calls == [[1], [2]]
+
+    async def test_sequential_calls_not_shared(self):
+        flight = SingleFlight()
+        load = Loader()
+        await flight.do(1, lambda: load([1]))
+        await flight.do(1, lambda: load([1]))
+        assert load.calls == [[1], [1]]
+
+    async def test_error_raised_to_every_caller(self):
+        flight = SingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("upstream error")
+
+        results = await asyncio.gather(*(flight.do(1, fail) for _ in range(3)),
+            return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+
+    async def test_cancelled_caller(self):
+        flight = SingleFlight()
+        load = Loader(delay=0.01)
+        first = asyncio.create_task(flight.do(1, lambda: load([1])))
+        second = asyncio.create_task(flight.do(1, lambda: load([1])))
+        await asyncio.sleep(0)
+        first.cancel()
+        assert await second == ["value 1"]
+        assert load.calls == [[1]]
+
+    async def test_do_many(self):
+        flight = SingleFlight()
+        load = Loader(delay=0.01)
+        results = await asyncio.gather(flight.do_many([1, 2], load), flight.do_many([2, 3], load))
+        assert results == [["value 1", "value 2"], ["value 2", "value 3"]]
+        assert load.calls == [[1, 2], [3]]
+        assert flight.stats() == {"calls": 2, "shared": 1}
+
+    async def test_do_many_error(self):
+        flight = SingleFlight()
+
+        async def fail(keys):
+            await asyncio.sleep(0.01)
+            raise RuntimeError("upstream error")
+
+        results = await asyncio.gather(flight.do_many([1, 2], fail), flight.do(2, lambda: fail([2])),
+            return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert await flight.do_many([1], Loader()) == ["value 1"]
@@ -2,11 +2,29 @@
 Unit testing for the graphQL API.
 """
 
+from datetime import datetime, timedelta, timezone
+import pytest
+import pytest_asyncio
 from nhlapi.api import schema
+from nhlapi.clients import database as db
+from nhlapi.graphql.context import create_context
+from nhlapi.search import PlayerIndex
+from nhlapi.util import create_client
 
 
+@pytest_asyncio.fixture
+async def context():
+    """
+    This fixture provides the context of a GraphQL request with its own HTTP client.
+    """
+    client = create_client()
+    yield create_context(client)
+    await client.aclose()
+
+
+@pytest.mark.asyncio
 class TestGraphQLQuery:
-    def test_player_valid(self):
+    async def test_player_valid(self, context):
         query = """
             query TestQuery($id: Int!) {
                 player(id: $id) {
@@ -19,11 +37,12 @@ class TestGraphQLQuery:
             "id": 8471675,
             "name": "Sidney Crosby"
         }
-        result = schema.execute_sync(query, variable_values={"id": player["id"]})
+        result = await schema.execute(
+            query, variable_values={"id": player["id"]}, context_value=context)
         assert result.errors == None
         assert result.data["player"] == player
 
-    def test_player_invalid(self):
+    async def test_player_invalid(self, context):
         query = """
             query TestQuery($id: Int!) {
                 player(id: $id) {
@@ -32,11 +51,12 @@ class TestGraphQLQuery:
                 }
             }
         """
-        result = schema.execute_sync(query, variable_values={"id": -1})
+        result = await schema.execute(
+            query, variable_values={"id": -1}, context_value=context)
         assert result.errors == None
         assert result.data["player"] == None
 
-    def test_player_team(self):
+    async def test_player_team(self, context):
         query = """
             query TestQuery($id: Int!) {
                 player(id: $id) {
@@ -57,11 +77,12 @@ class TestGraphQLQuery:
                 "name": "Pittsburgh Penguins",
             },
         }
-        result = schema.execute_sync(query, variable_values={"id": player["id"]})
+        result = await schema.execute(
+            query, variable_values={"id": player["id"]}, context_value=context)
         assert result.errors == None
         assert result.data["player"] == player
 
-    def test_team_valid(self):
+    async def test_team_valid(self, context):
         query = """
             query TestQuery($id: Int!) {
                 team(id: $id) {
@@ -74,11 +95,12 @@ class TestGraphQLQuery:
             "id": 22,
             "name": "Edmonton Oilers"
         }
-        result = schema.execute_sync(query, variable_values={"id": team["id"]})
+        result = await schema.execute(
+            query, variable_values={"id": team["id"]}, context_value=context)
         assert result.errors == None
         assert result.data["team"] == team
 
-    def test_team_invalid(self):
+    async def test_team_invalid(self, context):
         query = """
             query TestQuery($id: Int!) {
                 team(id: $id) {
@@ -87,11 +109,12 @@ class TestGraphQLQuery:
                 }
             }
         """
-        result = schema.execute_sync(query, variable_values={"id": -1})
+        result = await schema.execute(
+            query, variable_values={"id": -1}, context_value=context)
         assert result.errors == None
         assert result.data["team"] == None
 
-    def test_player_suggestion_valid(self):
+    async def test_player_suggestion_valid(self, context):
         query = """
             query TestQuery($name: String!) {
                 playerSuggestions(name: $name) {
@@ -100,7 +123,8 @@ class TestGraphQLQuery:
                 }
             }
         """
-        result = schema.execute_sync(query, variable_values={"name": "connor mc"})
+        result = await schema.execute(
+            query, variable_values={"name": "connor mc"}, context_value=context)
         assert result.errors == None
         assert result.data["playerSuggestions"] == [
             {"id": 8482220, "name": "Connor McClennon"},
@@ -108,7 +132,7 @@ class TestGraphQLQuery:
             {"id": 8481580, "name": "Connor McMichael"}
         ]
 
-    def test_player_suggestion_empty(self):
+    async def test_player_suggestion_empty(self, context):
         query = """
             query TestQuery($name: String!) {
                 playerSuggestions(name: $name) {
@@ -117,6 +141,179 @@ class TestGraphQLQuery:
                 }
             }
         """
-        result = schema.execute_sync(query, variable_values={"name": "asdf"})
+        result = await schema.execute(
+            query, variable_values={"name": "asdf"}, context_value=context)
+        assert result.errors == None
+        assert result.data["playerSuggestions"] == []
+
+@pytest.mark.asyncio
+class TestPlayerEventHeatmap:
+    query = """
+        query TestQuery($binSize: Int!) {
+            playerEventHeatmap(
+                playerId: 8471675, eventType: "SHOT", playerType: "Shooter", season: "20212022",
+                binSize: $binSize
+            ) {
+                binSize
+                xMin
+                yMin
+                total
+                counts
+            }
+        }
+    """
+
+    async def test_heatmap(self, context, monkeypatch):
+        requests = []
+
+        async def get_player_event_bins(pool, *args):
+            requests.append(args)
+            return [
+                {"column": 0, "row": 0, "count": 2},
+                {"column": 3, "row": 1, "count": 1},
+                # an event on the boards is counted in the last bin
+                {"column": 4, "row": 1, "count": 1},
+            ]
+
+        monkeypatch.setattr(db, "get_player_event_bins", get_player_event_bins)
+        result = await schema.execute(
+            self.query, variable_values={"binSize": 50}, context_value=context)
+        assert result.errors == None
+        assert result.data["playerEventHeatmap"] == {
+            "binSize": 50,
+            "xMin": -100,
+            "yMin": -43,
+            "total": 4,
+            "counts": [[2, 0, 0, 0], [0, 0, 0, 2]],
+        }
+        assert requests == [(8471675, "SHOT", "Shooter", "20212022", 50, -100, -43)]
+
+    async def test_heatmap_invalid_bin_size(self, context):
+        result = await schema.execute(
+            self.query, variable_values={"binSize": 0}, context_value=context)
+        assert result.errors != None
+
+
+@pytest.mark.asyncio
+async def test_player_events(context, monkeypatch):
+    async def get_player_events(pool, *args):
+        return [{
+            "game_id": 2021020001,
+            "index": 1,
+            "type": "SHOT",
+            "x": 50,
+            "y": -10,
+            "period_number": 1,
+            "period_type": "REGULAR",
+            "period_time": timedelta(minutes=1, seconds=30),
+            "datetime": datetime(2022, 1, 1, tzinfo=timezone.utc),
+        }]
+
+    query = """
+        query TestQuery {
+            playerEvents(
+                playerId: 8471675, eventType: "SHOT", playerType: "Shooter", season: "20212022"
+            ) {
+                gameId
+                coordinates { x y }
+                period { number time }
+                datetime
+            }
+        }
+    """
+    monkeypatch.setattr(db, "get_player_events", get_player_events)
+    result = await schema.execute(query, context_value=context)
+    assert result.errors == None
+    assert result.data["playerEvents"] == [{
+        "gameId": 2021020001,
+        "coordinates": {"x": 50, "y": -10},
+        "period": {"number": 1, "time": "0:01:30"},
+        "datetime": "2022-01-01 00:00:00+00:00",
+    }]
+
+
+@pytest.mark.asyncio
+class TestPlayerEventColumns:
+    query = """
+        query TestQuery {
+            playerEventColumns(
+                playerId: 8471675, eventType: "SHOT", playerType: "Shooter", season: "20212022"
+            ) {
+                gameIds
+                indexes
+                x
+                y
+                periodNumbers
+                periodTimes
+                datetimes
+            }
+        }
+    """
+
+    async def test_columns(self, context, monkeypatch):
+        async def get_player_event_columns(pool, *args):
+            return {
+                "game_ids": [2021020001, 2021020001],
+                "indexes": [1, 5],
+                "types": ["SHOT", "SHOT"],
+                "x": [50, None],
+                "y": [-10, None],
+                "period_numbers": [1, 2],
+                "period_types": ["REGULAR", "REGULAR"],
+                "period_times": [timedelta(minutes=1, seconds=30), timedelta(minutes=12)],
+                "datetimes": [
+                    datetime(2022, 1, 1, tzinfo=timezone.utc),
+                    datetime(2022, 1, 1, 0, 30, tzinfo=timezone.utc),
+                ],
+            }
+
+        monkeypatch.setattr(db, "get_player_event_columns", get_player_event_columns)
+        result = await schema.execute(self.query, context_value=context)
         assert result.errors == None
-        assert result.data["playerSuggestions"] == []
\ No newline at end of file
+        assert result.data["playerEventColumns"] == {
+            "gameIds": [2021020001, 2021020001],
+            "indexes": [1, 5],
+            "x": [50, None],
+            "y": [-10, None],
+            "periodNumbers": [1, 2],
+            "periodTimes": ["0:01:30", "0:12:00"],
+            "datetimes": ["2022-01-01 00:00:00+00:00", "2022-01-01 00:30:00+00:00"],
+        }
+
+    async def test_columns_empty(self, context, monkeypatch):
+        async def get_player_event_columns(pool, *args):
+            return dict.fromkeys(["game_ids", "indexes", "types", "x", "y"])
+
+        monkeypatch.setattr(db, "get_player_event_columns", get_player_event_columns)
+        result = await schema.execute(self.query, context_value=context)
+        assert result.errors == None
+        assert result.data["playerEventColumns"]["gameIds"] == []
+        assert result.data["playerEventColumns"]["x"] == []
+
+
+@pytest.mark.asyncio
+async def test_player_suggestions_from_index():
+    index = PlayerIndex([{
+        "id": 8471675,
+        "first_name": "Sidney",
+        "last_name": "Crosby",
+        "number": "87",
+        "team": "PIT",
+        "position": "C",
+    }])
+    query = """
+        query TestQuery($name: String!) {
+            playerSuggestions(name: $name) {
+                id
+                name
+                team
+            }
+        }
+    """
+    # the HTTP client is never used when the index is built
+    context = create_context(None, player_index=index)
+    result = await schema.execute(query, variable_values={"name": "crosb"}, context_value=context)
+    assert result.errors == None
+    assert result.data["playerSuggestions"] == [
+        {"id": 8471675, "name": "Sidney Crosby", "team": "PIT"}
+    ]
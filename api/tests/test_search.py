@@ -0,0 +1,134 @@
+"""
+Unit testing for the nhlapi.search module.
+"""
+
+import asyncio
+import pytest
+from nhlapi.search import (
+    SEARCH_DEFAULT_LIMIT, PlayerIndex, fold, refresh_index, roster_players
+)
+
+
+PLAYERS = [
+    {"id": 8471675, "first_name": "Sidney", "last_name": "Crosby", "team": "PIT"},
+    {"id": 8477476, "first_name": "Artemi", "last_name": "Panarin", "team": "NYR"},
+    {"id": 8482116, "first_name": "Tim", "last_name": "Stützle", "team": "OTT"},
+    {"id": 8474590, "first_name": "John", "last_name": "Carlson", "team": "WSH"},
+    {"id": 8476453, "first_name": "Nikita", "last_name": "Kucherov", "team": "TBL"},
+    {"id": 8475722, "first_name": "Jason", "last_name": "Zucker", "team": "PIT"},
+]
+
+
+def ids(players: list[dict]) -> list[int]:
+    return [player["id"] for player in players]
+
+
+def test_fold():
+    assert fold("  Tim   STÜTZLE ") == "tim stutzle"
+    assert fold("Jesperi Kotkaniemi") == "jesperi kotkaniemi"
+    assert fold("") == ""
+
+
+def test_roster_players():
+    teams = [{
+        "abbreviation": "PIT",
+        "roster": {"roster": [{
+            "person": {"id": 8475722, "fullName": "James van Riemsdyk"},
+            "jerseyNumber": "25",
+            "position": {"abbreviation": "LW"},
+        }]},
+    }]
+    assert roster_players(teams, {8475722: 12})[0]["activity"] == 12
+    assert roster_players(teams) == [{
+        "id": 8475722,
+        "first_name": "James",
+        "last_name": "van Riemsdyk",
+        "number": "25",
+        "team": "PIT",
+        "position": "LW",
+        "activity": 0,
+    }]
+
+
+class TestPlayerIndex:
+    def test_first_name_prefix(self):
+        index = PlayerIndex(PLAYERS)
+        assert ids(index.search("sid")) == [8471675]
+        assert ids(index.search("Sidney Cr")) == [8471675]
+
+    def test_last_name_prefix(self):
+        index = PlayerIndex(PLAYERS)
+        assert ids(index.search("c")) == [8474590, 8471675]
+        assert ids(index.search("crosby s")) == [8471675]
+
+    def test_accents_and_case(self):
+        index = PlayerIndex(PLAYERS)
+        assert ids(index.search("STUTZ")) == [8482116]
+        assert ids(index.search("stütz")) == [8482116]
+
+    def test_player_matched_once(self):
+        index = PlayerIndex([{"id": 1, "first_name": "Ryan", "last_name": "Ryan"}])
+        assert ids(index.search("ryan")) == [1]
+
+    def test_limit(self):
+        index = PlayerIndex(PLAYERS)
+        assert len(index.search("", limit=3)) == 0
+        assert ids(index.search("c", limit=1)) == [8474590]
+
+    def test_default_limit(self):
+        index = PlayerIndex([
+            {"id": i, "first_name": "Carl", "last_name": f"Cole{i}"}
+            for i in range(2 * SEARCH_DEFAULT_LIMIT)
+        ])
+        assert len(index.search("c")) == SEARCH_DEFAULT_LIMIT
+
+    def test_no_match(self):
+        index = PlayerIndex(PLAYERS)
+        assert index.search("gretzky") == []
+        assert PlayerIndex().search("crosby") == []
+
+    def test_typos(self):
+        index = PlayerIndex(PLAYERS)
+        assert ids(index.search("crosbi")) == [8471675]
+        assert ids(index.search("kucherof")) == [8476453]
+        assert ids(index.search("sidny")) == [8471675]
+
+    def test_prefix_before_similar(self):
+        index = PlayerIndex(PLAYERS + [{"id": 1, "first_name": "Zack", "last_name": "Zuker"}])
+        assert ids(index.search("zuker")) == [1, 8475722]
+        assert ids(index.search("zuker", limit=1)) == [1]
+
+    def test_activity(self):
+        players = [
+            {"id": 1, "first_name": "Carl", "last_name": "Cole", "activity": 5},
+            {"id": 2, "first_name": "Cody", "last_name": "Ceci", "activity": 50},
+            {"id": 3, "first_name": "Adam", "last_name": "Clark"},
+        ]
+        index = PlayerIndex(players)
+        assert ids(index.search("c")) == [2, 1, 3]
+        assert ids(index.search("c", limit=2)) == [2, 1]
+
+    def test_update(self):
+        index = PlayerIndex(PLAYERS)
+        index.update(PLAYERS[:1])
+        assert len(index) == 1
+        assert index.search("panarin") == []
+
+
+@pytest.mark.asyncio
+async def test_refresh_index():
+    calls = []
+    async def load():
+        calls.append(len(calls))
+        if len(calls) == 1:
+            raise RuntimeError("roster unavailable")
+        return PLAYERS
+
+    index = PlayerIndex()
+    task = asyncio.create_task(refresh_index(index, load, interval=60, retry_interval=0))
+    while len(index) == 0:
+        await asyncio.sleep(0)
+    task.cancel()
+
+    assert len(calls) == 2
+    assert len(index) == len(PLAYERS)
@@ -0,0 +1,163 @@
+"""
+Unit testing for the nhlapi.clients.stats module.
+"""
+
+import asyncio
+import httpx
+import pytest
+import pytest_asyncio
+import uvicorn
+from fastapi import FastAPI, HTTPException
+from nhlapi.api import schema
+from nhlapi.breaker import CircuitBreaker, CircuitOpenError
+from nhlapi.cache import SingleFlight
+from nhlapi.clients import database as db
+from nhlapi.clients.stats import StatsClient
+from nhlapi.graphql.context import create_context
+from nhlapi.util import create_client
+from tests.helpers.helper import ThreadedServer
+
+
+# Define the host and port to use for the mock Stats API
+MOCK_HOST = "0.0.0.0"
+MOCK_PORT = 5001
+MOCK_URL = f"http://{MOCK_HOST}:{MOCK_PORT}"
+
+PLAYERS = {
+    8471675: {"id": 8471675, "firstName": "Sidney", "lastName": "Crosby", "currentTeam": {"id": 5},
+        "primaryPosition": {"code": "C"}},
+    8471214: {"id": 8471214, "firstName": "Alex", "lastName": "Ovechkin", "currentTeam": {"id": 15},
+        "primaryPosition": {"code": "C"}},
+    8471215: {"id": 8471215, "firstName": "Evgeni", "lastName": "Malkin", "currentTeam": {"id": 5},
+        "primaryPosition": {"code": "C"}},
+}
+TEAMS = {
+    5: {"id": 5, "locationName": "Pittsburgh", "teamName": "Penguins", "abbreviation": "PIT"},
+    15: {"id": 15, "locationName": "Washington", "teamName": "Capitals", "abbreviation": "WSH"},
+}
+
+requests = []
+
+
+@pytest.fixture(scope="module")
+def mock_api():
+    """
+    This fixture wraps tests with the creation and teardown of a mock Stats API server that records
+    the requests it receives.
+    """
+    app = FastAPI()
+
+    @app.get("/people")
+    async def people(personIds: str):
+        requests.append(f"people?personIds={personIds}")
+        return {"people": [PLAYERS[int(id)] for id in personIds.split(",") if int(id) in PLAYERS]}
+
+    @app.get("/teams")
+    async def teams(teamId: str):
+        requests.append(f"teams?teamId={teamId}")
+        return {"teams": [TEAMS[int(id)] for id in teamId.split(",") if int(id) in TEAMS]}
+
+    @app.get("/teams/{id}")
+    async def team(id: int):
+        requests.append(f"teams/{id}")
+        if id not in TEAMS:
+            raise HTTPException(404)
+        return {"teams": [TEAMS[id]]}
+
+    config = uvicorn.Config(app, MOCK_HOST, MOCK_PORT, log_level="info")
+    server = ThreadedServer(config)
+    with server.run_in_thread():
+        yield
+
+
+@pytest_asyncio.fixture
+async def client():
+    """
+    This fixture provides a pooled HTTP client that is closed after each test.
+    """
+    client = create_client()
+    yield client
+    await client.aclose()
+
+
+@pytest_asyncio.fixture
+async def context(client, monkeypatch):
+    """
+    This fixture provides the context of a GraphQL request that uses the mock Stats API.
+    """
+    monkeypatch.setattr(StatsClient, "base_url", MOCK_URL)
+    requests.clear()
+    yield create_context(client)
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("mock_api")
+class TestStatsClient:
+    async def test_get_players_order(self, context):
+        players = await context["stats"].get_players([8471215, -1, 8471675, 8471215])
+        assert [p and p["id"] for p in players] == [8471215, None, 8471675, 8471215]
+        assert requests == ["people?personIds=8471215,-1,8471675"]
+
+    async def test_get_teams_fallback(self, context):
+        teams = await context["stats"].get_teams([22])
+        assert teams == [None]
+
+    async def test_get_players_from_database(self, client, context, monkeypatch):
+        async def get_players(pool, ids):
+            assert ids == [8471215, 8471675]
+            return {8471215: {**PLAYERS[8471215], "fullName": "Evgeni Malkin"}}
+
+        monkeypatch.setattr(db, "get_players", get_players)
+        stats = StatsClient(client, db_pool="pool")
+        players = await stats.get_players([8471215, 8471675, 8471215])
+        assert [p["id"] for p in players] == [8471215, 8471675, 8471215]
+        assert players[0]["fullName"] == "Evgeni Malkin"
+        assert requests == ["people?personIds=8471675"]
+
+    async def test_get_teams_database_unavailable(self, client, context, monkeypatch):
+        async def get_teams(pool, ids):
+            raise OSError("connection refused")
+
+        monkeypatch.setattr(db, "get_teams", get_teams)
+        stats = StatsClient(client, db_pool="pool")
+        teams = await stats.get_teams([5])
+        assert teams == [TEAMS[5]]
+        assert requests == ["teams?teamId=5"]
+
+    async def test_single_flight(self, client, context):
+        flight = SingleFlight()
+        # each GraphQL request has its own client, but they share the single-flight
+        clients = [StatsClient(client, flight=flight) for _ in range(3)]
+        players = await asyncio.gather(*(stats.get_players([8471675]) for stats in clients))
+        assert players == [[PLAYERS[8471675]]] * 3
+        assert requests == ["people?personIds=8471675"]
+
+    async def test_circuit_open(self, client, context):
+        breaker = CircuitBreaker("stats", min_calls=1)
+        async def fail():
+            raise httpx.ConnectError("unreachable")
+
+        with pytest.raises(httpx.ConnectError):
+            await breaker.call(fail)
+        stats = StatsClient(client, breaker=breaker)
+        with pytest.raises(CircuitOpenError):
+            await stats.get_players([8471675])
+        assert requests == []
+
+    async def test_loaders_batch_requests(self, context):
+        query = """
+            query TestQuery($a: Int!, $b: Int!, $c: Int!) {
+                a: player(id: $a) { team { name } }
+                b: player(id: $b) { team { name } }
+                c: player(id: $c) { team { name } }
+            }
+        """
+        variables = {"a": 8471675, "b": 8471214, "c": 8471215}
+        result = await schema.execute(query, variable_values=variables, context_value=context)
+        assert result.errors == None
+        assert result.data == {
+            "a": {"team": {"name": "Pittsburgh Penguins"}},
+            "b": {"team": {"name": "Washington Capitals"}},
+            "c": {"team": {"name": "Pittsburgh Penguins"}},
+        }
+        assert requests == ["people?personIds=8471675,8471214,8471215", "teams?teamId=5,15"]
@@ -2,12 +2,21 @@
 Unit testing for the utils module.
 """
 
+import asyncio
+import gzip
+import json
 import httpx
 import pytest
+import pytest_asyncio
 import uvicorn
-from nhlapi.util import forward_request
-from fastapi import FastAPI, HTTPException, Request
-from tests.helpers.helper import ThreadedServer
+from nhlapi.breaker import CircuitBreaker
+from nhlapi.cache import MemoryBackend, SingleFlight, TTLCache
+from nhlapi.util import (
+    create_client, create_response_cache, forward_request, is_storable, max_age, stream_request
+)
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.middleware.gzip import GZipMiddleware
+from tests.helpers.helper import FailingBackend, ThreadedServer
 
 
 # Define the host and port to use for mock APIs
@@ -15,6 +24,9 @@ MOCK_HOST = "0.0.0.0"
 MOCK_PORT = 5000
 
 
+cached_requests = []
+
+
 @pytest.fixture(scope="class")
 def mock_api():
     """
@@ -22,6 +34,11 @@ def mock_api():
     runs on a separate child thread while the tests are performed on the main thread.
     """
     app = FastAPI()
+    app.add_middleware(GZipMiddleware, minimum_size=1000)
+
+    @app.get("/large/{path_params:path}")
+    async def large(path_params: str):
+        return {"plays": [{"index": i} for i in range(1000)]}
 
     @app.get("/valid/{path_params:path}")
     async def test(path_params: str, q1: str|None=None, q2: str|None=None):
@@ -31,15 +48,55 @@ def mock_api():
         if len(queries) == 0: queries = None
         return {"path_params": path_params, "queries": queries}
 
+    @app.get("/uncacheable/{path_params:path}")
+    async def uncacheable(path_params: str):
+        return Response('{"version": 1}', media_type="application/json",
+            headers={"Cache-Control": "no-store"})
+
+    @app.get("/cached/{path_params:path}")
+    async def cached(request: Request):
+        cached_requests.append(request.headers.get("if-none-match"))
+        headers = {"Cache-Control": "max-age=60", "ETag": '"v1"'}
+        if request.headers.get("if-none-match") == '"v1"':
+            return Response(status_code=304, headers=headers)
+        return Response('{"version": 1}', media_type="application/json", headers=headers)
+
     config = uvicorn.Config(app, MOCK_HOST, MOCK_PORT, log_level="info")
     server = ThreadedServer(config)
     with server.run_in_thread():
         yield
 
 
+@pytest_asyncio.fixture
+async def client():
+    """
+    This fixture provides a pooled HTTP client that is closed after each test.
+    """
+    client = create_client()
+    yield client
+    await client.aclose()
+
+
+def make_request(endpoint: str, query_string: bytes = b"", headers: list = []) -> Request:
+    """
+    Creates a request for a route with the path parameter `endpoint`.
+    """
+    return Request(scope={
+        "type": "http",
+        "scheme": "http",
+        "method": "GET",
+        "path": "/route",
+        "raw_path": b"/route",
+        "query_string": query_string,
+        "headers": headers,
+        "path_params": {"endpoint": endpoint}
+    })
+
+
+@pytest.mark.asyncio
 @pytest.mark.usefixtures("mock_api")
 class TestForwardRequest:
-    def test_invalid_api_url(self):
+    async def test_invalid_api_url(self, client):
         request = Request(scope={
             "type": "http",
             "scheme": "http",
@@ -51,9 +108,9 @@ class TestForwardRequest:
             "path_params": {"endpoint": "test"}
         })
         with pytest.raises(httpx.RequestError):
-            forward_request("", request)
+            await forward_request(client, "", request)
 
-    def test_missing_endpoint_param(self):
+    async def test_missing_endpoint_param(self, client):
         request = Request(scope={
             "type": "http",
             "scheme": "http",
@@ -65,9 +122,9 @@ class TestForwardRequest:
             "path_params": {}
         })
         with pytest.raises(AssertionError):
-            forward_request(f"http://{MOCK_HOST}:{MOCK_PORT}", request)
+            await forward_request(client, f"http://{MOCK_HOST}:{MOCK_PORT}", request)
 
-    def test_invalid_route(self):
+    async def test_invalid_route(self, client):
         request = Request(scope={
             "type": "http",
             "scheme": "http",
@@ -79,10 +136,10 @@ class TestForwardRequest:
             "path_params": {"endpoint": ""}
         })
         with pytest.raises(HTTPException) as exc:
-            forward_request(f"http://{MOCK_HOST}:{MOCK_PORT}/invalid", request)
+            await forward_request(client, f"http://{MOCK_HOST}:{MOCK_PORT}/invalid", request)
         assert exc.value.status_code == 404
 
-    def test_valid_route(self):
+    async def test_valid_route(self, client):
         request = Request(scope={
             "type": "http",
             "scheme": "http",
@@ -93,13 +150,13 @@ class TestForwardRequest:
             "headers": {},
             "path_params": {"endpoint": ""}
         })
-        response = forward_request(f"http://{MOCK_HOST}:{MOCK_PORT}/valid", request)
-        assert response == {
+        response = await forward_request(client, f"http://{MOCK_HOST}:{MOCK_PORT}/valid", request)
+        assert json.loads(response.body) == {
             "path_params": "",
             "queries": None
         }
 
-    def test_valid_endpoint(self):
+    async def test_valid_endpoint(self, client):
         request = Request(scope={
             "type": "http",
             "scheme": "http",
@@ -110,13 +167,13 @@ class TestForwardRequest:
             "headers": {},
             "path_params": {"endpoint": "some_endpoint"}
         })
-        response = forward_request(f"http://{MOCK_HOST}:{MOCK_PORT}/valid", request)
-        assert response == {
+        response = await forward_request(client, f"http://{MOCK_HOST}:{MOCK_PORT}/valid", request)
+        assert json.loads(response.body) == {
             "path_params": "some_endpoint",
             "queries": None
         }
 
-    def test_nested_endpoint(self):
+    async def test_nested_endpoint(self, client):
         request = Request(scope={
             "type": "http",
             "scheme": "http",
@@ -127,13 +184,13 @@ class TestForwardRequest:
             "headers": {},
             "path_params": {"endpoint": "some/nested/endpoint"}
         })
-        response = forward_request(f"http://{MOCK_HOST}:{MOCK_PORT}/valid", request)
-        assert response == {
+        response = await forward_request(client, f"http://{MOCK_HOST}:{MOCK_PORT}/valid", request)
+        assert json.loads(response.body) == {
             "path_params": "some/nested/endpoint",
             "queries": None
         }
 
-    def test_query(self):
+    async def test_query(self, client):
         request = Request(scope={
             "type": "http",
             "scheme": "http",
@@ -144,13 +201,13 @@ class TestForwardRequest:
             "headers": {},
             "path_params": {"endpoint": ""}
         })
-        response = forward_request(f"http://{MOCK_HOST}:{MOCK_PORT}/valid", request)
-        assert response == {
+        response = await forward_request(client, f"http://{MOCK_HOST}:{MOCK_PORT}/valid", request)
+        assert json.loads(response.body) == {
             "path_params": "",
             "queries": ["some_query"]
         }
 
-    def test_multiple_queries(self):
+    async def test_multiple_queries(self, client):
         request = Request(scope={
             "type": "http",
             "scheme": "http",
@@ -161,8 +218,193 @@ class TestForwardRequest:
             "headers": {},
             "path_params": {"endpoint": ""}
         })
-        response = forward_request(f"http://{MOCK_HOST}:{MOCK_PORT}/valid", request)
-        assert response == {
+        response = await forward_request(client, f"http://{MOCK_HOST}:{MOCK_PORT}/valid", request)
+        assert json.loads(response.body) == {
             "path_params": "",
             "queries": ["first", "second"]
         }
+
+
+def test_is_storable():
+    assert is_storable(None)
+    assert is_storable("no-cache")
+    assert is_storable("public, max-age=60")
+    assert not is_storable("no-store")
+    assert not is_storable("private, max-age=60")
+
+
+def test_max_age():
+    assert max_age(None) == None
+    assert max_age("public, max-age=60") == 60
+    assert max_age("max-age=60, s-maxage=120") == 120
+    assert max_age("private, max-age=60") == None
+    assert max_age("no-store") == None
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("mock_api")
+class TestForwardRequestCache:
+    @pytest.fixture(autouse=True)
+    def clear_requests(self):
+        cached_requests.clear()
+
+    async def test_etag_forwarded(self, client):
+        response = await forward_request(
+            client, f"http://{MOCK_HOST}:{MOCK_PORT}/cached", make_request("a"))
+        assert response.status_code == 200
+        assert response.headers["etag"] == '"v1"'
+        assert response.headers["cache-control"] == "max-age=60"
+
+    async def test_etag_generated(self, client):
+        response = await forward_request(
+            client, f"http://{MOCK_HOST}:{MOCK_PORT}/valid", make_request("a"))
+        assert response.headers["etag"].startswith('W/"')
+
+    async def test_if_none_match(self, client):
+        request = make_request("a", headers=[(b"if-none-match", b'W/"v1"')])
+        response = await forward_request(client, f"http://{MOCK_HOST}:{MOCK_PORT}/cached", request)
+        assert response.status_code == 304
+        assert response.body == b""
+
+    async def test_cache_hit(self, client):
+        cache = create_response_cache(MemoryBackend())
+        for _ in range(3):
+            response = await forward_request(
+                client, f"http://{MOCK_HOST}:{MOCK_PORT}/cached", make_request("a"), cache=cache)
+            assert json.loads(response.body) == {"version": 1}
+        assert cached_requests == [None]
+
+    async def test_cache_key_includes_query(self, client):
+        cache = create_response_cache(MemoryBackend())
+        url = f"http://{MOCK_HOST}:{MOCK_PORT}/cached"
+        await forward_request(client, url, make_request("a", b"q=1"), cache=cache)
+        await forward_request(client, url, make_request("a", b"q=2"), cache=cache)
+        assert cached_requests == [None, None]
+
+    async def test_cache_unavailable(self, client):
+        cache = create_response_cache(FailingBackend())
+        response = await forward_request(
+            client, f"http://{MOCK_HOST}:{MOCK_PORT}/cached", make_request("a"), cache=cache)
+        assert response.status_code == 200
+        assert json.loads(response.body) == {"version": 1}
+
+    async def test_cache_revalidate(self, client):
+        now = [0.0]
+        cache = TTLCache(MemoryBackend(), "proxy", ttl=0, stale_ttl=60, clock=lambda: now[0])
+        url = f"http://{MOCK_HOST}:{MOCK_PORT}/cached"
+        await forward_request(client, url, make_request("a"), cache=cache)
+        now[0] = 61
+        response = await forward_request(client, url, make_request("a"), cache=cache)
+        assert json.loads(response.body) == {"version": 1}
+        assert cached_requests == [None, '"v1"']
+
+    async def test_ttl_override(self, client):
+        cache = create_response_cache(MemoryBackend())
+        url = f"http://{MOCK_HOST}:{MOCK_PORT}/valid"
+        await forward_request(client, url, make_request("a"), cache=cache, ttl=60)
+        entry = await cache.get(f"{url}/a?")
+        assert entry[1] == True
+
+    async def test_stale_when_circuit_open(self, client):
+        now = [0.0]
+        cache = TTLCache(MemoryBackend(), "proxy", ttl=0, stale_ttl=60, clock=lambda: now[0])
+        breaker = CircuitBreaker("test", min_calls=1)
+        url = f"http://{MOCK_HOST}:{MOCK_PORT}/cached"
+        await forward_request(client, url, make_request("a"), cache=cache, breaker=breaker)
+        with pytest.raises(httpx.RequestError):
+            await forward_request(client, "http://0.0.0.0:1", make_request("a"), breaker=breaker)
+        now[0] = 61
+
+        response = await forward_request(
+            client, url, make_request("a"), cache=cache, breaker=breaker)
+        assert json.loads(response.body) == {"version": 1}
+        assert response.headers["warning"] == '110 - "Response is Stale"'
+        assert cached_requests == [None]
+
+    async def test_stale_without_max_age(self, client):
+        cache = create_response_cache(MemoryBackend())
+        breaker = CircuitBreaker("test", min_calls=1)
+        url = f"http://{MOCK_HOST}:{MOCK_PORT}/valid"
+        await forward_request(client, url, make_request("a"), cache=cache, breaker=breaker)
+        with pytest.raises(httpx.RequestError):
+            await forward_request(client, "http://0.0.0.0:1", make_request("a"), breaker=breaker)
+
+        response = await forward_request(
+            client, url, make_request("a"), cache=cache, breaker=breaker)
+        assert json.loads(response.body) == {"path_params": "a", "queries": None}
+        assert response.headers["warning"] == '110 - "Response is Stale"'
+
+    async def test_no_store_not_cached(self, client):
+        cache = create_response_cache(MemoryBackend())
+        url = f"http://{MOCK_HOST}:{MOCK_PORT}/uncacheable"
+        await forward_request(client, url, make_request("a"), cache=cache)
+        assert await cache.get(f"{url}/a?") == None
+
+    async def test_circuit_open_without_cache(self, client):
+        breaker = CircuitBreaker("test", min_calls=1)
+        url = f"http://{MOCK_HOST}:{MOCK_PORT}/valid"
+        with pytest.raises(httpx.RequestError):
+            await forward_request(client, "http://0.0.0.0:1", make_request("a"), breaker=breaker)
+        with pytest.raises(HTTPException) as exc_info:
+            await forward_request(client, url, make_request("a"), breaker=breaker)
+        assert exc_info.value.status_code == 503
+
+    async def test_stale_when_unreachable(self, client):
+        now = [0.0]
+        cache = TTLCache(MemoryBackend(), "proxy", ttl=0, stale_ttl=60, clock=lambda: now[0])
+        await forward_request(
+            client, f"http://{MOCK_HOST}:{MOCK_PORT}/cached", make_request("a"), cache=cache)
+        entry = await cache.get(f"http://{MOCK_HOST}:{MOCK_PORT}/cached/a?")
+        await cache.set("http://0.0.0.0:1/cached/a?", entry[0], ttl=0)
+
+        response = await forward_request(
+            client, "http://0.0.0.0:1/cached", make_request("a"), cache=cache)
+        assert json.loads(response.body) == {"version": 1}
+        assert "warning" in response.headers
+
+    async def test_single_flight(self, client):
+        flight = SingleFlight()
+        url = f"http://{MOCK_HOST}:{MOCK_PORT}/cached"
+        responses = await asyncio.gather(
+            *(forward_request(client, url, make_request("a"), flight=flight) for _ in range(5)))
+        assert [json.loads(response.body) for response in responses] == [{"version": 1}] * 5
+        assert cached_requests == [None]
+        assert flight.stats() == {"calls": 1, "shared": 4}
+
+
+async def read_stream(response: Response) -> bytes:
+    """
+    Reads the body of a streamed response and runs its background task.
+    """
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    await response.background()
+    return body
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("mock_api")
+class TestStreamRequest:
+    async def test_compressed(self, client):
+        request = make_request("", headers=[(b"accept-encoding", b"gzip")])
+        response = await stream_request(client, f"http://{MOCK_HOST}:{MOCK_PORT}/large", request)
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.headers["vary"] == "Accept-Encoding"
+        body = gzip.decompress(await read_stream(response))
+        assert json.loads(body) == {"plays": [{"index": i} for i in range(1000)]}
+
+    async def test_identity(self, client):
+        request = make_request("")
+        response = await stream_request(client, f"http://{MOCK_HOST}:{MOCK_PORT}/large", request)
+        assert "content-encoding" not in response.headers
+        assert len(json.loads(await read_stream(response))["plays"]) == 1000
+
+    async def test_not_modified(self, client):
+        request = make_request("a", headers=[(b"if-none-match", b'"v1"')])
+        response = await stream_request(client, f"http://{MOCK_HOST}:{MOCK_PORT}/cached", request)
+        assert response.status_code == 304
+        assert response.headers["vary"] == "Accept-Encoding"
+
+    async def test_invalid_route(self, client):
+        with pytest.raises(HTTPException) as exc:
+            await stream_request(client, f"http://{MOCK_HOST}:{MOCK_PORT}/invalid", make_request(""))
+        assert exc.value.status_code == 404
@@ -0,0 +1,171 @@
+"""
+This module contains the bulk loader used to backfill the hockey database with historical seasons.
+The events and involved players of a batch of games are streamed into temporary staging tables with
+`COPY` and then merged into the database with a single statement per table, including the player
+events.
+"""
+
+import psycopg
+from create_tables import create_partitions
+from dimensions import upsert_dimensions
+
+
+CREATE_STAGING_QUERIES = [
+    """
+    CREATE TEMP TABLE IF NOT EXISTS event_stage (
+        game_id INTEGER,
+        season INTEGER,
+        index INTEGER,
+        type TEXT,
+        x NUMERIC,
+        y NUMERIC,
+        period_number INTEGER,
+        period_type TEXT,
+        period_time INTERVAL,
+        datetime TIMESTAMPTZ
+    )""",
+    """
+    CREATE TEMP TABLE IF NOT EXISTS involved_player_stage (
+        game_id INTEGER,
+        season INTEGER,
+        event_index INTEGER,
+        player_id INTEGER,
+        type TEXT
+    )""",
+]
+
+
+def copy_games(games: list[dict], conn: psycopg.Connection):
+    """
+    Loads a batch of games into the database. The games are not committed.
+
+    Args:
+        games: a list of dictionaries representing games
+        conn: the database connection
+    """
+    if len(games) == 0:
+        return None
+
+    with conn.cursor() as cur:
+        insert_games(games, cur)
+        upsert_dimensions(games, cur)
+        create_partitions(cur, [game["season"] for game in games])
+
+        for query in CREATE_STAGING_QUERIES:
+            cur.execute(query)
+        cur.execute("TRUNCATE event_stage, involved_player_stage")
+
+        with cur.copy("""
+            COPY event_stage (
+                game_id, season, index, type, x, y,
+                period_number, period_type, period_time, datetime)
+            FROM STDIN
+            """) as copy:
+            for game in games:
+                for event in game["events"]:
+                    copy.write_row((
+                        game["id"],
+                        game["season"],
+                        event["about"]["eventIdx"],
+                        event["result"]["eventTypeId"],
+                        event["coordinates"].get("x"),
+                        event["coordinates"].get("y"),
+                        event["about"]["period"],
+                        event["about"]["periodType"],
+                        "00:" + event["about"]["periodTime"],
+                        event["about"]["dateTime"],
+                    ))
+
+        # a player that is listed more than once in an event keeps the last of their types, as
+        # they do when the events are inserted incrementally
+        players = {
+            (game["id"], event["about"]["eventIdx"], player["player"]["id"]): (
+                game["season"], player["playerType"])
+            for game in games for event in game["events"] for player in event.get("players") or []
+        }
+        with cur.copy("""
+            COPY involved_player_stage (game_id, season, event_index, player_id, type) FROM STDIN
+            """) as copy:
+            for (game_id, event_index, player_id), (season, type) in players.items():
+                copy.write_row((game_id, season, event_index, player_id, type))
+
+        merge_staged_events(cur)
+
+
+def insert_games(games: list[dict], cur: psycopg.Cursor):
+    """
+    Inserts the arenas and games of a batch of games into the database.
+
+    Args:
+        games: a list of dictionaries representing games
+        cur: the database cursor
+    """
+    cur.execute("""
+        INSERT INTO arena (name)
+        SELECT DISTINCT name FROM unnest(%s::text[]) AS a (name)
+        ON CONFLICT (name) DO NOTHING
+        """, [[game["arena"] for game in games]])
+
+    cur.execute("""
+        INSERT INTO game
+        (id, home_team_id, away_team_id, arena_id, type, season, datetime)
+        SELECT g.id, g.home_team_id, g.away_team_id, arena.id, g.type, g.season, g.datetime
+        FROM unnest(
+            %s::integer[], %s::integer[], %s::integer[], %s::text[],
+            %s::text[], %s::integer[], %s::timestamptz[])
+        AS g (id, home_team_id, away_team_id, arena, type, season, datetime)
+        INNER JOIN arena ON arena.name = g.arena
+        ON CONFLICT (id) DO NOTHING
+        """, [
+        [game["id"] for game in games],
+        [game["home_team_id"] for game in games],
+        [game["away_team_id"] for game in games],
+        [game["arena"] for game in games],
+        [game["type"] for game in games],
+        [game["season"] for game in games],
+        [game["datetime"] for game in games]])
+
+
+def merge_staged_events(cur: psycopg.Cursor):
+    """
+    Merges the staged events and involved players into the database, along with their player
+    events.
+
+    Args:
+        cur: the database cursor
+    """
+    cur.execute("""
+        INSERT INTO period (number, type)
+        SELECT DISTINCT period_number, period_type FROM event_stage
+        ON CONFLICT (number, type) DO NOTHING
+        """)
+
+    cur.execute("""
+        INSERT INTO event
+        (index, game_id, season, type, x, y, period_id, period_time, datetime)
+        SELECT s.index, s.game_id, s.season, s.type, s.x, s.y, period.id, s.period_time, s.datetime
+        FROM event_stage AS s
+        INNER JOIN period ON period.number = s.period_number AND period.type = s.period_type
+        ON CONFLICT ON CONSTRAINT event_game_id_index_key DO NOTHING
+        """)
+
+    cur.execute("""
+        INSERT INTO involved_player (event_id, player_id, season, type)
+        SELECT event.id, s.player_id, s.season, s.type
+        FROM involved_player_stage AS s
+        INNER JOIN event
+        ON event.game_id = s.game_id AND event.index = s.event_index AND event.season = s.season
+        ON CONFLICT ON CONSTRAINT involved_player_pkey DO NOTHING
+        """)
+
+    cur.execute("""
+        INSERT INTO player_event (
+            player_id, season, event_type, player_type, game_id, index,
+            x, y, period_number, period_type, period_time, datetime)
+        SELECT p.player_id, e.season, e.type, p.type, e.game_id, e.index,
+            e.x, e.y, e.period_number, e.period_type, e.period_time, e.datetime
+        FROM involved_player_stage AS p
+        INNER JOIN event_stage AS e
+        ON e.game_id = p.game_id AND e.index = p.event_index AND e.season = p.season
+        ON CONFLICT ON CONSTRAINT player_event_pkey DO NOTHING
+        """)
@@ -1,16 +1,17 @@
+import argparse
 import psycopg
 from psycopg import sql
 from constants import DB_NAME, DB_USER
 
 
-CREATE_TABLE_QUERIES = [
-    sql.SQL("""
+CREATE_TABLE_QUERIES = {
+    "arena": sql.SQL("""
         CREATE TABLE IF NOT EXISTS arena (
             id INTEGER GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
             name TEXT NOT NULL UNIQUE
         )"""
     ),
-    sql.SQL("""
+    "game": sql.SQL("""
         CREATE TABLE IF NOT EXISTS game (
             id INTEGER PRIMARY KEY,
             home_team_id INTEGER NOT NULL,
@@ -23,7 +24,7 @@ CREATE_TABLE_QUERIES = [
             FOREIGN KEY (arena_id) REFERENCES arena(id)
         )"""
     ),
-    sql.SQL("""
+    "period": sql.SQL("""
         CREATE TABLE IF NOT EXISTS period (
             id INTEGER GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
             number INTEGER NOT NULL,
@@ -32,11 +33,12 @@ CREATE_TABLE_QUERIES = [
             UNIQUE (number, type)
         )"""
     ),
-    sql.SQL("""
+    "event": sql.SQL("""
         CREATE TABLE IF NOT EXISTS event (
             id INTEGER GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
             index INTEGER,
             game_id INTEGER,
+            season INTEGER NOT NULL,
             type TEXT NOT NULL,
             x INTEGER,
             y INTEGER,
@@ -44,35 +46,221 @@ CREATE_TABLE_QUERIES = [
             period_time INTERVAL NOT NULL,
             datetime TIMESTAMPTZ NOT NULL,
 
-            UNIQUE (game_id, index),
+            CONSTRAINT event_game_id_index_key UNIQUE (game_id, index),
             FOREIGN KEY (game_id) REFERENCES game(id),
             FOREIGN KEY (period_id) REFERENCES period(id)
         )"""
     ),
-    sql.SQL("""
+    "involved_player": sql.SQL("""
         CREATE TABLE IF NOT EXISTS involved_player (
             event_id INTEGER,
             player_id INTEGER,
+            season INTEGER NOT NULL,
             type TEXT,
 
-            PRIMARY KEY (event_id, player_id),
+            CONSTRAINT involved_player_pkey PRIMARY KEY (event_id, player_id),
             FOREIGN KEY (event_id) REFERENCES event(id)
         )"""
     ),
+    "player_event": sql.SQL("""
+        CREATE TABLE IF NOT EXISTS player_event (
+            player_id INTEGER NOT NULL,
+            season INTEGER NOT NULL,
+            event_type TEXT NOT NULL,
+            player_type TEXT NOT NULL,
+            game_id INTEGER NOT NULL,
+            index INTEGER NOT NULL,
+            x INTEGER,
+            y INTEGER,
+            period_number INTEGER NOT NULL,
+            period_type TEXT NOT NULL,
+            period_time INTERVAL NOT NULL,
+            datetime TIMESTAMPTZ NOT NULL,
+
+            CONSTRAINT player_event_pkey
+            PRIMARY KEY (player_id, season, event_type, player_type, game_id, index)
+            INCLUDE (x, y, period_number, period_type, period_time, datetime)
+        )"""
+    ),
+    "team": sql.SQL("""
+        CREATE TABLE IF NOT EXISTS team (
+            id INTEGER PRIMARY KEY,
+            name TEXT,
+            abbreviation TEXT,
+            active BOOLEAN,
+            data JSONB NOT NULL,
+            game_datetime TIMESTAMPTZ NOT NULL
+        )"""
+    ),
+    "player": sql.SQL("""
+        CREATE TABLE IF NOT EXISTS player (
+            id INTEGER PRIMARY KEY,
+            first_name TEXT,
+            last_name TEXT,
+            position TEXT,
+            team_id INTEGER,
+            active BOOLEAN,
+            data JSONB NOT NULL,
+            game_datetime TIMESTAMPTZ NOT NULL
+        )"""
+    ),
+    "ingest_state": sql.SQL("""
+        CREATE TABLE IF NOT EXISTS ingest_state (
+            game_id INTEGER PRIMARY KEY,
+            status TEXT NOT NULL DEFAULT 'pending'
+                CHECK (status IN ('pending', 'fetched', 'loaded', 'failed')),
+            attempts INTEGER NOT NULL DEFAULT 0,
+            content_hash TEXT,
+            etag TEXT,
+            last_modified TEXT,
+            game_datetime TIMESTAMPTZ,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )"""
+    ),
+}
+
+# The event tables of the partitioned schema, which are partitioned by season
+# so that queries for a season only scan its partitions and old seasons can be maintained on their
+# own. The keys of the tables include the season, as partitioned tables require, but keep the
+# names of the keys of the unpartitioned tables so that inserts can target them in either schema.
+CREATE_PARTITIONED_TABLE_QUERIES = {
+    "event": sql.SQL("""
+        CREATE TABLE IF NOT EXISTS event (
+            id INTEGER GENERATED ALWAYS AS IDENTITY,
+            index INTEGER,
+            game_id INTEGER,
+            season INTEGER NOT NULL,
+            type TEXT NOT NULL,
+            x INTEGER,
+            y INTEGER,
+            period_id INTEGER NOT NULL,
+            period_time INTERVAL NOT NULL,
+            datetime TIMESTAMPTZ NOT NULL,
+
+            CONSTRAINT event_pkey PRIMARY KEY (id, season),
+            CONSTRAINT event_game_id_index_key UNIQUE (game_id, index, season),
+            FOREIGN KEY (game_id) REFERENCES game(id),
+            FOREIGN KEY (period_id) REFERENCES period(id)
+        ) PARTITION BY RANGE (season)"""
+    ),
+    "involved_player": sql.SQL("""
+        CREATE TABLE IF NOT EXISTS involved_player (
+            event_id INTEGER,
+            player_id INTEGER,
+            season INTEGER NOT NULL,
+            type TEXT,
+
+            CONSTRAINT involved_player_pkey PRIMARY KEY (event_id, player_id, season),
+            FOREIGN KEY (event_id, season) REFERENCES event(id, season)
+        ) PARTITION BY RANGE (season)"""
+    ),
+    "player_event": sql.SQL("""
+        CREATE TABLE IF NOT EXISTS player_event (
+            player_id INTEGER NOT NULL,
+            season INTEGER NOT NULL,
+            event_type TEXT NOT NULL,
+            player_type TEXT NOT NULL,
+            game_id INTEGER NOT NULL,
+            index INTEGER NOT NULL,
+            x INTEGER,
+            y INTEGER,
+            period_number INTEGER NOT NULL,
+            period_type TEXT NOT NULL,
+            period_time INTERVAL NOT NULL,
+            datetime TIMESTAMPTZ NOT NULL,
+
+            CONSTRAINT player_event_pkey
+            PRIMARY KEY (player_id, season, event_type, player_type, game_id, index)
+            INCLUDE (x, y, period_number, period_type, period_time, datetime)
+        ) PARTITION BY RANGE (season)"""
+    ),
+}
+
+# The tables that are partitioned by season in the partitioned schema
+PARTITIONED_TABLES = list(CREATE_PARTITIONED_TABLE_QUERIES)
+
+# Indexes for the update service, which replaces the player events of the events it inserts,
+# resumes from the most recent loaded game and retries the games that have not been loaded. The
+# player event lookups of the API are served by the key of the player_event table.
+CREATE_INDEX_QUERIES = [
+    sql.SQL("""
+        CREATE INDEX IF NOT EXISTS player_event_game_idx
+        ON player_event (game_id, index)"""
+    ),
+    sql.SQL("""
+        CREATE INDEX IF NOT EXISTS ingest_state_loaded_idx
+        ON ingest_state (game_datetime) WHERE status = 'loaded'"""
+    ),
+    sql.SQL("""
+        CREATE INDEX IF NOT EXISTS ingest_state_unloaded_idx
+        ON ingest_state (game_id) WHERE status <> 'loaded'"""
+    ),
 ]
 
-def create_tables(conn_str: str):
+# Indexes of previous versions of the schema that no longer serve any query
+DROPPED_INDEXES = ["involved_player_player_idx", "event_game_type_idx"]
+
+
+def create_tables(conn_str: str, partitioned: bool = False):
     """
-    Creates the tables for the hockey database if they do not already exist.
+    Creates the tables and indexes for the hockey database if they do not already exist.
 
     Args:
         conn_str: the database connection string
+        partitioned: whether to partition the event, involved_player and player_event tables by season
     """
     with psycopg.connect(conn_str) as conn:
         with conn.cursor() as cur:
-            for query in CREATE_TABLE_QUERIES:
-                cur.execute(query)
+            create_schema(cur, partitioned)
+
+
+def create_schema(cur: psycopg.Cursor, partitioned: bool = False):
+    """
+    Creates the tables and indexes for the hockey database if they do not already exist.
+
+    Args:
+        cur: the database cursor
+        partitioned: whether to partition the event, involved_player and player_event tables by season
+    """
+    queries = CREATE_TABLE_QUERIES
+    if partitioned:
+        queries = {**CREATE_TABLE_QUERIES, **CREATE_PARTITIONED_TABLE_QUERIES}
+    for query in list(queries.values()) + CREATE_INDEX_QUERIES:
+        cur.execute(query)
+
+
+def create_partitions(cur: psycopg.Cursor, seasons: list):
+    """
+    Creates the partitions of the given seasons that do not already exist. Nothing is created if
+    the tables are not partitioned.
+
+    Args:
+        cur: the database cursor
+        seasons: the seasons, such as 20212022
+    """
+    missing = cur.execute("""
+        SELECT season FROM unnest(%s::integer[]) AS s (season)
+        WHERE EXISTS (SELECT FROM pg_partitioned_table WHERE partrelid = to_regclass('event'))
+        AND EXISTS (
+            SELECT FROM unnest(%s::text[]) AS t (name)
+            WHERE to_regclass(name || '_' || season) IS NULL)
+        """, [list({int(season) for season in seasons}), PARTITIONED_TABLES]).fetchall()
+
+    for season, in missing:
+        for table in PARTITIONED_TABLES:
+            cur.execute(sql.SQL("""
+                CREATE TABLE IF NOT EXISTS {partition} PARTITION OF {table}
+                FOR VALUES FROM ({season}) TO ({next_season})
+                """).format(
+                partition=sql.Identifier(f"{table}_{season}"),
+                table=sql.Identifier(table),
+                season=sql.Literal(season),
+                next_season=sql.Literal(season + 1)))
 
 
 if __name__ == "__main__":
-    create_tables(f"dbname={DB_NAME} user={DB_USER}")
+    parser = argparse.ArgumentParser(description="Creates the tables of the hockey database.")
+    parser.add_argument("--partitioned", action="store_true",
+        help="partition the event, involved_player and player_event tables by season")
+    args = parser.parse_args()
+    create_tables(f"dbname={DB_NAME} user={DB_USER}", partitioned=args.partitioned)
@@ -0,0 +1,84 @@
+"""
+This module maintains the `player` and `team` tables, which hold the players and teams of the games
+in the database as they are in the games' live feeds. The columns that are queried are typed, and
+the whole object is kept in `data` in the format of the Stats API, so that the API can serve
+players and teams without requesting the Stats API.
+"""
+
+import psycopg
+from psycopg.types.json import Jsonb
+
+
+def upsert_dimensions(games: list[dict], cur: psycopg.Cursor):
+    """
+    Inserts or updates the players and teams of a batch of games. A player or team is only updated
+    if it has changed and the game it is from is at least as recent as the game it was last updated
+    from, so that loading older games never overwrites newer data.
+
+    Args:
+        games: a list of dictionaries representing games
+        cur: the database cursor
+    """
+    games = [game for game in games if game.get("players") or game.get("teams")]
+    if len(games) == 0:
+        return None
+
+    feeds = Jsonb([
+        {
+            "datetime": game["datetime"],
+            "players": game.get("players") or [],
+            "teams": game.get("teams") or [],
+        }
+        for game in games
+    ])
+
+    cur.execute("""
+        INSERT INTO team (id, name, abbreviation, active, data, game_datetime)
+        SELECT DISTINCT ON (id)
+            (t ->> 'id')::integer AS id,
+            t ->> 'name',
+            t ->> 'abbreviation',
+            (t ->> 'active')::boolean,
+            t,
+            g.datetime
+        FROM jsonb_to_recordset(%s) AS g (datetime TIMESTAMPTZ, teams JSONB),
+            jsonb_array_elements(g.teams) AS t
+        ORDER BY id, g.datetime DESC
+        ON CONFLICT (id)
+        DO UPDATE SET
+            name = excluded.name,
+            abbreviation = excluded.abbreviation,
+            active = excluded.active,
+            data = excluded.data,
+            game_datetime = excluded.game_datetime
+        WHERE team.game_datetime <= excluded.game_datetime
+        AND team.data IS DISTINCT FROM excluded.data
+        """, [feeds])
+
+    cur.execute("""
+        INSERT INTO player
+        (id, first_name, last_name, position, team_id, active, data, game_datetime)
+        SELECT DISTINCT ON (id)
+            (p ->> 'id')::integer AS id,
+            p ->> 'firstName',
+            p ->> 'lastName',
+            p -> 'primaryPosition' ->> 'abbreviation',
+            (p -> 'currentTeam' ->> 'id')::integer,
+            (p ->> 'active')::boolean,
+            p,
+            g.datetime
+        FROM jsonb_to_recordset(%s) AS g (datetime TIMESTAMPTZ, players JSONB),
+            jsonb_array_elements(g.players) AS p
+        ORDER BY id, g.datetime DESC
+        ON CONFLICT (id)
+        DO UPDATE SET
+            first_name = excluded.first_name,
+            last_name = excluded.last_name,
+            position = excluded.position,
+            team_id = excluded.team_id,
+            active = excluded.active,
+            data = excluded.data,
+            game_datetime = excluded.game_datetime
+        WHERE player.game_datetime <= excluded.game_datetime
+        AND player.data IS DISTINCT FROM excluded.data
+        """, [feeds])
@@ -0,0 +1,131 @@
+"""
+This module tracks the ingestion of each game by the update service in the `ingest_state` table so
+that an interrupted update resumes where it stopped and games that failed are retried.
+
+A game is `pending` once it has been scheduled, `fetched` once its feed has been downloaded,
+`loaded` once it has been committed to the database and `failed` if it could not be downloaded or
+inserted.
+"""
+
+from datetime import datetime
+import psycopg
+
+
+MAX_ATTEMPTS = 5
+
+
+def register_games(conn: psycopg.Connection, game_ids: set, max_attempts: int = MAX_ATTEMPTS
+        ) -> dict[int, dict | None]:
+    """
+    Adds the scheduled games that are not tracked yet as pending.
+
+    Args:
+        conn: the database connection
+        game_ids: the IDs of the scheduled games
+        max_attempts: the number of attempts after which a game is no longer retried
+
+    Returns:
+        A dictionary sorted by game ID of every game that has to be fetched. This includes the
+        scheduled games that have been loaded, which map to the `etag`, `last_modified` and
+        `content_hash` of their feed when it was loaded so that they are only reloaded if their
+        feed has changed. The games that still have to be loaded, including the games of previous
+        updates that were interrupted or failed, map to None.
+    """
+    with conn.transaction():
+        conn.execute("""
+            INSERT INTO ingest_state (game_id)
+            SELECT * FROM unnest(%s::integer[])
+            ON CONFLICT (game_id) DO NOTHING
+            """, [list(game_ids)])
+        rows = conn.execute("""
+            SELECT game_id, status, etag, last_modified, content_hash FROM ingest_state
+            WHERE (status <> 'loaded' AND attempts < %s)
+            OR (status = 'loaded' AND game_id = ANY(%s))
+            ORDER BY game_id
+            """, [max_attempts, list(game_ids)]).fetchall()
+
+    games = {}
+    for id, status, etag, last_modified, content_hash in rows:
+        games[id] = None
+        if status == "loaded":
+            games[id] = {"etag": etag, "last_modified": last_modified, "content_hash": content_hash}
+    return games
+
+
+def set_fetched(conn: psycopg.Connection, games: list[dict]):
+    """
+    Marks downloaded games as fetched and counts the attempt to load them. The attempts are
+    counted from one again if the feed of a game has changed.
+
+    Args:
+        conn: the database connection
+        games: a list of dictionaries representing games
+    """
+    conn.execute("""
+        UPDATE ingest_state
+        SET status = 'fetched',
+            attempts = CASE
+                WHEN ingest_state.content_hash IS DISTINCT FROM g.content_hash THEN 1
+                ELSE attempts + 1
+            END,
+            content_hash = g.content_hash, etag = g.etag, last_modified = g.last_modified,
+            game_datetime = g.game_datetime, updated_at = now()
+        FROM unnest(%s::integer[], %s::text[], %s::text[], %s::text[], %s::timestamptz[])
+        AS g (game_id, content_hash, etag, last_modified, game_datetime)
+        WHERE ingest_state.game_id = g.game_id
+        """, [
+        [game["id"] for game in games],
+        [game.get("hash") for game in games],
+        [game.get("etag") for game in games],
+        [game.get("last_modified") for game in games],
+        [game["datetime"] for game in games]])
+
+
+def set_status(conn: psycopg.Connection, game_ids: list[int], status: str, attempt: bool = False):
+    """
+    Sets the status of games.
+
+    Args:
+        conn: the database connection
+        game_ids: the IDs of the games
+        status: the new status of the games
+        attempt: whether to count an attempt to load the games
+    """
+    conn.execute("""
+        UPDATE ingest_state
+        SET status = %s, attempts = attempts + %s, updated_at = now()
+        WHERE game_id = ANY(%s)
+        """, [status, int(attempt), list(game_ids)])
+
+
+def set_live(conn: psycopg.Connection, game: dict):
+    """
+    Marks a game that was written from its live feed as loaded, without the hash of its feed. The
+    next update then reloads the game whatever its feed, so that the plays that were removed from
+    the feed after they were written are deleted.
+
+    Args:
+        conn: the database connection
+        game: a dictionary representing a game, or only its ID, season and events
+    """
+    conn.execute("""
+        INSERT INTO ingest_state (game_id, status, game_datetime) VALUES (%s, 'loaded', %s)
+        ON CONFLICT (game_id) DO UPDATE
+        SET status = 'loaded', content_hash = NULL, etag = NULL, last_modified = NULL,
+            game_datetime = coalesce(excluded.game_datetime, ingest_state.game_datetime),
+            updated_at = now()
+        """, [game["id"], game.get("datetime")])
+
+
+def most_recent_loaded(conn: psycopg.Connection) -> datetime | None:
+    """
+    Returns the datetime of the most recent game that has been loaded.
+    """
+    row = conn.execute("""
+        SELECT game_datetime FROM ingest_state
+        WHERE status = 'loaded' AND game_datetime IS NOT NULL
+        ORDER BY game_datetime DESC
+        LIMIT 1
+        """).fetchone()
+    if row != None:
+        return row[0]
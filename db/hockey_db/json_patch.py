@@ -0,0 +1,151 @@
+"""
+This module applies JSON patches (RFC 6902), such as the diffs of the NHL API's live feed, to
+parsed JSON documents.
+"""
+
+from copy import deepcopy
+from typing import Any
+
+
+class PatchError(Exception):
+    """
+    Raised when a patch cannot be applied to a document.
+    """
+
+
+def apply_patch(document: Any, operations: list[dict]) -> Any:
+    """
+    Applies the operations of a JSON patch to a document in place.
+
+    Args:
+        document: the parsed JSON document
+        operations: the operations of the patch
+
+    Returns:
+        The patched document, which is a different object only if its root was replaced.
+
+    Raises:
+        PatchError: If an operation is invalid or a `test` operation fails
+    """
+    for operation in operations:
+        document = apply_operation(document, operation)
+    return document
+
+
+def apply_operation(document: Any, operation: dict) -> Any:
+    """
+    Applies a single JSON patch operation to a document in place.
+
+    Args:
+        document: the parsed JSON document
+        operation: the operation
+
+    Returns:
+        The patched document.
+
+    Raises:
+        PatchError: If the operation is invalid or a `test` operation fails
+    """
+    op = operation.get("op")
+    path = operation.get("path")
+    if path == None:
+        raise PatchError(f"operation is missing a path: {operation}")
+
+    if op == "add":
+        return add(document, path, deepcopy(operation["value"]))
+    if op == "remove":
+        remove(document, path)
+        return document
+    if op == "replace":
+        if path == "":
+            return deepcopy(operation["value"])
+        remove(document, path)
+        return add(document, path, deepcopy(operation["value"]))
+    if op == "move":
+        value = get(document, operation["from"])
+        remove(document, operation["from"])
+        return add(document, path, value)
+    if op == "copy":
+        return add(document, path, deepcopy(get(document, operation["from"])))
+    if op == "test":
+        if get(document, path) != operation["value"]:
+            raise PatchError(f"test failed: {operation}")
+        return document
+    raise PatchError(f"unsupported operation: {operation}")
+
+
+def parse_pointer(path: str) -> list[str]:
+    """
+    Returns the reference tokens of a JSON pointer.
+    """
+    if path == "":
+        return []
+    if not path.startswith("/"):
+        raise PatchError(f"invalid pointer: {path}")
+    return [token.replace("~1", "/").replace("~0", "~") for token in path[1:].split("/")]
+
+
+def get(document: Any, path: str) -> Any:
+    """
+    Returns the value at a JSON pointer of a document.
+    """
+    value = document
+    for token in parse_pointer(path):
+        value = child(value, token)
+    return value
+
+
+def child(container: Any, token: str) -> Any:
+    """
+    Returns the child of an object or array for a reference token.
+    """
+    try:
+        if isinstance(container, list):
+            return container[int(token)]
+        return container[token]
+    except (KeyError, IndexError, ValueError, TypeError):
+        raise PatchError(f"path does not exist: {token}")
+
+
+def add(document: Any, path: str, value: Any) -> Any:
+    """
+    Adds a value at a JSON pointer of a document.
+    """
+    tokens = parse_pointer(path)
+    if len(tokens) == 0:
+        return value
+
+    parent = document
+    for token in tokens[:-1]:
+        parent = child(parent, token)
+
+    token = tokens[-1]
+    if isinstance(parent, list):
+        index = len(parent) if token == "-" else int(token)
+        if index > len(parent):
+            raise PatchError(f"index out of range: {path}")
+        parent.insert(index, value)
+    elif isinstance(parent, dict):
+        parent[token] = value
+    else:
+        raise PatchError(f"path does not exist: {path}")
+    return document
+
+
+def remove(document: Any, path: str):
+    """
+    Removes the value at a JSON pointer of a document.
+    """
+    tokens = parse_pointer(path)
+    if len(tokens) == 0:
+        raise PatchError("cannot remove the root of a document")
+
+    parent = document
+    for token in tokens[:-1]:
+        parent = child(parent, token)
+
+    child(parent, tokens[-1])
+    if isinstance(parent, list):
+        del parent[int(tokens[-1])]
+    else:
+        del parent[tokens[-1]]
@@ -0,0 +1,139 @@
+"""
+This module migrates an existing hockey database to the current schema. The season of each event
+and involved player is denormalized from its game, the player events are populated from the
+existing events, and the event tables can be converted into tables partitioned by season.
+"""
+
+import argparse
+import psycopg
+from psycopg import sql
+from constants import DB_NAME, DB_USER
+from create_tables import create_partitions, create_schema, DROPPED_INDEXES, PARTITIONED_TABLES
+from player_event import populate_player_events
+
+
+def migrate_tables(conn_str: str, partitioned: bool | None = None):
+    """
+    Migrates the tables of the hockey database to the current schema in a single transaction. The
+    tables that do not exist are created and the indexes that are no longer used are dropped.
+    Migrating a database that is up to date does nothing.
+
+    Args:
+        conn_str: the database connection string
+        partitioned: whether to partition the event, involved_player and player_event tables by
+            season; the tables keep their current layout if None
+    """
+    with psycopg.connect(conn_str) as conn:
+        with conn.cursor() as cur:
+            if partitioned == None:
+                partitioned = is_partitioned(cur, "event")
+            create_schema(cur, partitioned)
+            for index in DROPPED_INDEXES:
+                cur.execute(sql.SQL("DROP INDEX IF EXISTS {}").format(sql.Identifier(index)))
+            add_seasons(cur)
+            if partitioned:
+                partition_tables(cur)
+            if cur.execute("SELECT NOT EXISTS (SELECT FROM player_event)").fetchone()[0]:
+                populate_player_events(cur)
+
+
+def add_seasons(cur: psycopg.Cursor):
+    """
+    Adds the season of the game to the events and involved players if they do not have it.
+
+    Args:
+        cur: the database cursor
+    """
+    if not has_season(cur, "event"):
+        cur.execute("ALTER TABLE event ADD COLUMN season INTEGER")
+        cur.execute("UPDATE event SET season = game.season FROM game WHERE game.id = event.game_id")
+        cur.execute("ALTER TABLE event ALTER COLUMN season SET NOT NULL")
+
+    if not has_season(cur, "involved_player"):
+        cur.execute("ALTER TABLE involved_player ADD COLUMN season INTEGER")
+        cur.execute("""
+            UPDATE involved_player SET season = event.season
+            FROM event WHERE event.id = involved_player.event_id
+            """)
+        cur.execute("ALTER TABLE involved_player ALTER COLUMN season SET NOT NULL")
+
+
+def has_season(cur: psycopg.Cursor, table: str) -> bool:
+    """
+    Returns whether a table has a season column.
+    """
+    return cur.execute("""
+        SELECT EXISTS (
+        SELECT FROM information_schema.columns
+        WHERE table_schema = 'public' AND table_name = %s AND column_name = 'season')
+        """, [table]).fetchone()[0]
+
+
+def is_partitioned(cur: psycopg.Cursor, table: str) -> bool:
+    """
+    Returns whether a table is partitioned.
+    """
+    return cur.execute("""
+        SELECT EXISTS (SELECT FROM pg_partitioned_table WHERE partrelid = to_regclass(%s))
+        """, [table]).fetchone()[0]
+
+
+def partition_tables(cur: psycopg.Cursor):
+    """
+    Replaces the event tables that are not partitioned with tables partitioned by season. The rows
+    are copied with their IDs and the unpartitioned tables are dropped.
+
+    Args:
+        cur: the database cursor
+    """
+    tables = [table for table in PARTITIONED_TABLES if not is_partitioned(cur, table)]
+    if len(tables) == 0:
+        return None
+
+    # the unpartitioned tables are renamed with their indexes and sequence so that the names are
+    # free for the partitioned tables
+    if "event" in tables:
+        sequence = cur.execute("SELECT pg_get_serial_sequence('event', 'id')").fetchone()[0]
+        cur.execute(sql.SQL("ALTER SEQUENCE {} RENAME TO event_unpartitioned_id_seq").format(
+            sql.Identifier(*sequence.split("."))))
+    for table in tables:
+        indexes = cur.execute("""
+            SELECT indexname FROM pg_indexes WHERE schemaname = 'public' AND tablename = %s
+            """, [table]).fetchall()
+        for index, in indexes:
+            cur.execute(sql.SQL("ALTER INDEX {} RENAME TO {}").format(
+                sql.Identifier(index), sql.Identifier(f"{index}_unpartitioned")))
+        cur.execute(sql.SQL("ALTER TABLE {} RENAME TO {}").format(
+            sql.Identifier(table), sql.Identifier(f"{table}_unpartitioned")))
+
+    create_schema(cur, partitioned=True)
+    seasons = cur.execute("SELECT DISTINCT season FROM game").fetchall()
+    create_partitions(cur, [season for season, in seasons])
+
+    for table in tables:
+        columns = cur.execute("""
+            SELECT column_name FROM information_schema.columns
+            WHERE table_schema = 'public' AND table_name = %s
+            ORDER BY ordinal_position
+            """, [table]).fetchall()
+        columns = sql.SQL(", ").join(sql.Identifier(column) for column, in columns)
+        cur.execute(sql.SQL("""
+            INSERT INTO {table} ({columns}) OVERRIDING SYSTEM VALUE
+            SELECT {columns} FROM {unpartitioned}
+            """).format(
+            table=sql.Identifier(table),
+            columns=columns,
+            unpartitioned=sql.Identifier(f"{table}_unpartitioned")))
+
+    if "event" in tables:
+        cur.execute("SELECT setval(pg_get_serial_sequence('event', 'id'), max(id)) FROM event")
+    for table in reversed(tables):
+        cur.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(f"{table}_unpartitioned")))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrates the tables of the hockey database.")
+    parser.add_argument("--partitioned", action="store_true", default=None,
+        help="partition the event, involved_player and player_event tables by season")
+    args = parser.parse_args()
+    migrate_tables(f"dbname={DB_NAME} user={DB_USER}", partitioned=args.partitioned)
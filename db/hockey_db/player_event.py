@@ -0,0 +1,94 @@
+"""
+This module maintains the `player_event` table, a read model of the events involving each player.
+Each row holds the columns that the API returns for a player's events, keyed by the player, season,
+event type and player type, so that the API reads the events of a player with a single index range
+scan instead of joining the event tables.
+"""
+
+import psycopg
+
+
+# The columns of a player event, selected from the event tables
+SELECT_PLAYER_EVENTS = """
+    SELECT
+    involved_player.player_id,
+    event.season,
+    event.type,
+    involved_player.type,
+    event.game_id,
+    event.index,
+    event.x,
+    event.y,
+    period.number,
+    period.type,
+    event.period_time,
+    event.datetime
+    FROM involved_player
+    INNER JOIN event
+    ON involved_player.event_id = event.id AND involved_player.season = event.season
+    INNER JOIN period ON event.period_id = period.id
+    """
+
+INSERT_PLAYER_EVENTS = """
+    INSERT INTO player_event (
+        player_id, season, event_type, player_type, game_id, index,
+        x, y, period_number, period_type, period_time, datetime)
+    """
+
+
+def refresh_player_events(
+    cur: psycopg.Cursor,
+    game_id: int,
+    season: int | str,
+    indexes: list[int],
+):
+    """
+    Replaces the player events of some events of a game with the events as they are in the event
+    tables.
+
+    Args:
+        cur: the database cursor
+        game_id: the ID of the game
+        season: the season of the game
+        indexes: the indexes of the events in the game
+    """
+    delete_player_events(cur, game_id, season, indexes)
+    cur.execute(INSERT_PLAYER_EVENTS + SELECT_PLAYER_EVENTS + """
+        WHERE event.game_id = %s AND event.season = %s AND event.index = ANY(%s)
+        """, [game_id, season, indexes])
+
+
+def delete_player_events(
+    cur: psycopg.Cursor,
+    game_id: int,
+    season: int | str,
+    indexes: list[int],
+    keep: bool = False,
+):
+    """
+    Deletes the player events of some events of a game.
+
+    Args:
+        cur: the database cursor
+        game_id: the ID of the game
+        season: the season of the game
+        indexes: the indexes of the events in the game
+        keep: whether to delete the player events of every other event of the game instead
+    """
+    condition = "NOT (index = ANY(%s))" if keep else "index = ANY(%s)"
+    cur.execute("""
+        DELETE FROM player_event
+        WHERE game_id = %s AND season = %s AND """ + condition, [game_id, season, indexes])
+
+
+def populate_player_events(cur: psycopg.Cursor):
+    """
+    Adds the player events of every event that does not have them, such as the events inserted
+    before the player events were maintained.
+
+    Args:
+        cur: the database cursor
+    """
+    cur.execute(INSERT_PLAYER_EVENTS + SELECT_PLAYER_EVENTS + """
+        ON CONFLICT ON CONSTRAINT player_event_pkey DO NOTHING
+        """)
@@ -4,58 +4,265 @@ provides a number of helper functions and a main `update` function that is calle
 service file is run.
 """
 
+import argparse
+import asyncio
 from datetime import datetime, timedelta
+import hashlib
+import logging
+import time
+from typing import Awaitable, Callable
 import psycopg
+from bulk_load import copy_games
 from constants import DB_NAME, DB_USER
+from create_tables import create_partitions
+from dimensions import upsert_dimensions
 import httpx
+import ingest_state
+import json_patch
+from migrate import migrate_tables
+from player_event import delete_player_events, refresh_player_events
 
 
 NHL_API_URL = "https://statsapi.web.nhl.com/api/v1"
+NHL_API_TIMEOUT = httpx.Timeout(30, connect=5)
+
+LIVE_MIN_INTERVAL = 5
+LIVE_MAX_INTERVAL = 60
+LIVE_SCHEDULE_INTERVAL = 300
+LIVE_PLAYS_PATH = "/liveData/plays/allPlays/"
+
+# returned by `get_game` when the feed of a game has not changed since it was loaded
+UNCHANGED = "unchanged"
+
+logger = logging.getLogger(__name__)
 
 
 def most_recent_datetime(db_conn_str: str) -> datetime | None:
     """
-    Returns the datetime of the most recent game in the database.
+    Returns the datetime of the most recent game that has been loaded into the database. Databases
+    that were populated before the ingestion state was tracked, or whose ingestion state is empty,
+    fall back to the `game` table.
     """
     with psycopg.connect(db_conn_str) as conn:
         exists = conn.execute("""
             SELECT EXISTS (
             SELECT FROM pg_tables
-            WHERE schemaname = 'public' AND tablename  = 'game')
+            WHERE schemaname = 'public' AND tablename  = 'ingest_state')
             """).fetchone()[0]
-        if exists:
-            date = conn.execute("""
-                SELECT DISTINCT ON (datetime) datetime
-                FROM game
-                ORDER BY datetime DESC
-                """
-            ).fetchone()
-            if date != None:
-                return date[0]
+        date = ingest_state.most_recent_loaded(conn) if exists else None
+        if date == None:
+            date = conn.execute("SELECT max(datetime) FROM game").fetchone()[0]
+        return date
 
 
-def update(db_conn_str: str, fm: datetime, to: datetime):
+async def update(
+    db_conn_str: str,
+    fm: datetime,
+    to: datetime,
+    mode: str = "incremental",
+    batch_size: int = 50,
+    concurrency: int = 8,
+    max_attempts: int = ingest_state.MAX_ATTEMPTS,
+):
     """
-    Updates the database with events between two dates (inclusive).
+    Updates the database with events between two dates (inclusive). Games of previous updates
+    that were interrupted or failed are retried until they have been attempted `max_attempts`
+    times. Games that have already been loaded are requested conditionally and are only reloaded
+    if their feed has changed. The database is migrated to the current schema first, so databases
+    created before the ingestion state was tracked get its table.
+
+    The game feeds are downloaded concurrently and handed to a single database writer through a
+    bounded queue, so the downloads overlap with the inserts without holding more than a few games
+    in memory.
 
     Args:
         db_conn_str: the database connection string.
         fm: the start date
         to: the end date
+        mode: `incremental` to insert the games one at a time, or `copy` to bulk load batches of
+            games with `COPY`, which is much faster when backfilling whole seasons
+        batch_size: the number of games committed in each transaction
+        concurrency: the maximum number of game feeds downloaded at the same time
+        max_attempts: the number of attempts after which a game is no longer retried
     """
-    game_ids = get_scheduled_game_ids(fm, to)
-    for id in game_ids:
+    migrate_tables(db_conn_str)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=NHL_API_TIMEOUT) as client:
+        scheduled = await get_scheduled_game_ids(client, fm, to)
         with psycopg.connect(db_conn_str) as conn:
-            insert_game(id, conn)
+            states = ingest_state.register_games(conn, scheduled, max_attempts)
+        game_ids = list(states)
+        queue = asyncio.Queue(maxsize=2 * concurrency)
+
+        fetchers = [
+            asyncio.create_task(fetch_games(client, game_ids[i::concurrency], queue, states))
+            for i in range(concurrency)
+        ]
+
+        downloads = asyncio.gather(*fetchers)
+        writer = asyncio.create_task(write_games(db_conn_str, queue, mode, batch_size))
+        stop = None
+        try:
+            await asyncio.wait([downloads, writer], return_when=asyncio.FIRST_COMPLETED)
+            if not writer.done():
+                # the writer stops once it has written the games downloaded so far, even if the
+                # downloads failed, so that its connection is closed
+                stop = asyncio.create_task(queue.put(None))
+                await asyncio.wait([stop, writer], return_when=asyncio.FIRST_EXCEPTION)
+            writer.result()
+            downloads.result()
+        finally:
+            # stop the downloads if the writer failed, and the writer if the update was cancelled
+            downloads.cancel()
+            if stop != None:
+                stop.cancel()
+            if not writer.done():
+                writer.cancel()
+                await asyncio.gather(writer, return_exceptions=True)
+
+
+async def fetch_games(
+    client: httpx.AsyncClient,
+    game_ids: list[int],
+    queue: asyncio.Queue,
+    states: dict[int, dict | None],
+):
+    """
+    Downloads the games with the given IDs and puts them in a queue as `(id, game)` pairs. The
+    game is None if it could not be downloaded. Games that have not changed since they were loaded
+    are skipped, and games that have changed are marked to be reloaded.
+
+    Args:
+        client: the http client
+        game_ids: the IDs of the games
+        queue: the queue of downloaded games
+        states: the state of the games that have been loaded, as returned by
+            `ingest_state.register_games`
+    """
+    for id in game_ids:
+        state = states.get(id)
+        game = await get_game(client, id, state)
+        if game is UNCHANGED:
+            logger.debug("game %s has not changed", id)
+            continue
+        if game != None and state != None:
+            game["reload"] = True
+        await queue.put((id, game))
+
+
+async def write_games(db_conn_str: str, queue: asyncio.Queue, mode: str, batch_size: int):
+    """
+    Inserts the games of a queue into the database until None is received. A single connection is
+    used for the whole run and the games are committed in batches. The inserts run in a separate
+    thread so that the downloads can continue while the database is busy.
+
+    Args:
+        db_conn_str: the database connection string.
+        queue: the queue of downloaded games
+        mode: `incremental` or `copy`
+        batch_size: the number of games committed in each transaction
+    """
+    conn = await asyncio.to_thread(psycopg.connect, db_conn_str)
+    try:
+        batch = []
+        while True:
+            item = await queue.get()
+            if item != None:
+                batch.append(item)
+            if len(batch) > 0 and (item == None or len(batch) >= batch_size):
+                await asyncio.to_thread(write_batch, conn, batch, mode)
+                batch = []
+            if item == None:
+                return None
+    finally:
+        await asyncio.to_thread(conn.close)
+
+
+def write_batch(conn: psycopg.Connection, items: list[tuple], mode: str) -> list[dict]:
+    """
+    Inserts a batch of games into the database in a single transaction. Each game is inserted in
+    its own savepoint so that a game that fails to insert is skipped without losing the rest of
+    the batch. The ingestion state of the games is updated with the batch.
+
+    Args:
+        conn: the database connection
+        items: a list of `(id, game)` pairs, where the game is None if it could not be downloaded
+        mode: `incremental` or `copy`
+
+    Returns:
+        The list of games that were inserted.
+    """
+    start = time.perf_counter()
+    games = [game for _, game in items if game != None]
+    with conn.transaction():
+        ingest_state.set_status(
+            conn, [id for id, game in items if game == None], "failed", attempt=True)
+        ingest_state.set_fetched(conn, games)
+
+    with conn.transaction():
+        if mode == "copy":
+            new_games = [game for game in games if not game.get("reload")]
+            try:
+                with conn.transaction():
+                    copy_games(new_games, conn)
+                inserted = new_games
+            except Exception:
+                # find the games that cannot be inserted by copying them one at a time
+                inserted = [game for game in new_games if write_game(game, conn, mode)]
+            # changed games are reloaded incrementally, which also removes the deleted events
+            inserted += [
+                game for game in games
+                if game.get("reload") and write_game(game, conn, "incremental")
+            ]
+        else:
+            inserted = [game for game in games if write_game(game, conn, mode)]
+
+        inserted_ids = {game["id"] for game in inserted}
+        ingest_state.set_status(conn, inserted_ids, "loaded")
+        ingest_state.set_status(
+            conn, [game["id"] for game in games if game["id"] not in inserted_ids], "failed")
+    elapsed = time.perf_counter() - start
+
+    events = sum(len(game["events"]) for game in inserted)
+    logger.info(
+        "committed %d of %d games (%d events) in %.2fs: %.1f games/s, %.0f events/s",
+        len(inserted), len(items), events, elapsed,
+        len(inserted) / elapsed, events / elapsed)
+    return inserted
+
+
+def write_game(game: dict, conn: psycopg.Connection, mode: str) -> bool:
+    """
+    Inserts a game into the database in a savepoint of the current transaction.
 
+    Args:
+        game: a dictionary representing a game
+        conn: the database connection
+        mode: `incremental` or `copy`
 
-def get_scheduled_game_ids(fm: datetime, to: datetime) -> set:
+    Returns:
+        True if the game was inserted; otherwise False.
+    """
+    try:
+        with conn.transaction():
+            if mode == "copy":
+                copy_games([game], conn)
+            else:
+                insert_game(game, conn)
+        return True
+    except Exception:
+        logger.exception("failed to insert game %s", game.get("id"))
+        return False
+
+
+async def get_scheduled_game_ids(client: httpx.AsyncClient, fm: datetime, to: datetime) -> set:
     """
     Returns a set of IDs for games that have occurred since the given datetime. Games that are still
     in progress will not be included in the set.
     """
     games = set()
-    response = httpx.get(NHL_API_URL + f"/schedule?startDate={fm.date()}&endDate={to.date()}")
+    response = await client.get(
+        NHL_API_URL + f"/schedule?startDate={fm.date()}&endDate={to.date()}")
     if response.is_success:
         json = response.json()
         for date in json["dates"]:
@@ -65,18 +272,210 @@ def get_scheduled_game_ids(fm: datetime, to: datetime) -> set:
     return games
 
 
-def insert_game(id: int, conn: psycopg.Connection):
+async def get_game_states(client: httpx.AsyncClient) -> dict[int, str] | None:
+    """
+    Returns the state of today's games, which is `Preview`, `Live` or `Final`, by game ID; or None
+    if the schedule could not be downloaded.
     """
-    Inserts the game into the database.
+    try:
+        response = await client.get(NHL_API_URL + "/schedule")
+    except httpx.HTTPError:
+        return None
+    if response.is_success:
+        return {
+            g["gamePk"]: g["status"]["abstractGameState"]
+            for date in response.json()["dates"] for g in date["games"]
+        }
+
+
+async def update_live(
+    db_conn_str: str,
+    min_interval: float = LIVE_MIN_INTERVAL,
+    max_interval: float = LIVE_MAX_INTERVAL,
+    schedule_interval: float = LIVE_SCHEDULE_INTERVAL,
+):
+    """
+    Updates the database with the events of today's games while they are in progress, until every
+    game is final. Each game in progress is followed by `follow_game`. The database is migrated to
+    the current schema first.
 
     Args:
-        game: a dictionary representing a game
-        cur: the database cursor
+        db_conn_str: the database connection string.
+        min_interval: the number of seconds between polls of a game while its feed is changing
+        max_interval: the maximum number of seconds between polls of a game
+        schedule_interval: the number of seconds between checks of the schedule for games that
+            have started
     """
-    game = get_game(id)
-    if game == None:
-        return None
+    migrate_tables(db_conn_str)
+    async with httpx.AsyncClient(timeout=NHL_API_TIMEOUT) as client:
+        conn = await asyncio.to_thread(psycopg.connect, db_conn_str)
+        lock = asyncio.Lock()
+
+        async def write(game: dict, full: bool):
+            # the games share the connection, so their transactions must not interleave
+            async with lock:
+                await asyncio.to_thread(write_live, conn, game, full)
+
+        followers = {}
+        try:
+            while True:
+                states = await get_game_states(client)
+                if states != None:
+                    for id, state in states.items():
+                        # games whose follower failed are followed again
+                        if state == "Live" and (id not in followers or followers[id].done()):
+                            if id in followers and followers[id].exception() != None:
+                                logger.error("stopped following game %s", id,
+                                    exc_info=followers[id].exception())
+                            followers[id] = asyncio.create_task(
+                                follow_game(client, id, write, min_interval, max_interval))
+                    remaining = [state for state in states.values() if state != "Final"]
+                    if len(remaining) == 0 and all(task.done() for task in followers.values()):
+                        return None
+                await asyncio.sleep(schedule_interval)
+        finally:
+            for task in followers.values():
+                task.cancel()
+            await asyncio.to_thread(conn.close)
+
+
+async def follow_game(
+    client: httpx.AsyncClient,
+    id: int,
+    write: Callable[[dict, bool], Awaitable[None]],
+    min_interval: float = LIVE_MIN_INTERVAL,
+    max_interval: float = LIVE_MAX_INTERVAL,
+):
+    """
+    Follows a game in progress until it is final. The full feed of the game is downloaded once, and
+    then only the diffs of the feed since its last timestamp are polled and applied to it. If a
+    diff cannot be applied, the full feed is downloaded again and the game is reloaded from it. The
+    polling interval is reset to `min_interval` whenever the feed changes, and doubles up to
+    `max_interval` while it does not, such as during intermissions.
+
+    Args:
+        client: the http client
+        id: the ID of the game
+        write: a coroutine function that writes a game to the database. It is given the whole game
+            and True after the full feed is downloaded, and a game with only the new or changed
+            events and False after each diff. The whole game is marked to be reloaded if the feed
+            was downloaded again.
+        min_interval: the number of seconds between polls while the feed is changing
+        max_interval: the maximum number of seconds between polls
+    """
+    interval = min_interval
+    reload = False
+    while True:
+        feed = None
+        while feed == None:
+            try:
+                response = await client.get(NHL_API_URL + f"/game/{id}/feed/live")
+                if response.is_success:
+                    feed = response.json()
+                    continue
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(interval)
+            interval = min(2 * interval, max_interval)
+
+        # a feed that is downloaded again replaces the events written from the diffs before it
+        await write({**parse_feed(feed), "reload": reload}, True)
+        interval = min_interval
+        while feed["gameData"]["status"]["abstractGameState"] != "Final":
+            await asyncio.sleep(interval)
+            try:
+                response = await client.get(
+                    NHL_API_URL + f"/game/{id}/feed/live/diffPatch",
+                    params={"startTimecode": feed["metaData"]["timeStamp"]})
+            except httpx.HTTPError:
+                response = None
+            if response == None or not response.is_success:
+                interval = min(2 * interval, max_interval)
+                continue
+
+            count = len(feed["liveData"]["plays"]["allPlays"])
+            changed = set()
+            try:
+                for patch in response.json():
+                    for operation in patch["diff"]:
+                        feed = json_patch.apply_operation(feed, operation)
+                        changed.update(changed_plays(operation))
+            except (json_patch.PatchError, KeyError, ValueError, TypeError, IndexError):
+                logger.warning(
+                    "failed to apply the diff of game %s, downloading its feed again", id,
+                    exc_info=True)
+                feed = None
+                break
+
+            plays = feed["liveData"]["plays"]["allPlays"]
+            changed.update(range(count, len(plays)))
+            if None in changed:
+                changed = range(len(plays))
+            events = [dict(plays[index]) for index in sorted(changed) if index < len(plays)]
+            if len(events) > 0:
+                await write({
+                    "id": id,
+                    "season": feed["gameData"]["game"]["season"],
+                    "events": events,
+                }, False)
+                interval = min_interval
+            else:
+                interval = min(2 * interval, max_interval)
 
+        if feed != None:
+            return None
+        reload = True
+
+
+def changed_plays(operation: dict) -> set[int | None]:
+    """
+    Returns the indexes in `allPlays` of the existing plays changed by a patch operation of a live
+    feed. The set contains None if the operation changes the whole list of plays.
+    """
+    plays = set()
+    for path in (operation.get("path"), operation.get("from")):
+        if path == None:
+            continue
+        if path.startswith(LIVE_PLAYS_PATH):
+            index = path[len(LIVE_PLAYS_PATH):].split("/")[0]
+            if index.isdigit():
+                plays.add(int(index))
+        elif LIVE_PLAYS_PATH.startswith(path + "/"):
+            plays.add(None)
+    return plays
+
+
+def write_live(conn: psycopg.Connection, game: dict, full: bool):
+    """
+    Writes a game in progress to the database in a single transaction. The game is marked to be
+    reloaded by the next update, which deletes the plays that were removed from its feed.
+
+    Args:
+        conn: the database connection
+        game: a dictionary representing a game, or only its ID, season and new and changed events
+            if not `full`
+        full: whether the game contains its whole feed
+    """
+    with conn.transaction():
+        if full:
+            insert_game(game, conn)
+        else:
+            with conn.cursor() as cur:
+                insert_events(game, cur)
+        ingest_state.set_live(conn, game)
+    logger.info("wrote %d events of game %s", len(game["events"]), game["id"])
+
+
+def insert_game(game: dict, conn: psycopg.Connection):
+    """
+    Inserts the game into the database, along with its players and teams. If the game is marked to
+    be reloaded, its changed events are updated and the events that are no longer in its feed are
+    deleted.
+
+    Args:
+        game: a dictionary representing a game
+        conn: the database connection
+    """
     cur = conn.execute("""
         INSERT INTO arena (name) VALUES (%s)
         ON CONFLICT (name) DO NOTHING
@@ -88,7 +487,16 @@ def insert_game(id: int, conn: psycopg.Connection):
         (id, home_team_id, away_team_id, arena_id, type, season, datetime)
         VALUES (%s, %s, %s, %s, %s, %s, %s)
         ON CONFLICT (id)
-        DO NOTHING;
+        DO UPDATE SET
+            home_team_id = excluded.home_team_id,
+            away_team_id = excluded.away_team_id,
+            arena_id = excluded.arena_id,
+            type = excluded.type,
+            season = excluded.season,
+            datetime = excluded.datetime
+        WHERE (game.home_team_id, game.away_team_id, game.arena_id, game.type, game.season,
+            game.datetime) IS DISTINCT FROM (excluded.home_team_id, excluded.away_team_id,
+            excluded.arena_id, excluded.type, excluded.season, excluded.datetime);
         """, [
         game["id"],
         game["home_team_id"],
@@ -98,100 +506,250 @@ def insert_game(id: int, conn: psycopg.Connection):
         game["season"],
         game["datetime"]
     ])
-    insert_events(game, cur)
+    upsert_dimensions([game], cur)
+    insert_events(game, cur, prune=game.get("reload", False))
 
 
-def get_game(id: int) -> dict | None:
+async def get_game(client: httpx.AsyncClient, id: int, state: dict | None = None
+        ) -> dict | str | None:
     """
     Returns the game data for a given game ID.
+
+    Args:
+        client: the http client
+        id: the ID of the game
+        state: the `etag`, `last_modified` and `content_hash` of the feed of the game when it was
+            last loaded
+
+    Returns:
+        The game data; `UNCHANGED` if the feed of the game has not changed since it was last
+        loaded; or None if the game could not be downloaded or its feed could not be parsed.
     """
-    response = httpx.get(NHL_API_URL + f"/game/{id}/feed/live")
+    headers = {}
+    if state != None and state.get("etag") != None:
+        headers["if-none-match"] = state["etag"]
+    if state != None and state.get("last_modified") != None:
+        headers["if-modified-since"] = state["last_modified"]
+
+    try:
+        response = await client.get(NHL_API_URL + f"/game/{id}/feed/live", headers=headers)
+    except httpx.HTTPError:
+        return None
+    if response.status_code == 304:
+        return UNCHANGED
+
     if response.is_success:
-        json = response.json()
-        return {
-            "id": json["gamePk"],
-            "home_team_id": json["gameData"]["teams"]["home"]["id"],
-            "away_team_id": json["gameData"]["teams"]["away"]["id"],
-            "arena": json["gameData"]["venue"]["name"],
-            "type": json["gameData"]["game"]["type"],
-            "season": json["gameData"]["game"]["season"],
-            "datetime": json["gameData"]["datetime"]["dateTime"],
-            "events": json["liveData"]["plays"]["allPlays"]
-        }
+        # the feed is only parsed if it has changed
+        hash = hashlib.sha256(response.content).hexdigest()
+        if state != None and state.get("content_hash") == hash:
+            return UNCHANGED
+
+        try:
+            game = parse_feed(response.json())
+        except (KeyError, ValueError, TypeError):
+            logger.exception("failed to parse the feed of game %s", id)
+            return None
+        game["hash"] = hash
+        game["etag"] = response.headers.get("etag")
+        game["last_modified"] = response.headers.get("last-modified")
+        return game
+
+
+def parse_feed(json: dict) -> dict:
+    """
+    Returns the game data of a game's live feed.
+    """
+    return {
+        "id": json["gamePk"],
+        "home_team_id": json["gameData"]["teams"]["home"]["id"],
+        "away_team_id": json["gameData"]["teams"]["away"]["id"],
+        "arena": json["gameData"]["venue"]["name"],
+        "type": json["gameData"]["game"]["type"],
+        "season": json["gameData"]["game"]["season"],
+        "datetime": json["gameData"]["datetime"]["dateTime"],
+        "players": list((json["gameData"].get("players") or {}).values()),
+        "teams": [json["gameData"]["teams"]["home"], json["gameData"]["teams"]["away"]],
+        "events": json["liveData"]["plays"]["allPlays"]
+    }
 
 
-def insert_events(game: dict, cur: psycopg.Cursor):
+def insert_events(game: dict, cur: psycopg.Cursor, prune: bool = False):
     """
-    Inserts the events of a game into the database.
+    Inserts the events of a game into the database. The periods, events and involved players of the
+    game are each inserted with a single statement. Events that already exist are only updated if
+    they have changed. The player events of the events are replaced.
 
     Args:
         game: a dictionary representing a game
         cur: the database cursor
+        prune: whether to delete the events and involved players of the game that are not in
+            `game`, such as plays that have been removed from its feed
     """
-    for event in game["events"]:
-        cur.execute("""
-            INSERT INTO period (number, type) VALUES (%s, %s)
-            ON CONFLICT (number, type) DO NOTHING
-            """, [
-            event["about"]["period"],
-            event["about"]["periodType"]])
-        period_id = cur.execute("""
-            SELECT id FROM period WHERE number = %s AND type = %s
-            """, [
-            event["about"]["period"],
-            event["about"]["periodType"]]).fetchone()[0]
-
-        cur.execute("""
-            INSERT INTO event
-            (index, game_id, type, x, y, period_id, period_time, datetime)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            ON CONFLICT (index, game_id) DO NOTHING
-            """, [
-            event["about"]["eventIdx"],
-            game["id"],
-            event["result"]["eventTypeId"],
-            event["coordinates"].get("x"),
-            event["coordinates"].get("y"),
-            period_id,
-            "00:" + event["about"]["periodTime"],
-            event["about"]["dateTime"]])
-
-        event["id"] = cur.execute("""
-            SELECT id FROM event WHERE game_id = %s AND index = %s
-            """, [
-            game["id"],
-            event["about"]["eventIdx"]]).fetchone()[0]
-
-        insert_involved_players(event, cur)
-
-
-def insert_involved_players(event: dict, cur: psycopg.Cursor):
-    """
-    Inserts the palyers involved in an event into the database.
+    events = game["events"]
+    if prune:
+        prune_events(game, cur)
+    if len(events) == 0:
+        return None
+
+    create_partitions(cur, [game["season"]])
+    period_ids = insert_periods(events, cur)
+
+    cur.execute("""
+        INSERT INTO event
+        (index, game_id, season, type, x, y, period_id, period_time, datetime)
+        SELECT index, %s, %s::integer, type, x, y, period_id, period_time, datetime
+        FROM unnest(
+            %s::integer[], %s::text[], %s::integer[], %s::integer[],
+            %s::integer[], %s::interval[], %s::timestamptz[])
+        AS e (index, type, x, y, period_id, period_time, datetime)
+        ON CONFLICT ON CONSTRAINT event_game_id_index_key
+        DO UPDATE SET
+            type = excluded.type,
+            x = excluded.x,
+            y = excluded.y,
+            period_id = excluded.period_id,
+            period_time = excluded.period_time,
+            datetime = excluded.datetime
+        WHERE (event.type, event.x, event.y, event.period_id, event.period_time, event.datetime)
+            IS DISTINCT FROM (excluded.type, excluded.x, excluded.y, excluded.period_id,
+            excluded.period_time, excluded.datetime)
+        """, [
+        game["id"],
+        game["season"],
+        [event["about"]["eventIdx"] for event in events],
+        [event["result"]["eventTypeId"] for event in events],
+        [event["coordinates"].get("x") for event in events],
+        [event["coordinates"].get("y") for event in events],
+        [period_ids[(event["about"]["period"], event["about"]["periodType"])] for event in events],
+        ["00:" + event["about"]["periodTime"] for event in events],
+        [event["about"]["dateTime"] for event in events]])
+
+    event_ids = dict(cur.execute("""
+        SELECT index, id FROM event WHERE game_id = %s AND season = %s
+        """, [game["id"], game["season"]]).fetchall())
+    for event in events:
+        event["id"] = event_ids[event["about"]["eventIdx"]]
+
+    insert_involved_players(events, game["season"], cur)
+    refresh_player_events(
+        cur, game["id"], game["season"], [event["about"]["eventIdx"] for event in events])
+
+
+def insert_periods(events: list[dict], cur: psycopg.Cursor) -> dict:
+    """
+    Inserts the periods of a list of events into the database.
+
+    Args:
+        events: a list of dictionaries representing events
+        cur: the database cursor
+
+    Returns:
+        A dictionary that maps the (number, type) of each period to its ID.
+    """
+    periods = {(event["about"]["period"], event["about"]["periodType"]) for event in events}
+    numbers = [number for number, _ in periods]
+    types = [type for _, type in periods]
+
+    cur.execute("""
+        INSERT INTO period (number, type)
+        SELECT * FROM unnest(%s::integer[], %s::text[])
+        ON CONFLICT (number, type) DO NOTHING
+        """, [numbers, types])
+    rows = cur.execute("""
+        SELECT id, number, type FROM period
+        WHERE (number, type) IN (SELECT * FROM unnest(%s::integer[], %s::text[]))
+        """, [numbers, types]).fetchall()
+    return {(number, type): id for id, number, type in rows}
+
+
+def insert_involved_players(events: list[dict], season: int | str, cur: psycopg.Cursor):
+    """
+    Inserts the players involved in a list of events into the database. A player that is listed
+    more than once in an event is inserted with the last of their types.
 
     Args:
-        event: a dictionary representing an event
+        events: a list of dictionaries representing events that have been inserted
+        season: the season of the game of the events
         cur: the database cursor
     """
-    players_involved = event.get("players")
-    if players_involved == None:
+    # a row cannot be updated twice by the same statement, so duplicates are removed beforehand
+    players = {
+        (event["id"], player["player"]["id"]): player["playerType"]
+        for event in events for player in event.get("players") or []
+    }
+    if len(players) == 0:
         return None
 
-    for player in players_involved:
-        cur.execute("""
-            INSERT INTO involved_player (event_id, player_id, type)
-            VALUES (%s, %s, %s)
-            ON CONFLICT (event_id, player_id) DO NOTHING
-            """, [
-            event["id"],
-            player["player"]["id"],
-            player["playerType"]])
+    event_ids, player_ids = zip(*players)
+    types = players.values()
+    cur.execute("""
+        INSERT INTO involved_player (event_id, player_id, season, type)
+        SELECT event_id, player_id, %s::integer, type
+        FROM unnest(%s::integer[], %s::integer[], %s::text[]) AS p (event_id, player_id, type)
+        ON CONFLICT ON CONSTRAINT involved_player_pkey
+        DO UPDATE SET type = excluded.type
+        WHERE involved_player.type IS DISTINCT FROM excluded.type
+        """, [season, list(event_ids), list(player_ids), list(types)])
+
+
+def prune_events(game: dict, cur: psycopg.Cursor):
+    """
+    Deletes the events, involved players and player events of a game that are no longer in its
+    feed.
+
+    Args:
+        game: a dictionary representing a game
+        cur: the database cursor
+    """
+    indexes = [event["about"]["eventIdx"] for event in game["events"]]
+    players = [
+        (event["about"]["eventIdx"], player["player"]["id"])
+        for event in game["events"] for player in event.get("players") or []
+    ]
+    cur.execute("""
+        DELETE FROM involved_player
+        USING event
+        WHERE event.id = involved_player.event_id AND event.season = involved_player.season
+        AND event.game_id = %s AND event.season = %s
+        AND (event.index, involved_player.player_id) NOT IN (
+            SELECT * FROM unnest(%s::integer[], %s::integer[]))
+        """, [
+        game["id"],
+        game["season"],
+        [index for index, _ in players],
+        [id for _, id in players]])
+    cur.execute("""
+        DELETE FROM event
+        WHERE game_id = %s AND season = %s AND NOT (index = ANY(%s))
+        """, [game["id"], game["season"], indexes])
+    delete_player_events(cur, game["id"], game["season"], indexes, keep=True)
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Updates the hockey database.")
+    parser.add_argument("--mode", choices=["incremental", "copy", "live"], default="incremental",
+        help="insert games one at a time, bulk load batches of games for backfills, or follow "
+            "today's games while they are in progress")
+    parser.add_argument("--from", dest="fm", type=datetime.fromisoformat,
+        help="the start date; defaults to the datetime of the most recent game")
+    parser.add_argument("--to", type=datetime.fromisoformat,
+        help="the end date; defaults to now")
+    parser.add_argument("--batch-size", type=int, default=50,
+        help="the number of games committed in each transaction")
+    parser.add_argument("--concurrency", type=int, default=8,
+        help="the maximum number of game feeds downloaded at the same time")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
     conn_str = f"dbname={DB_NAME} user={DB_USER}"
-    last_updated = most_recent_datetime(conn_str)
+    if args.mode == "live":
+        asyncio.run(update_live(conn_str))
+        raise SystemExit()
+
     now = datetime.utcnow()
+    last_updated = args.fm or most_recent_datetime(conn_str)
     if last_updated == None:
         last_updated = now - timedelta(days=1)
-    update(conn_str, last_updated, now)
+    asyncio.run(update(
+        conn_str, last_updated, args.to or now, mode=args.mode, batch_size=args.batch_size,
+        concurrency=args.concurrency))
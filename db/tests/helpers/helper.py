@@ -0,0 +1,86 @@
+"""
+This module contains data and functions that can be used to help test the project.
+"""
+
+
+def make_event(index: int, type: str, period: int, players: list | None = None) -> dict:
+    """
+    Creates an event in the format of the NHL API's live feed.
+    """
+    event = {
+        "result": {"eventTypeId": type},
+        "about": {
+            "eventIdx": index,
+            "period": period,
+            "periodType": "REGULAR",
+            "periodTime": "01:30",
+            "dateTime": "2022-01-01T00:00:00Z",
+        },
+        "coordinates": {"x": 50.0, "y": -10.0} if players else {},
+    }
+    if players:
+        event["players"] = [
+            {"player": {"id": id}, "playerType": player_type} for id, player_type in players
+        ]
+    return event
+
+
+def make_player(id: int, first_name: str, last_name: str, team_id: int) -> dict:
+    """
+    Creates a player in the format of the NHL API's live feed.
+    """
+    return {
+        "id": id,
+        "fullName": f"{first_name} {last_name}",
+        "firstName": first_name,
+        "lastName": last_name,
+        "active": True,
+        "currentTeam": {"id": team_id},
+        "primaryPosition": {"code": "C", "abbreviation": "C"},
+    }
+
+
+def make_game(id: int = 2021020001) -> dict:
+    """
+    Creates a game in the format returned by `update_service.get_game`.
+    """
+    return {
+        "id": id,
+        "home_team_id": 1,
+        "away_team_id": 2,
+        "arena": "rink",
+        "type": "R",
+        "season": "20212022",
+        "datetime": "2022-01-01T00:00:00Z",
+        "players": [
+            make_player(8471675, "Sidney", "Crosby", 1),
+            make_player(8471215, "Evgeni", "Malkin", 1),
+            make_player(8470594, "Marc-Andre", "Fleury", 2),
+        ],
+        "teams": [
+            {"id": 1, "name": "Pittsburgh Penguins", "abbreviation": "PIT", "active": True},
+            {"id": 2, "name": "Chicago Blackhawks", "abbreviation": "CHI", "active": True},
+        ],
+        "events": [
+            make_event(0, "GAME_SCHEDULED", 1),
+            make_event(1, "SHOT", 1, [(8471675, "Shooter"), (8470594, "Goalie")]),
+            make_event(2, "GOAL", 2, [(8471675, "Scorer"), (8471215, "Assist"), (8470594, "Goalie")]),
+        ],
+    }
+
+
+def make_feed(game: dict) -> dict:
+    """
+    Creates the NHL API's live feed of a game created by `make_game`.
+    """
+    return {
+        "gamePk": game["id"],
+        "gameData": {
+            "teams": {"home": game["teams"][0], "away": game["teams"][1]},
+            "players": {f"ID{player['id']}": player for player in game["players"]},
+            "venue": {"name": game["arena"]},
+            "game": {"type": game["type"], "season": game["season"]},
+            "datetime": {"dateTime": game["datetime"]},
+        },
+        "liveData": {"plays": {"allPlays": game["events"]}},
+    }
@@ -0,0 +1,106 @@
+"""
+The tests for the Hockey DB bulk loader.
+
+PREREQUISITES:
+    - postgres database with the name `test` must exist and is active.
+    - `hockey_db.init` passes its tests.
+"""
+
+import psycopg
+import pytest
+from hockey_db import bulk_load
+from hockey_db.create_tables import create_tables
+from tests.helpers.helper import make_game
+
+DB_NAME = "test"
+DB_USER = "postgres"
+CONN_STR = f"dbname={DB_NAME} user={DB_USER}"
+
+
+@pytest.fixture(autouse=True, params=[False, True], ids=["unpartitioned", "partitioned"])
+def setup(request):
+    create_tables(CONN_STR, partitioned=request.param)
+    yield
+    with psycopg.connect(CONN_STR) as conn:
+        with conn.cursor() as cur:
+            cur.execute("DROP TABLE IF EXISTS arena CASCADE"
+                ).execute("DROP TABLE IF EXISTS game CASCADE"
+                ).execute("DROP TABLE IF EXISTS event CASCADE"
+                ).execute("DROP TABLE IF EXISTS period CASCADE"
+                ).execute("DROP TABLE IF EXISTS involved_player CASCADE"
+                ).execute("DROP TABLE IF EXISTS ingest_state CASCADE"
+                ).execute("DROP TABLE IF EXISTS player_event CASCADE"
+                ).execute("DROP TABLE IF EXISTS player CASCADE"
+                ).execute("DROP TABLE IF EXISTS team CASCADE")
+
+
+def test_copy_games():
+    games = [make_game(2021020001), make_game(2021020002)]
+    with psycopg.connect(CONN_STR) as conn:
+        bulk_load.copy_games(games, conn)
+        bulk_load.copy_games(games, conn)
+
+        with conn.cursor() as cur:
+            arenas = cur.execute("SELECT name FROM arena").fetchall()
+            game_ids = cur.execute("SELECT id FROM game ORDER BY id").fetchall()
+            events = cur.execute("""
+                SELECT game_id, index, type, x, y FROM event ORDER BY game_id, index
+                """).fetchall()
+            periods = cur.execute("SELECT number, type FROM period ORDER BY number").fetchall()
+            involved_players = cur.execute("""
+                SELECT event.index, player_id, involved_player.type
+                FROM involved_player JOIN event ON event.id = involved_player.event_id
+                WHERE event.game_id = 2021020002
+                ORDER BY event.index, player_id
+                """).fetchall()
+            player_events = cur.execute("""
+                SELECT game_id, count(*) FROM player_event GROUP BY game_id ORDER BY game_id
+                """).fetchall()
+            players = cur.execute("SELECT id, team_id FROM player ORDER BY id").fetchall()
+            teams = cur.execute("SELECT id, abbreviation FROM team ORDER BY id").fetchall()
+
+    assert arenas == [("rink",)]
+    assert game_ids == [(2021020001,), (2021020002,)]
+    assert events == [
+        (2021020001, 0, "GAME_SCHEDULED", None, None),
+        (2021020001, 1, "SHOT", 50, -10),
+        (2021020001, 2, "GOAL", 50, -10),
+        (2021020002, 0, "GAME_SCHEDULED", None, None),
+        (2021020002, 1, "SHOT", 50, -10),
+        (2021020002, 2, "GOAL", 50, -10),
+    ]
+    assert periods == [(1, "REGULAR"), (2, "REGULAR")]
+    assert involved_players == [
+        (1, 8470594, "Goalie"),
+        (1, 8471675, "Shooter"),
+        (2, 8470594, "Goalie"),
+        (2, 8471215, "Assist"),
+        (2, 8471675, "Scorer"),
+    ]
+    assert player_events == [(2021020001, 5), (2021020002, 5)]
+    assert players == [(8470594, 2), (8471215, 1), (8471675, 1)]
+    assert teams == [(1, "PIT"), (2, "CHI")]
+
+
+def test_copy_games_empty():
+    with psycopg.connect(CONN_STR) as conn:
+        bulk_load.copy_games([], conn)
+        assert conn.execute("SELECT count(*) FROM event").fetchone()[0] == 0
+
+
+def test_copy_games_duplicate_player():
+    game = make_game()
+    game["events"][1]["players"].append({"player": {"id": 8471675}, "playerType": "Scorer"})
+    with psycopg.connect(CONN_STR) as conn:
+        bulk_load.copy_games([game], conn)
+        involved_players = conn.execute("""
+            SELECT player_id, involved_player.type
+            FROM involved_player JOIN event ON event.id = involved_player.event_id
+            WHERE event.index = 1 ORDER BY player_id
+            """).fetchall()
+        player_events = conn.execute("""
+            SELECT player_id, player_type FROM player_event WHERE index = 1 ORDER BY player_id
+            """).fetchall()
+
+    assert involved_players == [(8470594, "Goalie"), (8471675, "Scorer")]
+    assert player_events == involved_players
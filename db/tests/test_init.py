@@ -7,7 +7,7 @@ is active.
 
 import pytest
 import psycopg
-from hockey_db.create_tables import create_tables
+from hockey_db.create_tables import create_partitions, create_tables
 
 DB_NAME = "test"
 DB_USER = "postgres"
@@ -43,21 +43,61 @@ def drop_tables():
                 ).execute("DROP TABLE IF EXISTS game CASCADE"
                 ).execute("DROP TABLE IF EXISTS event CASCADE"
                 ).execute("DROP TABLE IF EXISTS period CASCADE"
-                ).execute("DROP TABLE IF EXISTS involved_player CASCADE")
+                ).execute("DROP TABLE IF EXISTS involved_player CASCADE"
+                ).execute("DROP TABLE IF EXISTS ingest_state CASCADE"
+                ).execute("DROP TABLE IF EXISTS player_event CASCADE"
+                ).execute("DROP TABLE IF EXISTS player CASCADE"
+                ).execute("DROP TABLE IF EXISTS team CASCADE")
 
 
 def test_create_tables_none_exist(db):
     create_tables(CONN_STR)
-    assert db.get_tables() == {("arena",), ("game",), ("event",), ("period",), ("involved_player",)}
+    assert db.get_tables() == {
+        ("arena",), ("game",), ("event",), ("period",), ("involved_player",),
+        ("player_event",), ("team",), ("player",), ("ingest_state",)}
 
 def test_create_tables_some_exist(db):
     with psycopg.connect(CONN_STR) as conn:
         with conn.cursor() as cur:
             cur.execute("CREATE TABLE game(id INTEGER PRIMARY KEY)")
     create_tables(CONN_STR)
-    assert db.get_tables() == {("arena",), ("game",), ("event",), ("period",), ("involved_player",)}
+    assert db.get_tables() == {
+        ("arena",), ("game",), ("event",), ("period",), ("involved_player",),
+        ("player_event",), ("team",), ("player",), ("ingest_state",)}
 
 def test_create_tables_all_exist(db):
     create_tables(CONN_STR)
     create_tables(CONN_STR)
-    assert db.get_tables() == {("arena",), ("game",), ("event",), ("period",), ("involved_player",)}
+    assert db.get_tables() == {
+        ("arena",), ("game",), ("event",), ("period",), ("involved_player",),
+        ("player_event",), ("team",), ("player",), ("ingest_state",)}
+
+def test_create_tables_partitioned(db):
+    create_tables(CONN_STR, partitioned=True)
+    assert db.get_tables() == {
+        ("arena",), ("game",), ("event",), ("period",), ("involved_player",),
+        ("player_event",), ("team",), ("player",), ("ingest_state",)}
+    with psycopg.connect(CONN_STR) as conn:
+        partitioned = conn.execute("""
+            SELECT partrelid::regclass::text FROM pg_partitioned_table ORDER BY 1
+            """).fetchall()
+    assert partitioned == [("event",), ("involved_player",), ("player_event",)]
+
+def test_create_partitions(db):
+    create_tables(CONN_STR, partitioned=True)
+    with psycopg.connect(CONN_STR) as conn:
+        with conn.cursor() as cur:
+            create_partitions(cur, ["20212022", 20212022, 20202021])
+            create_partitions(cur, [20212022])
+    assert db.get_tables() >= {
+        ("event_20202021",), ("event_20212022",),
+        ("involved_player_20202021",), ("involved_player_20212022",)}
+
+def test_create_partitions_unpartitioned(db):
+    create_tables(CONN_STR)
+    with psycopg.connect(CONN_STR) as conn:
+        with conn.cursor() as cur:
+            create_partitions(cur, [20212022])
+    assert db.get_tables() == {
+        ("arena",), ("game",), ("event",), ("period",), ("involved_player",),
+        ("player_event",), ("team",), ("player",), ("ingest_state",)}
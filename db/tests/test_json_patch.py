@@ -0,0 +1,42 @@
+"""
+The tests for the Hockey DB JSON patches.
+"""
+
+import pytest
+from hockey_db.json_patch import apply_patch, PatchError
+
+
+def test_apply_patch():
+    document = {"plays": [{"id": 0}, {"id": 1}], "status": "Live", "a/b": 1}
+    document = apply_patch(document, [
+        {"op": "add", "path": "/plays/-", "value": {"id": 3}},
+        {"op": "add", "path": "/plays/2", "value": {"id": 2}},
+        {"op": "replace", "path": "/plays/0/id", "value": 10},
+        {"op": "remove", "path": "/plays/1"},
+        {"op": "copy", "from": "/status", "path": "/previous"},
+        {"op": "replace", "path": "/status", "value": "Final"},
+        {"op": "move", "from": "/a~1b", "path": "/c"},
+        {"op": "test", "path": "/c", "value": 1},
+    ])
+    assert document == {
+        "plays": [{"id": 10}, {"id": 2}, {"id": 3}],
+        "status": "Final",
+        "previous": "Live",
+        "c": 1,
+    }
+
+
+def test_apply_patch_root():
+    assert apply_patch({"a": 1}, [{"op": "replace", "path": "", "value": [1]}]) == [1]
+
+
+@pytest.mark.parametrize("operation", [
+    {"op": "remove", "path": "/missing"},
+    {"op": "replace", "path": "/plays/5", "value": 1},
+    {"op": "add", "path": "/plays/5", "value": 1},
+    {"op": "test", "path": "/status", "value": "Final"},
+    {"op": "unknown", "path": "/status"},
+])
+def test_apply_patch_invalid(operation):
+    with pytest.raises(PatchError):
+        apply_patch({"plays": [], "status": "Live"}, [operation])
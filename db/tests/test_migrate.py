@@ -0,0 +1,189 @@
+"""
+The tests for the Hockey DB migrations.
+
+PREREQUISITES:
+    - postgres database with the name `test` must exist and is active.
+"""
+
+from datetime import datetime, timezone
+import psycopg
+import pytest
+from hockey_db import update_service
+from hockey_db.migrate import migrate_tables
+from tests.helpers.helper import make_game
+
+DB_NAME = "test"
+DB_USER = "postgres"
+CONN_STR = f"dbname={DB_NAME} user={DB_USER}"
+
+
+@pytest.fixture(autouse=True)
+def setup():
+    """
+    Creates the event and involved_player tables as they were before the season was denormalized,
+    with two games of different seasons.
+    """
+    with psycopg.connect(CONN_STR) as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                CREATE TABLE arena (
+                    id INTEGER GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+                    name TEXT NOT NULL UNIQUE
+                )""")
+            cur.execute("""
+                CREATE TABLE game (
+                    id INTEGER PRIMARY KEY,
+                    home_team_id INTEGER NOT NULL,
+                    away_team_id INTEGER NOT NULL,
+                    arena_id INTEGER NOT NULL REFERENCES arena(id),
+                    type TEXT NOT NULL,
+                    season INTEGER NOT NULL,
+                    datetime TIMESTAMPTZ NOT NULL
+                )""")
+            cur.execute("""
+                CREATE TABLE period (
+                    id INTEGER GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+                    number INTEGER NOT NULL,
+                    type TEXT NOT NULL,
+                    UNIQUE (number, type)
+                )""")
+            cur.execute("""
+                CREATE TABLE event (
+                    id INTEGER GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+                    index INTEGER,
+                    game_id INTEGER REFERENCES game(id),
+                    type TEXT NOT NULL,
+                    x INTEGER,
+                    y INTEGER,
+                    period_id INTEGER NOT NULL REFERENCES period(id),
+                    period_time INTERVAL NOT NULL,
+                    datetime TIMESTAMPTZ NOT NULL,
+                    UNIQUE (game_id, index)
+                )""")
+            cur.execute("""
+                CREATE TABLE involved_player (
+                    event_id INTEGER REFERENCES event(id),
+                    player_id INTEGER,
+                    type TEXT,
+                    PRIMARY KEY (event_id, player_id)
+                )""")
+            cur.execute("INSERT INTO arena (name) VALUES ('rink')")
+            cur.execute("INSERT INTO period (number, type) VALUES (1, 'REGULAR')")
+            cur.execute("""
+                INSERT INTO game VALUES
+                (1, 1, 2, 1, 'R', 20202021, now()),
+                (2, 1, 2, 1, 'R', 20212022, now())
+                """)
+            cur.execute("""
+                INSERT INTO event (index, game_id, type, period_id, period_time, datetime)
+                SELECT e, g, 'SHOT', 1, '0', now()
+                FROM generate_series(1, 2) AS g, generate_series(0, 2) AS e
+                """)
+            cur.execute("INSERT INTO involved_player SELECT id, 8471675, 'Shooter' FROM event")
+    yield
+    with psycopg.connect(CONN_STR) as conn:
+        with conn.cursor() as cur:
+            cur.execute("DROP TABLE IF EXISTS arena CASCADE"
+                ).execute("DROP TABLE IF EXISTS game CASCADE"
+                ).execute("DROP TABLE IF EXISTS event CASCADE"
+                ).execute("DROP TABLE IF EXISTS period CASCADE"
+                ).execute("DROP TABLE IF EXISTS involved_player CASCADE"
+                ).execute("DROP TABLE IF EXISTS ingest_state CASCADE"
+                ).execute("DROP TABLE IF EXISTS player_event CASCADE"
+                ).execute("DROP TABLE IF EXISTS player CASCADE"
+                ).execute("DROP TABLE IF EXISTS team CASCADE")
+
+
+@pytest.mark.parametrize("partitioned", [False, True])
+def test_migrate_tables(partitioned):
+    migrate_tables(CONN_STR, partitioned=partitioned)
+    migrate_tables(CONN_STR, partitioned=partitioned)
+
+    with psycopg.connect(CONN_STR) as conn:
+        events = conn.execute("""
+            SELECT event.id, event.season, game.season FROM event
+            JOIN game ON game.id = event.game_id ORDER BY event.id
+            """).fetchall()
+        players = conn.execute("""
+            SELECT involved_player.season, event.season FROM involved_player
+            JOIN event ON event.id = involved_player.event_id
+            """).fetchall()
+        partitions = conn.execute("""
+            SELECT relname FROM pg_inherits
+            JOIN pg_class ON pg_class.oid = pg_inherits.inhrelid
+            WHERE relkind = 'r' ORDER BY 1
+            """).fetchall()
+        player_events = conn.execute("SELECT count(*) FROM player_event").fetchone()[0]
+        tables = conn.execute("""
+            SELECT tablename FROM pg_tables WHERE schemaname = 'public' ORDER BY 1
+            """).fetchall()
+        new_id = conn.execute("""
+            INSERT INTO event (index, game_id, season, type, period_id, period_time, datetime)
+            VALUES (3, 1, 20202021, 'GOAL', 1, '0', now())
+            RETURNING id
+            """).fetchone()[0]
+
+    assert [id for id, _, _ in events] == [1, 2, 3, 4, 5, 6]
+    assert all(event_season == game_season for _, event_season, game_season in events)
+    assert len(players) == 6
+    assert player_events == 6
+    assert all(player_season == event_season for player_season, event_season in players)
+    assert new_id == 7
+    assert ("ingest_state",) in tables
+    if partitioned:
+        assert partitions == [
+            ("event_20202021",), ("event_20212022",),
+            ("involved_player_20202021",), ("involved_player_20212022",),
+            ("player_event_20202021",), ("player_event_20212022",)]
+        assert not any(table.endswith("_unpartitioned") for table, in tables)
+    else:
+        assert partitions == []
+
+
+def test_migrate_tables_drops_unused_indexes():
+    with psycopg.connect(CONN_STR) as conn:
+        conn.execute("CREATE INDEX involved_player_player_idx ON involved_player (player_id)")
+        conn.execute("CREATE INDEX event_game_type_idx ON event (game_id, type)")
+    migrate_tables(CONN_STR)
+
+    with psycopg.connect(CONN_STR) as conn:
+        indexes = conn.execute("""
+            SELECT indexname FROM pg_indexes
+            WHERE indexname IN ('involved_player_player_idx', 'event_game_type_idx')
+            """).fetchall()
+    assert indexes == []
+
+
+def test_migrate_tables_keeps_partitioning():
+    migrate_tables(CONN_STR, partitioned=True)
+    migrate_tables(CONN_STR)
+
+    with psycopg.connect(CONN_STR) as conn:
+        partitioned = conn.execute("""
+            SELECT EXISTS (SELECT FROM pg_partitioned_table WHERE partrelid = 'event'::regclass)
+            """).fetchone()[0]
+    assert partitioned
+
+
+@pytest.mark.asyncio
+async def test_update_migrates(monkeypatch):
+    async def get_scheduled_game_ids(client, fm, to):
+        return {2021020001}
+
+    async def get_game(client, id, state=None):
+        return make_game(id)
+
+    monkeypatch.setattr(update_service, "get_scheduled_game_ids", get_scheduled_game_ids)
+    monkeypatch.setattr(update_service, "get_game", get_game)
+
+    date = datetime(2022, 1, 1, tzinfo=timezone.utc)
+    await update_service.update(CONN_STR, date, date)
+    with psycopg.connect(CONN_STR) as conn:
+        events = conn.execute("SELECT count(*) FROM event WHERE season IS NULL").fetchone()[0]
+        player_events = conn.execute("""
+            SELECT count(*) FROM player_event WHERE game_id = 2021020001
+            """).fetchone()[0]
+        state = conn.execute("SELECT status FROM ingest_state").fetchall()
+    assert events == 0
+    assert player_events == 5
+    assert state == [("loaded",)]
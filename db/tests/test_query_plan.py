@@ -0,0 +1,116 @@
+"""
+The tests for the query plans of the API's queries against the Hockey DB.
+
+These tests require that there is a pre-existing postgres database named "test", and that postgresql
+is active.
+"""
+
+import pytest
+import psycopg
+from hockey_db.create_tables import create_partitions, create_tables
+from hockey_db.player_event import populate_player_events
+
+DB_NAME = "test"
+DB_USER = "postgres"
+CONN_STR = f"dbname={DB_NAME} user={DB_USER}"
+
+# The player events query of the API (nhlapi.clients.database.get_player_events), which must be
+# kept in sync with it
+PLAYER_EVENTS_QUERY = """
+    SELECT
+    game_id,
+    index,
+    event_type AS type,
+    x,
+    y,
+    period_number,
+    period_type,
+    period_time,
+    datetime
+    FROM player_event
+    WHERE player_id = %(player_id)s
+    AND season = %(season)s
+    AND event_type = %(event_type)s
+    AND player_type = %(player_type)s
+    """
+
+
+@pytest.fixture(autouse=True, params=[False, True], ids=["unpartitioned", "partitioned"])
+def seed(request):
+    """
+    Creates the tables and seeds them with two seasons of games, each with 300 events involving a
+    shooter and a goalie.
+    """
+    create_tables(CONN_STR, partitioned=request.param)
+    with psycopg.connect(CONN_STR) as conn:
+        with conn.cursor() as cur:
+            cur.execute("INSERT INTO arena (name) VALUES ('rink')")
+            cur.execute("INSERT INTO period (number, type) VALUES (1, 'REGULAR')")
+            cur.execute("""
+                INSERT INTO game (id, home_team_id, away_team_id, arena_id, type, season, datetime)
+                SELECT g, 1, 2, 1, 'R', CASE WHEN g <= 100 THEN 20202021 ELSE 20212022 END, now()
+                FROM generate_series(1, 200) AS g
+                """)
+            create_partitions(cur, [20202021, 20212022])
+            cur.execute("""
+                INSERT INTO event
+                (index, game_id, season, type, x, y, period_id, period_time, datetime)
+                SELECT e, g, CASE WHEN g <= 100 THEN 20202021 ELSE 20212022 END,
+                CASE WHEN e % 3 = 0 THEN 'SHOT' ELSE 'FACEOFF' END, 0, 0, 1, '0', now()
+                FROM generate_series(1, 200) AS g, generate_series(1, 300) AS e
+                """)
+            cur.execute("""
+                INSERT INTO involved_player (event_id, player_id, season, type)
+                SELECT id, id % 800, season, 'Shooter' FROM event
+                UNION ALL
+                SELECT id, 800 + id % 40, season, 'Goalie' FROM event
+                """)
+            populate_player_events(cur)
+            cur.execute("ANALYZE")
+    yield
+    with psycopg.connect(CONN_STR) as conn:
+        with conn.cursor() as cur:
+            cur.execute("DROP TABLE IF EXISTS arena CASCADE"
+                ).execute("DROP TABLE IF EXISTS game CASCADE"
+                ).execute("DROP TABLE IF EXISTS event CASCADE"
+                ).execute("DROP TABLE IF EXISTS period CASCADE"
+                ).execute("DROP TABLE IF EXISTS involved_player CASCADE"
+                ).execute("DROP TABLE IF EXISTS ingest_state CASCADE"
+                ).execute("DROP TABLE IF EXISTS player_event CASCADE"
+                ).execute("DROP TABLE IF EXISTS player CASCADE"
+                ).execute("DROP TABLE IF EXISTS team CASCADE")
+
+
+def seq_scans(plan: dict) -> set:
+    """
+    Returns the names of the relations that are sequentially scanned by a query plan.
+    """
+    relations = set()
+    if plan["Node Type"] == "Seq Scan":
+        relations.add(plan["Relation Name"])
+    for subplan in plan.get("Plans", []):
+        relations |= seq_scans(subplan)
+    return relations
+
+
+def scans(plan: dict) -> set:
+    """
+    Returns the names of the relations that are scanned by a query plan.
+    """
+    relations = set()
+    if "Relation Name" in plan:
+        relations.add(plan["Relation Name"])
+    for subplan in plan.get("Plans", []):
+        relations |= scans(subplan)
+    return relations
+
+
+def test_player_events_plan():
+    with psycopg.connect(CONN_STR) as conn:
+        plan = conn.execute(
+            "EXPLAIN (FORMAT JSON) " + PLAYER_EVENTS_QUERY,
+            {"player_id": 8, "event_type": "SHOT", "player_type": "Shooter", "season": 20212022},
+        ).fetchone()[0][0]["Plan"]
+    assert seq_scans(plan) == set()
+    # only the player events of the season are scanned
+    assert scans(plan) <= {"player_event", "player_event_20212022"}
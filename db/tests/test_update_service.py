@@ -7,10 +7,13 @@ PREREQUISITES:
 """
 
 from datetime import datetime, timezone
+import functools
+import httpx
 import psycopg
 import pytest
 from hockey_db import update_service
-from hockey_db.create_tables import create_tables
+from hockey_db.create_tables import create_schema, create_tables
+from tests.helpers.helper import make_feed, make_game
 
 DB_NAME = "test"
 DB_USER = "postgres"
@@ -27,7 +30,11 @@ def setup():
                 ).execute("DROP TABLE IF EXISTS game CASCADE"
                 ).execute("DROP TABLE IF EXISTS event CASCADE"
                 ).execute("DROP TABLE IF EXISTS period CASCADE"
-                ).execute("DROP TABLE IF EXISTS involved_player CASCADE")
+                ).execute("DROP TABLE IF EXISTS involved_player CASCADE"
+                ).execute("DROP TABLE IF EXISTS ingest_state CASCADE"
+                ).execute("DROP TABLE IF EXISTS player_event CASCADE"
+                ).execute("DROP TABLE IF EXISTS player CASCADE"
+                ).execute("DROP TABLE IF EXISTS team CASCADE")
 
 
 def test_most_recent_datetime_none():
@@ -38,16 +45,60 @@ def test_most_recent_datetime_none():
 def test_most_recent_datetime():
     with psycopg.connect(CONN_STR) as conn:
         with conn.cursor() as cur:
+            cur.execute("""
+            INSERT INTO ingest_state (game_id, status, game_datetime) VALUES
+            (0, 'loaded', '2022-01-01 00:00:00 UTC'),
+            (1, 'failed', '2022-01-02 00:00:00 UTC')
+            """)
+    dt = update_service.most_recent_datetime(CONN_STR)
+    assert dt.astimezone(timezone.utc) == datetime(2022, 1, 1, 0, 0, 0, tzinfo=timezone.utc)
+
+
+def test_most_recent_datetime_untracked():
+    with psycopg.connect(CONN_STR) as conn:
+        with conn.cursor() as cur:
+            arena = cur.execute("INSERT INTO arena (name) VALUES ('rink') RETURNING id").fetchone()[0]
+            cur.execute("""
+            INSERT INTO game (id, home_team_id, away_team_id, arena_id, type, season, datetime)
+            VALUES (0, 0, 1, %s, 'R', '20212022', '2022-01-01 00:00:00 UTC')
+            """, [arena])
+    dt = update_service.most_recent_datetime(CONN_STR)
+    assert dt.astimezone(timezone.utc) == datetime(2022, 1, 1, 0, 0, 0, tzinfo=timezone.utc)
+
+
+def test_most_recent_datetime_without_state():
+    with psycopg.connect(CONN_STR) as conn:
+        with conn.cursor() as cur:
+            cur.execute("DROP TABLE ingest_state")
             arena = cur.execute("INSERT INTO arena (name) VALUES ('rink') RETURNING id").fetchone()[0]
             cur.execute("""
-            INSERT INTO game
-            (id, home_team_id, away_team_id, arena_id, type, season, start_datetime, end_datetime)
-            VALUES (0, 0, 1, %s, 'R', '20212022', '2022-01-01 00:00:00 UTC', '2022-01-01 01:00:00 UTC')
+            INSERT INTO game (id, home_team_id, away_team_id, arena_id, type, season, datetime)
+            VALUES (0, 0, 1, %s, 'R', '20212022', '2022-01-01 00:00:00 UTC')
             """, [arena])
     dt = update_service.most_recent_datetime(CONN_STR)
     assert dt.astimezone(timezone.utc) == datetime(2022, 1, 1, 0, 0, 0, tzinfo=timezone.utc)
 
 
+@pytest.mark.asyncio
+async def test_update_without_state(monkeypatch):
+    async def get_scheduled_game_ids(client, fm, to):
+        return {2021020001}
+
+    async def get_game(client, id, state=None):
+        return make_game(id)
+
+    monkeypatch.setattr(update_service, "get_scheduled_game_ids", get_scheduled_game_ids)
+    monkeypatch.setattr(update_service, "get_game", get_game)
+    with psycopg.connect(CONN_STR) as conn:
+        conn.execute("DROP TABLE ingest_state")
+
+    date = datetime(2022, 1, 1, tzinfo=timezone.utc)
+    await update_service.update(CONN_STR, date, date)
+    with psycopg.connect(CONN_STR) as conn:
+        states = conn.execute("SELECT game_id, status FROM ingest_state").fetchall()
+    assert states == [(2021020001, "loaded")]
+
+
 @pytest.mark.asyncio
 async def test_update_new_events():
     from_date = datetime(2022, 1, 1, tzinfo=timezone.utc)
@@ -65,3 +116,401 @@ async def test_update_new_events():
             assert events != None
             assert periods != None
             assert involved_players != None
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mode", ["incremental", "copy"])
+async def test_update_pipeline(monkeypatch, mode):
+    game_ids = {2021020001 + i for i in range(10)}
+    fetched = []
+
+    async def get_scheduled_game_ids(client, fm, to):
+        return game_ids
+
+    async def get_game(client, id, state=None):
+        fetched.append(id)
+        if id == 2021020005:
+            return None
+        game = make_game(id)
+        if id == 2021020007:
+            game["events"][1]["about"]["periodTime"] = "not a time"
+        return game
+
+    monkeypatch.setattr(update_service, "get_scheduled_game_ids", get_scheduled_game_ids)
+    monkeypatch.setattr(update_service, "get_game", get_game)
+
+    date = datetime(2022, 1, 1, tzinfo=timezone.utc)
+    await update_service.update(CONN_STR, date, date, mode=mode, batch_size=3, concurrency=4)
+    with psycopg.connect(CONN_STR) as conn:
+        games = conn.execute("SELECT id FROM game ORDER BY id").fetchall()
+        events = conn.execute("SELECT count(*) FROM event").fetchone()[0]
+
+    assert sorted(fetched) == sorted(game_ids)
+    assert games == [(id,) for id in sorted(game_ids - {2021020005, 2021020007})]
+    assert events == 3 * 8
+
+
+@pytest.mark.asyncio
+async def test_update_resumes(monkeypatch):
+    fetched = []
+    broken = {2021020002}
+
+    async def get_scheduled_game_ids(client, fm, to):
+        return {2021020001, 2021020002, 2021020003}
+
+    async def get_game(client, id, state=None):
+        if state != None:
+            return update_service.UNCHANGED
+        fetched.append(id)
+        return make_game(id) if id not in broken else None
+
+    monkeypatch.setattr(update_service, "get_scheduled_game_ids", get_scheduled_game_ids)
+    monkeypatch.setattr(update_service, "get_game", get_game)
+
+    date = datetime(2022, 1, 1, tzinfo=timezone.utc)
+    await update_service.update(CONN_STR, date, date, max_attempts=2)
+    await update_service.update(CONN_STR, date, date, max_attempts=2)
+    await update_service.update(CONN_STR, date, date, max_attempts=2)
+    assert fetched == [2021020001, 2021020002, 2021020003, 2021020002]
+
+    with psycopg.connect(CONN_STR) as conn:
+        states = conn.execute("""
+            SELECT game_id, status, attempts FROM ingest_state ORDER BY game_id
+            """).fetchall()
+    assert states == [
+        (2021020001, "loaded", 1),
+        (2021020002, "failed", 2),
+        (2021020003, "loaded", 1),
+    ]
+
+    broken.clear()
+    fetched.clear()
+    await update_service.update(CONN_STR, date, date, max_attempts=3)
+    assert fetched == [2021020002]
+    assert update_service.most_recent_datetime(CONN_STR) != None
+
+
+@pytest.mark.asyncio
+async def test_update_download_error(monkeypatch):
+    connections = []
+
+    async def get_scheduled_game_ids(client, fm, to):
+        return {2021020001, 2021020002}
+
+    async def get_game(client, id, state=None):
+        if id == 2021020002:
+            raise RuntimeError("download error")
+        return make_game(id)
+
+    def connect(conn_str):
+        connections.append(psycopg.Connection.connect(conn_str))
+        return connections[-1]
+
+    monkeypatch.setattr(update_service, "get_scheduled_game_ids", get_scheduled_game_ids)
+    monkeypatch.setattr(update_service, "get_game", get_game)
+    monkeypatch.setattr(update_service.psycopg, "connect", connect)
+
+    date = datetime(2022, 1, 1, tzinfo=timezone.utc)
+    with pytest.raises(RuntimeError):
+        await update_service.update(CONN_STR, date, date, concurrency=2)
+
+    assert len(connections) > 0 and all(conn.closed for conn in connections)
+    with psycopg.connect(CONN_STR) as conn:
+        games = conn.execute("SELECT id FROM game").fetchall()
+    assert games == [(2021020001,)]
+
+
+@pytest.mark.parametrize("partitioned", [False, True])
+def test_insert_events(partitioned):
+    game = make_game()
+    with psycopg.connect(CONN_STR) as conn:
+        with conn.cursor() as cur:
+            if partitioned:
+                cur.execute("DROP TABLE player_event, involved_player, event")
+                create_schema(cur, partitioned=True)
+            arena = cur.execute("INSERT INTO arena (name) VALUES ('rink') RETURNING id").fetchone()[0]
+            cur.execute("""
+            INSERT INTO game (id, home_team_id, away_team_id, arena_id, type, season, datetime)
+            VALUES (%s, 1, 2, %s, 'R', 20212022, '2022-01-01 00:00:00 UTC')
+            """, [game["id"], arena])
+            update_service.insert_events(game, cur)
+            update_service.insert_events(game, cur)
+
+            events = cur.execute("SELECT index, type, x, y FROM event ORDER BY index").fetchall()
+            periods = cur.execute("SELECT number, type FROM period ORDER BY number").fetchall()
+            involved_players = cur.execute("""
+                SELECT event.index, player_id, involved_player.type
+                FROM involved_player JOIN event ON event.id = involved_player.event_id
+                ORDER BY event.index, player_id
+                """).fetchall()
+            player_events = cur.execute("""
+                SELECT index, player_id, event_type, player_type, x, y, period_number
+                FROM player_event ORDER BY index, player_id
+                """).fetchall()
+
+    assert events == [(0, "GAME_SCHEDULED", None, None), (1, "SHOT", 50, -10), (2, "GOAL", 50, -10)]
+    assert periods == [(1, "REGULAR"), (2, "REGULAR")]
+    assert involved_players == [
+        (1, 8470594, "Goalie"),
+        (1, 8471675, "Shooter"),
+        (2, 8470594, "Goalie"),
+        (2, 8471215, "Assist"),
+        (2, 8471675, "Scorer"),
+    ]
+    assert player_events == [
+        (1, 8470594, "SHOT", "Goalie", 50, -10, 1),
+        (1, 8471675, "SHOT", "Shooter", 50, -10, 1),
+        (2, 8470594, "GOAL", "Goalie", 50, -10, 2),
+        (2, 8471215, "GOAL", "Assist", 50, -10, 2),
+        (2, 8471675, "GOAL", "Scorer", 50, -10, 2),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_get_game_conditional():
+    game = make_game()
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        if request.headers.get("if-none-match") == '"v2"':
+            return httpx.Response(304)
+        return httpx.Response(200, json=make_feed(game), headers={"etag": '"v1"'})
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        loaded = await update_service.get_game(client, game["id"])
+        unchanged = await update_service.get_game(client, game["id"], {
+            "etag": '"v1"', "last_modified": None, "content_hash": loaded["hash"]})
+        not_modified = await update_service.get_game(client, game["id"], {
+            "etag": '"v2"', "last_modified": None, "content_hash": None})
+        changed = await update_service.get_game(client, game["id"], {
+            "etag": '"v1"', "last_modified": None, "content_hash": "other"})
+
+    assert loaded["id"] == game["id"]
+    assert loaded["etag"] == '"v1"'
+    assert "if-none-match" not in requests[0].headers
+    assert requests[1].headers["if-none-match"] == '"v1"'
+    assert unchanged is update_service.UNCHANGED
+    assert not_modified is update_service.UNCHANGED
+    assert changed["hash"] == loaded["hash"]
+
+
+@pytest.mark.asyncio
+async def test_update_malformed_feed(monkeypatch):
+    feeds = {id: make_feed(make_game(id)) for id in [2021020001, 2021020002]}
+    del feeds[2021020002]["gameData"]["venue"]
+
+    async def get_scheduled_game_ids(client, fm, to):
+        return set(feeds)
+
+    def handler(request):
+        return httpx.Response(200, json=feeds[int(request.url.path.split("/")[-3])])
+
+    monkeypatch.setattr(update_service, "get_scheduled_game_ids", get_scheduled_game_ids)
+    monkeypatch.setattr(
+        update_service.httpx, "AsyncClient",
+        functools.partial(httpx.AsyncClient, transport=httpx.MockTransport(handler)))
+
+    date = datetime(2022, 1, 1, tzinfo=timezone.utc)
+    await update_service.update(CONN_STR, date, date)
+    with psycopg.connect(CONN_STR) as conn:
+        games = conn.execute("SELECT id FROM game").fetchall()
+        states = conn.execute("""
+            SELECT game_id, status, attempts FROM ingest_state ORDER BY game_id
+            """).fetchall()
+
+    assert games == [(2021020001,)]
+    assert states == [(2021020001, "loaded", 1), (2021020002, "failed", 1)]
+
+
+@pytest.mark.asyncio
+async def test_update_reloads_changed_games(monkeypatch):
+    game = make_game()
+    feeds = []
+
+    async def get_scheduled_game_ids(client, fm, to):
+        return {game["id"]}
+
+    async def get_game(client, id, state=None):
+        feeds.append(state)
+        if state != None and state["content_hash"] == game["hash"]:
+            return update_service.UNCHANGED
+        return {**game, "events": [dict(event) for event in game["events"]]}
+
+    monkeypatch.setattr(update_service, "get_scheduled_game_ids", get_scheduled_game_ids)
+    monkeypatch.setattr(update_service, "get_game", get_game)
+
+    date = datetime(2022, 1, 1, tzinfo=timezone.utc)
+    game["hash"] = "v1"
+    await update_service.update(CONN_STR, date, date)
+    await update_service.update(CONN_STR, date, date)
+
+    game["hash"] = "v2"
+    game["events"] = game["events"][:2]
+    game["events"][1]["result"] = {"eventTypeId": "MISSED_SHOT"}
+    await update_service.update(CONN_STR, date, date)
+
+    with psycopg.connect(CONN_STR) as conn:
+        events = conn.execute("SELECT index, type FROM event ORDER BY index").fetchall()
+        players = conn.execute("SELECT count(*) FROM involved_player").fetchone()[0]
+        player_events = conn.execute("""
+            SELECT index, event_type FROM player_event ORDER BY index, player_id
+            """).fetchall()
+        state = conn.execute("SELECT status, attempts, content_hash FROM ingest_state").fetchone()
+
+    assert feeds[0] == None
+    assert feeds[1]["content_hash"] == "v1"
+    assert feeds[2]["content_hash"] == "v1"
+    assert events == [(0, "GAME_SCHEDULED"), (1, "MISSED_SHOT")]
+    assert players == 2
+    assert player_events == [(1, "MISSED_SHOT"), (1, "MISSED_SHOT")]
+    assert state == ("loaded", 1, "v2")
+
+
+@pytest.mark.asyncio
+async def test_follow_game():
+    game = make_game()
+    feed = make_feed({**game, "events": game["events"][:2]})
+    feed["gameData"]["status"] = {"abstractGameState": "Live"}
+    feed["metaData"] = {"timeStamp": "20220101_000000"}
+    diffs = [
+        [],
+        [{"diff": [
+            {"op": "replace", "path": "/metaData/timeStamp", "value": "20220101_000100"},
+            {"op": "replace", "path": "/liveData/plays/allPlays/1/result/eventTypeId",
+                "value": "MISSED_SHOT"},
+            {"op": "add", "path": "/liveData/plays/allPlays/-", "value": game["events"][2]},
+        ]}],
+        [{"diff": [
+            {"op": "replace", "path": "/metaData/timeStamp", "value": "20220101_000200"},
+            {"op": "replace", "path": "/gameData/status/abstractGameState", "value": "Final"},
+        ]}],
+    ]
+    timecodes = []
+    writes = []
+
+    def handler(request):
+        if request.url.path.endswith("/diffPatch"):
+            timecodes.append(request.url.params["startTimecode"])
+            return httpx.Response(200, json=diffs.pop(0))
+        return httpx.Response(200, json=feed)
+
+    async def write(game, full):
+        writes.append(([event["result"]["eventTypeId"] for event in game["events"]], full))
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        await update_service.follow_game(client, game["id"], write, 0, 0)
+
+    assert timecodes == ["20220101_000000", "20220101_000000", "20220101_000100"]
+    assert writes == [
+        (["GAME_SCHEDULED", "SHOT"], True),
+        (["MISSED_SHOT", "GOAL"], False),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_follow_game_invalid_diff():
+    game = make_game()
+    feed = make_feed(game)
+    feed["gameData"]["status"] = {"abstractGameState": "Live"}
+    feed["metaData"] = {"timeStamp": "20220101_000000"}
+    diffs = [
+        [{"diff": [{"op": "add", "path": "/liveData/plays/allPlays/x", "value": {}}]}],
+        [{"diff": [
+            {"op": "replace", "path": "/gameData/status/abstractGameState", "value": "Final"},
+        ]}],
+    ]
+    feeds = []
+    writes = []
+
+    def handler(request):
+        if request.url.path.endswith("/diffPatch"):
+            return httpx.Response(200, json=diffs.pop(0))
+        feeds.append(request.url.path)
+        return httpx.Response(200, json=feed)
+
+    async def write(game, full):
+        writes.append((len(game["events"]), full, game.get("reload")))
+
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        await update_service.follow_game(client, game["id"], write, 0, 0)
+
+    assert len(feeds) == 2
+    assert writes == [(3, True, False), (3, True, True)]
+
+
+def test_write_live():
+    game = make_game()
+    with psycopg.connect(CONN_STR) as conn:
+        update_service.write_live(conn, {**game, "events": game["events"][:1]}, True)
+        update_service.write_live(conn, {
+            "id": game["id"], "season": game["season"], "events": game["events"][1:]}, False)
+        events = conn.execute("SELECT index FROM event ORDER BY index").fetchall()
+        state = conn.execute("SELECT status, content_hash FROM ingest_state").fetchall()
+    assert events == [(0,), (1,), (2,)]
+    assert state == [("loaded", None)]
+
+
+@pytest.mark.asyncio
+async def test_update_prunes_live_games(monkeypatch):
+    game = make_game()
+    with psycopg.connect(CONN_STR) as conn:
+        update_service.write_live(conn, game, True)
+
+    async def get_scheduled_game_ids(client, fm, to):
+        return {game["id"]}
+
+    async def get_game(client, id, state=None):
+        return {**game, "events": game["events"][:2], "hash": "v1"}
+
+    monkeypatch.setattr(update_service, "get_scheduled_game_ids", get_scheduled_game_ids)
+    monkeypatch.setattr(update_service, "get_game", get_game)
+
+    date = datetime(2022, 1, 1, tzinfo=timezone.utc)
+    await update_service.update(CONN_STR, date, date)
+    with psycopg.connect(CONN_STR) as conn:
+        events = conn.execute("SELECT index FROM event ORDER BY index").fetchall()
+        state = conn.execute("SELECT status, content_hash FROM ingest_state").fetchall()
+    assert events == [(0,), (1,)]
+    assert state == [("loaded", "v1")]
+
+
+def test_insert_game_dimensions():
+    game = make_game()
+    older = {**make_game(2020020001), "datetime": "2021-01-01T00:00:00Z", "season": "20202021"}
+    older["players"] = [{**older["players"][0], "currentTeam": {"id": 2}}]
+    with psycopg.connect(CONN_STR) as conn:
+        update_service.insert_game(game, conn)
+        update_service.insert_game(older, conn)
+        players = conn.execute("""
+            SELECT id, first_name, last_name, position, team_id, data ->> 'fullName'
+            FROM player ORDER BY id
+            """).fetchall()
+        teams = conn.execute("SELECT id, name, abbreviation FROM team ORDER BY id").fetchall()
+
+    assert players == [
+        (8470594, "Marc-Andre", "Fleury", "C", 2, "Marc-Andre Fleury"),
+        (8471215, "Evgeni", "Malkin", "C", 1, "Evgeni Malkin"),
+        (8471675, "Sidney", "Crosby", "C", 1, "Sidney Crosby"),
+    ]
+    assert teams == [(1, "Pittsburgh Penguins", "PIT"), (2, "Chicago Blackhawks", "CHI")]
+
+    newer = {**make_game(2022020001), "datetime": "2023-01-01T00:00:00Z", "season": "20222023"}
+    newer["players"] = [{**newer["players"][0], "currentTeam": {"id": 2}}]
+    with psycopg.connect(CONN_STR) as conn:
+        update_service.insert_game(newer, conn)
+        team_id = conn.execute("SELECT team_id FROM player WHERE id = 8471675").fetchone()[0]
+    assert team_id == 2
+
+
+def test_insert_events_duplicate_player():
+    game = make_game()
+    game["events"][1]["players"].append({"player": {"id": 8471675}, "playerType": "Shooter"})
+    with psycopg.connect(CONN_STR) as conn:
+        update_service.insert_game(game, conn)
+        players = conn.execute("""
+            SELECT player_id, involved_player.type
+            FROM involved_player JOIN event ON event.id = involved_player.event_id
+            WHERE event.index = 1 ORDER BY player_id
+            """).fetchall()
+    assert players == [(8470594, "Goalie"), (8471675, "Shooter")]